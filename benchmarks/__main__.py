@@ -0,0 +1,123 @@
+"""Benchmarks of building AETs, constructing models and repository operations on synthetic aggregates.
+
+    python -m benchmarks --width 10 --depth 3 --save baseline.json
+    # ...change something...
+    python -m benchmarks --width 10 --depth 3 --compare baseline.json
+
+Comparing exits with status 1 if any operation got slower by more than the tolerance or issues more SQL statements.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import typing
+
+import attr
+
+from benchmarks.aggregates import SHAPES
+from benchmarks.cases import OPERATIONS, Case
+from benchmarks.measuring import Result, measure
+
+
+BULK_OPERATIONS = ("get_many", "save_many")
+# operations which do not touch the database
+IN_MEMORY_OPERATIONS = ("build", "construct_models")
+
+
+def parse_arguments(argv: typing.List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.splitlines()[0])
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=SHAPES)
+    parser.add_argument("--operations", nargs="+", choices=OPERATIONS, default=OPERATIONS)
+    parser.add_argument("--width", type=int, default=5, help="fields on every level of aggregates")
+    parser.add_argument("--depth", type=int, default=2, help="levels of nested value objects or entities")
+    parser.add_argument("--batch", type=int, default=100, help="aggregates read or written by bulk operations")
+    parser.add_argument(
+        "--number", type=int, default=200, help="calls of an operation in a round, bulk ones divide it by batch"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="rounds, the fastest one is reported")
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="NAME=JSON",
+        help="setting of SqlAlchemyRepo, e.g. --set core_reads=true",
+    )
+    parser.add_argument("--save", metavar="PATH", help="write results to JSON file")
+    parser.add_argument("--compare", metavar="PATH", help="compare results with JSON file written by --save")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative slowdown not reported as regression")
+    return parser.parse_args(argv)
+
+
+def run(arguments: argparse.Namespace) -> typing.List[Result]:
+    repo_settings = {name: json.loads(value) for name, value in (setting.split("=", 1) for setting in arguments.set)}
+    results = []
+    for shape in arguments.shapes:
+        case = Case(shape, arguments.width, arguments.depth, arguments.batch, repo_settings)
+        for name in arguments.operations:
+            number = max(1, arguments.number // arguments.batch) if name in BULK_OPERATIONS else arguments.number
+            counter = None if name in IN_MEMORY_OPERATIONS else case.counter
+            label = f"{name}[{arguments.batch}]" if name in BULK_OPERATIONS else name
+            result = measure(case.name, label, case.operation(name), counter, number, arguments.repeat)
+            print(
+                f"{result.case:<40} {result.operation:<20} {result.ops_per_sec:>12.1f} ops/s "
+                f"{result.peak_kib:>10.1f} KiB {result.statements:>6} statements"
+            )
+            results.append(result)
+    return results
+
+
+def current_commit() -> typing.Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: typing.List[Result], baseline: dict, tolerance: float) -> bool:
+    """Prints changes against the baseline, returns whether there is any regression."""
+    baseline_results = {(result["case"], result["operation"]): Result(**result) for result in baseline["results"]}
+    print(f"\nCompared with {baseline.get('commit') or 'unknown commit'}:")
+    regressed = False
+    for result in results:
+        previous = baseline_results.get((result.case, result.operation))
+        if previous is None:
+            continue
+        speedup = result.ops_per_sec / previous.ops_per_sec - 1
+        slower = speedup < -tolerance
+        more_statements = result.statements > previous.statements
+        regressed = regressed or slower or more_statements
+        marker = " REGRESSION" if slower or more_statements else ""
+        print(
+            f"{result.case:<40} {result.operation:<20} {speedup:>+8.1%} ops/s "
+            f"{result.peak_kib - previous.peak_kib:>+10.1f} KiB {result.statements - previous.statements:>+6} "
+            f"statements{marker}"
+        )
+    return regressed
+
+
+def main(argv: typing.List[str]) -> int:
+    arguments = parse_arguments(argv)
+    results = run(arguments)
+
+    if arguments.save:
+        with open(arguments.save, "w") as file:
+            json.dump(
+                {
+                    "commit": current_commit(),
+                    "arguments": vars(arguments),
+                    "results": [attr.asdict(result) for result in results],
+                },
+                file,
+                indent=2,
+            )
+
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            baseline = json.load(file)
+        if compare(results, baseline, arguments.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
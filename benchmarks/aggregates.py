@@ -0,0 +1,55 @@
+import typing
+
+from entity_framework import Entity, Identity, ValueObject
+from entity_framework.abstract_entity_tree import Node, FieldNode, build
+
+
+# flat - identity and `width` fields, nothing nested (depth is ignored)
+# nested_vos - every level has `width` fields and a value object holding the next level, `depth` levels deep
+# optional_vos - like nested_vos, but every nested value object is optional
+# nested_entities - like nested_vos, but every level is an entity with identity of its own (and a table of its own)
+SHAPES = ("flat", "nested_vos", "optional_vos", "nested_entities")
+
+
+def aggregate_class(shape: str, width: int, depth: int) -> typing.Type[Entity]:
+    """Generates classes of synthetic aggregate, named uniquely for the shape, so that their tables do not clash."""
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown shape {shape}, expected one of {SHAPES}")
+    if shape == "flat":
+        depth = 0
+    prefix = "".join(word.title() for word in shape.split("_")) + f"W{width}D{depth}"
+
+    nested: typing.Optional[typing.Type] = None
+    for level in reversed(range(depth + 1)):
+        is_entity = level == 0 or shape == "nested_entities"
+        annotations: typing.Dict[str, typing.Any] = {"id": Identity[int]} if is_entity else {}
+        for index in range(width):
+            annotations[f"field_{index}"] = int if index % 2 == 0 else str
+        if nested is not None:
+            annotations["nested"] = typing.Optional[nested] if shape == "optional_vos" else nested
+        base = Entity if is_entity else ValueObject
+        namespace = {"__annotations__": annotations, "__module__": __name__}
+        nested = type(base)(f"{prefix}Level{level}", (base,), namespace)
+
+    return nested
+
+
+def aggregate_factory(entity_cls: typing.Type[Entity]) -> typing.Callable[[int], Entity]:
+    """Makes instances of an aggregate generated by `aggregate_class` for given identity, with all optionals present."""
+    root = build(entity_cls).root
+    return lambda identity: _instance(root, identity)
+
+
+def _instance(node: Node, identity: int) -> typing.Any:
+    values = []
+    for index, child in enumerate(node.children):
+        if isinstance(child, FieldNode):
+            if child.is_identity:
+                values.append(identity)
+            elif child.type is int:
+                values.append(identity + index)
+            else:
+                values.append(f"value {identity} {index}")
+        else:
+            values.append(_instance(child, identity))
+    return node.type(*values)
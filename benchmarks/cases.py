@@ -0,0 +1,89 @@
+import itertools
+import typing
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from entity_framework import Repository
+from entity_framework.abstract_entity_tree import AbstractEntityTree
+from entity_framework.storages.sqlalchemy import SqlAlchemyRepo
+from entity_framework.storages.sqlalchemy.constructing_model.visitor import ModelConstructingVisitor
+from entity_framework.storages.sqlalchemy.registry import SaRegistry
+
+from benchmarks.aggregates import aggregate_class, aggregate_factory
+from benchmarks.measuring import Operation, StatementsCounter
+
+
+OPERATIONS = ("build", "construct_models", "get", "save", "get_many", "save_many")
+
+
+class Case:
+    """Operations on synthetic aggregates of one shape, persisted by SqlAlchemyRepo in in-memory SQLite.
+
+    `get` and `save` open a new session for every call, so that neither is served by the identity map of the previous
+    one, and `save` commits, so that the flush is measured as well. Aggregates written by `save` and `save_many` have
+    fresh identities each time, i.e. they are always inserted.
+    """
+
+    def __init__(
+        self, shape: str, width: int, depth: int, batch: int, repo_settings: typing.Dict[str, typing.Any]
+    ) -> None:
+        self.entity_cls = aggregate_class(shape, width, depth)
+        self.name = f"{shape}[width={width},depth={depth}]"
+        self.batch = batch
+        self._aggregate = aggregate_factory(self.entity_cls)
+
+        engine = create_engine("sqlite://")
+        self.counter = StatementsCounter(engine)
+        sa_base = declarative_base()
+        namespace = dict(repo_settings, base=sa_base, registry=SaRegistry())
+        self.repo_cls = type(
+            f"Sa{self.entity_cls.__name__}Repo", (SqlAlchemyRepo, Repository[self.entity_cls, int]), namespace
+        )
+        sa_base.metadata.create_all(engine)
+        self._session_factory = sessionmaker(engine)
+
+        self._loaded_identities = list(range(1, batch + 1))
+        self._new_identities = itertools.count(batch + 1)
+        session = self._session_factory()
+        self.repo_cls(session).save_many([self._aggregate(identity) for identity in self._loaded_identities])
+        session.commit()
+        session.close()
+
+    def operation(self, name: str) -> Operation:
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name}, expected one of {OPERATIONS}")
+        return getattr(self, name)
+
+    def build(self) -> None:
+        # not build(), which returns trees cached process-wide - it would measure a dict lookup after the first call
+        AbstractEntityTree.parse(self.entity_cls)
+
+    def construct_models(self) -> None:
+        ModelConstructingVisitor(declarative_base(), SaRegistry()).traverse_from(
+            AbstractEntityTree.parse(self.entity_cls).root
+        )
+
+    def get(self) -> None:
+        session = self._session_factory()
+        self.repo_cls(session).get(self._loaded_identities[0])
+        session.close()
+
+    def save(self) -> None:
+        session = self._session_factory()
+        self.repo_cls(session).save(self._aggregate(next(self._new_identities)))
+        session.commit()
+        session.close()
+
+    def get_many(self) -> None:
+        session = self._session_factory()
+        self.repo_cls(session).get_many(self._loaded_identities)
+        session.close()
+
+    def save_many(self) -> None:
+        session = self._session_factory()
+        aggregates = [self._aggregate(identity) for identity in itertools.islice(self._new_identities, self.batch)]
+        self.repo_cls(session).save_many(aggregates)
+        session.commit()
+        session.close()
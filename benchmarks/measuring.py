@@ -0,0 +1,58 @@
+import time
+import tracemalloc
+import typing
+
+import attr
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+Operation = typing.Callable[[], typing.Any]
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Result:
+    case: str
+    operation: str
+    ops_per_sec: float
+    # peak of memory allocated by Python while running a single operation
+    peak_kib: float
+    # SQL statements issued by a single operation
+    statements: float
+
+
+class StatementsCounter:
+    def __init__(self, engine: Engine) -> None:
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._increment)
+
+    def _increment(self, *_args: typing.Any) -> None:
+        self.count += 1
+
+
+def measure(
+    case: str, name: str, operation: Operation, counter: typing.Optional[StatementsCounter], number: int, repeat: int
+) -> Result:
+    """Runs the operation `number` times in each of `repeat` rounds and reports the fastest round.
+
+    The operation runs once before, so that whatever is compiled and cached on first use is not measured.
+    """
+    operation()
+
+    best = float("inf")
+    for _round in range(repeat):
+        start = time.perf_counter()
+        for _call in range(number):
+            operation()
+        best = min(best, time.perf_counter() - start)
+
+    statements_before = counter.count if counter else 0
+    tracemalloc.start()
+    try:
+        operation()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    statements = counter.count - statements_before if counter else 0
+
+    return Result(case, name, number / best, peak / 1024, statements)
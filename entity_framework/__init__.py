@@ -1,5 +1,5 @@
 from entity_framework.entity import Entity, Identity, ValueObject
-from entity_framework.repository import Repository
+from entity_framework.repository import Repository, AsyncRepository
 
 
-__all__ = ["Entity", "Identity", "ValueObject", "Repository"]
+__all__ = ["Entity", "Identity", "ValueObject", "Repository", "AsyncRepository"]
@@ -1,5 +1,6 @@
 import abc
 import inspect
+import threading
 import typing
 from collections import deque
 
@@ -44,8 +45,12 @@ def _is_list_of_entities_or_vos(field_type: typing.Type) -> bool:
 
 
 class Visitor:
+    # Returned from visit_* to treat node as a leaf - neither its children are visited nor it is left
+    SKIP_CHILDREN = object()
+
     def traverse_from(self, node: "Node") -> None:
-        node.accept(self)
+        if node.accept(self) is self.SKIP_CHILDREN:
+            return
         for child in node.children:
             self.traverse_from(child)
         node.farewell(self)
@@ -89,17 +94,29 @@ class NodeMeta(type):
         cls = super().__new__(mcs, name, bases, namespace)
         if inspect.isabstract(cls):
             return cls
-        return attr.s(auto_attribs=True)(cls)
+        return attr.s(auto_attribs=True, frozen=True)(cls)
 
 
 class Node(metaclass=NodeMeta):
+    """Immutable and hashable, so that trees can be shared by all registries and used as keys.
+
+    Attributes below `children` are derived from node's position in the tree by `build`. They are left out of
+    comparisons, so that nodes equal field by field compare equal wherever they are.
+    """
+
     name: str
     type: typing.Type
     optional: bool = False
-    children: typing.Tuple["Node", ...] = attr.Factory(list)
+    children: typing.Tuple["Node", ...] = ()
+    # names of fields leading from the aggregate root to the node, e.g. ("current_subscription", "plan_id")
+    path: typing.Tuple[str, ...] = attr.ib(default=(), cmp=False, repr=False)
+    # name prefixed with names of value objects embedding it, e.g. "current_subscription_plan_id"
+    column_name: str = attr.ib(default="", cmp=False, repr=False)
+    # identity field of entities and lists of entities, None for other nodes
+    identity: typing.Optional["FieldNode"] = attr.ib(default=None, cmp=False, repr=False)
 
     @abc.abstractmethod
-    def accept(self, visitor: Visitor) -> None:
+    def accept(self, visitor: Visitor) -> typing.Any:
         pass
 
     @abc.abstractmethod
@@ -110,49 +127,54 @@ class Node(metaclass=NodeMeta):
 class FieldNode(Node):
     is_identity: bool = False
 
-    def accept(self, visitor: Visitor) -> None:
-        visitor.visit_field(self)
+    def accept(self, visitor: Visitor) -> typing.Any:
+        return visitor.visit_field(self)
 
     def farewell(self, visitor: Visitor) -> None:
         visitor.leave_field(self)
 
 
 class EntityNode(Node):
-    def accept(self, visitor: Visitor) -> None:
-        visitor.visit_entity(self)
+    def accept(self, visitor: Visitor) -> typing.Any:
+        return visitor.visit_entity(self)
 
     def farewell(self, visitor: Visitor) -> None:
         visitor.leave_entity(self)
 
 
 class ValueObjectNode(Node):
-    def accept(self, visitor: Visitor) -> None:
-        visitor.visit_value_object(self)
+    def accept(self, visitor: Visitor) -> typing.Any:
+        return visitor.visit_value_object(self)
 
     def farewell(self, visitor: Visitor) -> None:
         visitor.leave_value_object(self)
 
 
 class ListOfEntitiesNode(Node):
-    def accept(self, visitor: Visitor) -> None:
-        visitor.visit_list_of_entities(self)
+    def accept(self, visitor: Visitor) -> typing.Any:
+        return visitor.visit_list_of_entities(self)
 
     def farewell(self, visitor: Visitor) -> None:
         visitor.leave_list_of_entities(self)
 
 
 class ListOfValueObjectsNode(Node):
-    def accept(self, visitor: Visitor) -> None:
-        visitor.visit_list_of_value_objects(self)
+    def accept(self, visitor: Visitor) -> typing.Any:
+        return visitor.visit_list_of_value_objects(self)
 
     def farewell(self, visitor: Visitor) -> None:
         visitor.leave_list_of_value_objects(self)
 
 
-@attr.s(auto_attribs=True)
+@attr.s(auto_attribs=True, frozen=True)
 class AbstractEntityTree:
     root: EntityNode
 
+    @classmethod
+    def parse(cls, entity_cls: typing.Type[Entity]) -> "AbstractEntityTree":
+        """Parses a new tree of the entity class, unlike `build` which returns the one shared by the process."""
+        return cls(_parse_node(entity_cls, inflection.underscore(entity_cls.__name__), (), ""))
+
     def __iter__(self) -> typing.Generator[Node, None, None]:
         def iterate_dfs() -> typing.Generator[Node, None, None]:
             nodes_left: typing.Deque[Node] = deque([self.root])
@@ -165,55 +187,103 @@ class AbstractEntityTree:
         return iterate_dfs()
 
 
+def prune(node: Node, paths: typing.Iterable[typing.Sequence[str]]) -> Node:
+    """Copies subtree of `node` limited to nodes on given paths of field names, relative to `node`.
+
+    Node at the end of a path is kept with its entire subtree. Identities of entities are always kept.
+    """
+    children_paths: typing.Dict[str, typing.List[typing.Sequence[str]]] = {}
+    for path in paths:
+        if path:
+            children_paths.setdefault(path[0], []).append(path[1:])
+
+    missing = set(children_paths) - {child.name for child in node.children}
+    if missing:
+        raise ValueError(f"{node.type.__name__} has no fields: {', '.join(sorted(missing))}")
+
+    children = []
+    for child in node.children:
+        child_paths = children_paths.get(child.name)
+        if child_paths is not None:
+            children.append(prune(child, child_paths) if all(child_paths) else child)
+        elif getattr(child, "is_identity", False):
+            children.append(child)
+    return attr.evolve(node, children=tuple(children))
+
+
+# Trees are immutable, so a single one per entity class is shared by the whole process
+_trees: typing.Dict[typing.Type[Entity], AbstractEntityTree] = {}
+_trees_lock = threading.Lock()
+
+
 def build(root: typing.Type[Entity]) -> AbstractEntityTree:
-    # TODO: children could be tuple, not list. Then, Nodes would be hashable.
-    def parse_node(current_root: EntityOrVoType, name: str) -> Node:
-        node_name = name
-        is_list = False
-        if _is_list_of_entities_or_vos(current_root):
-            node_optional = False
-            node_type = _get_wrapped_type(current_root)
-            is_list = True
-        elif _is_optional_entity_or_vo(current_root):
-            node_optional = True
-            node_type = _get_wrapped_type(current_root)
-        else:
-            node_optional = False
-            node_type = current_root
-        node_children = []
-
-        for field in attr.fields(node_type):
-            field_type = field.type
-            field_name = field.name
-
-            if _is_nested_entity_or_vo(field_type) or _is_list_of_entities_or_vos(field_type):
-                node_children.append(parse_node(field_type, field_name))
-                continue
-
-            field_optional = False
-            is_identity = False
-
-            if _is_generic(field.type):
-                if _is_identity(field_type):
-                    field_type = _get_wrapped_type(field.type)
-                    is_identity = True
-                elif _is_field_optional(field.type):
-                    field_type = _get_wrapped_type(field.type)
-                    field_optional = True
-                else:
-                    raise Exception(f"Unhandled Generic type - {field_type}")
-
-            node_children.append(FieldNode(field_name, field_type, field_optional, (), is_identity))
-
-        node_children = tuple(node_children)
-        if issubclass(node_type, Entity):
-            if is_list:
-                return ListOfEntitiesNode(node_name, node_type, node_optional, node_children)
-            return EntityNode(node_name, node_type, node_optional, node_children)
-
-        if is_list:
-            return ListOfValueObjectsNode(node_name, node_type, node_optional, node_children)
-        return ValueObjectNode(node_name, node_type, node_optional, node_children)
-
-    root_node = parse_node(root, inflection.underscore(root.__name__))
-    return AbstractEntityTree(root_node)
+    tree = _trees.get(root)
+    if tree is None:
+        with _trees_lock:
+            tree = _trees.get(root)
+            if tree is None:
+                tree = _trees[root] = AbstractEntityTree.parse(root)
+    return tree
+
+
+def _parse_node(current_root: EntityOrVoType, name: str, path: typing.Tuple[str, ...], prefix: str) -> Node:
+    node_name = name
+    is_list = False
+    if _is_list_of_entities_or_vos(current_root):
+        node_optional = False
+        node_type = _get_wrapped_type(current_root)
+        is_list = True
+    elif _is_optional_entity_or_vo(current_root):
+        node_optional = True
+        node_type = _get_wrapped_type(current_root)
+    else:
+        node_optional = False
+        node_type = current_root
+    node_children = []
+    # fields of value objects are embedded into the entity above them, under prefixed names
+    children_prefix = f"{prefix}{node_name}_" if issubclass(node_type, ValueObject) and not is_list else prefix
+
+    for field in attr.fields(node_type):
+        field_type = field.type
+        field_name = field.name
+        field_path = (*path, field_name)
+
+        if _is_nested_entity_or_vo(field_type) or _is_list_of_entities_or_vos(field_type):
+            node_children.append(_parse_node(field_type, field_name, field_path, children_prefix))
+            continue
+
+        field_optional = False
+        is_identity = False
+
+        if _is_generic(field.type):
+            if _is_identity(field_type):
+                field_type = _get_wrapped_type(field.type)
+                is_identity = True
+            elif _is_field_optional(field.type):
+                field_type = _get_wrapped_type(field.type)
+                field_optional = True
+            else:
+                raise Exception(f"Unhandled Generic type - {field_type}")
+
+        node_children.append(
+            FieldNode(
+                field_name,
+                field_type,
+                field_optional,
+                (),
+                path=field_path,
+                column_name=f"{children_prefix}{field_name}",
+                is_identity=is_identity,
+            )
+        )
+
+    node_children = tuple(node_children)
+    metadata = {"path": path, "column_name": f"{prefix}{node_name}"}
+    if issubclass(node_type, Entity):
+        identity_nodes = [node for node in node_children if getattr(node, "is_identity", False)]
+        assert len(identity_nodes) == 1, "Multiple primary keys not supported"
+        node_cls = ListOfEntitiesNode if is_list else EntityNode
+        return node_cls(node_name, node_type, node_optional, node_children, identity=identity_nodes[0], **metadata)
+
+    node_cls = ListOfValueObjectsNode if is_list else ValueObjectNode
+    return node_cls(node_name, node_type, node_optional, node_children, **metadata)
@@ -0,0 +1,72 @@
+import abc
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+from entity_framework.flattening import Flat
+
+
+# (entity class, identity)
+CacheKey = typing.Tuple[typing.Type, typing.Any]
+
+
+class CacheBackend(abc.ABC):
+    """Storage of flattened aggregates, shared between repositories and possibly processes.
+
+    Backends talking to external caches are responsible for turning keys and values into whatever they accept.
+    """
+
+    @abc.abstractmethod
+    def get(self, key: CacheKey) -> typing.Optional[Flat]:
+        pass
+
+    @abc.abstractmethod
+    def set(self, key: CacheKey, value: Flat) -> None:
+        pass
+
+    @abc.abstractmethod
+    def delete(self, key: CacheKey) -> None:
+        pass
+
+
+class LruCacheBackend(CacheBackend):
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: typing.Optional[float] = None,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._max_size = max_size
+        self._ttl = ttl
+        self._clock = clock
+        # key -> (expiration time, value), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: CacheKey) -> typing.Optional[Flat]:
+        with self._lock:
+            try:
+                expires_at, value = self._entries[key]
+            except KeyError:
+                return None
+            if expires_at is not None and expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: CacheKey, value: Flat) -> None:
+        expires_at = None if self._ttl is None else self._clock() + self._ttl
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: CacheKey) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
@@ -0,0 +1,234 @@
+import typing
+from operator import itemgetter
+
+import attr
+
+from entity_framework.abstract_entity_tree import (
+    Visitor,
+    Node,
+    FieldNode,
+    EntityNode,
+    ValueObjectNode,
+    ListOfEntitiesNode,
+    ListOfValueObjectsNode,
+)
+from entity_framework import lazy
+from entity_framework.entity import Entity, EntityOrVo
+from entity_framework.registry import Registry
+
+
+Flat = typing.Tuple[typing.Any, ...]
+# restores a nested entity, which was flattened without ever being loaded, from its identity
+ReferenceLoader = typing.Callable[[EntityNode, typing.Any], Entity]
+Writer = typing.Callable[[typing.Any, typing.List[typing.Any]], None]
+Reader = typing.Callable[[Flat, typing.Optional[ReferenceLoader]], typing.Any]
+
+# flag of a nested entity that was never loaded - only its identity is kept, other fields are None
+REFERENCE = 2
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Flattener:
+    flatten: typing.Callable[[EntityOrVo], Flat]
+    # (flat, load_reference=None), the latter is required only by aggregates flattened with references
+    unflatten: typing.Callable[..., EntityOrVo]
+
+
+class FlatteningVisitor(Visitor):
+    """Compiles AET into a pair of functions converting an aggregate to a flat tuple and back.
+
+    Every field occupies a fixed position in the tuple. Optional value objects and nested entities are preceded by
+    a flag, so unlike storages flattening into columns, absent object is told apart from one with all fields set
+    to None. Nested entities that were never loaded (see `entity_framework.lazy`) are flagged as references and keep
+    just their identity. Lists take a single position, holding a tuple of their flattened items.
+    """
+
+    def __init__(self) -> None:
+        self._size = 0
+        self._frames_stack: typing.List[typing.Tuple[typing.List[Writer], typing.List[Reader], int]] = []
+        self._flags_stack: typing.List[typing.Optional[int]] = []
+        self._identity_indexes_stack: typing.List[typing.Optional[int]] = []
+        self._outer_sizes_stack: typing.List[int] = []
+        self._result: typing.Optional[Flattener] = None
+
+    @property
+    def result(self) -> Flattener:
+        return self._result
+
+    def visit_field(self, field: FieldNode) -> None:
+        field_name = field.name
+        read_value = itemgetter(self._size)
+
+        def write_field(ef_object: typing.Any, values: typing.List[typing.Any]) -> None:
+            values.append(getattr(ef_object, field_name))
+
+        def read_field(values: Flat, _load_reference: typing.Optional[ReferenceLoader]) -> typing.Any:
+            return read_value(values)
+
+        if field.is_identity:
+            self._identity_indexes_stack[-1] = self._size
+        writers, readers, _start = self._frames_stack[-1]
+        writers.append(write_field)
+        readers.append(read_field)
+        self._size += 1
+
+    def visit_entity(self, entity: EntityNode) -> None:
+        self._visit_complex_object(entity)
+
+    def leave_entity(self, entity: EntityNode) -> None:
+        self._leave_complex_object(entity)
+
+    def visit_value_object(self, value_object: ValueObjectNode) -> None:
+        self._visit_complex_object(value_object)
+
+    def leave_value_object(self, value_object: ValueObjectNode) -> None:
+        self._leave_complex_object(value_object)
+
+    def _visit_complex_object(self, node: Node) -> None:
+        if node.optional or (isinstance(node, EntityNode) and self._frames_stack):
+            self._flags_stack.append(self._size)
+            self._size += 1
+        else:
+            self._flags_stack.append(None)
+        self._frames_stack.append(([], [], self._size))
+        self._identity_indexes_stack.append(None)
+
+    def _leave_complex_object(self, node: Node) -> None:
+        writers, readers, start = self._frames_stack.pop()
+        flag_index = self._flags_stack.pop()
+        identity_index = self._identity_indexes_stack.pop()
+        node_cls = node.type
+
+        def write(ef_object: typing.Any, values: typing.List[typing.Any]) -> None:
+            for writer in writers:
+                writer(ef_object, values)
+
+        def read(values: Flat, load_reference: typing.Optional[ReferenceLoader]) -> typing.Any:
+            return node_cls(*[reader(values, load_reference) for reader in readers])
+
+        if flag_index is not None:
+            write, read = self._make_optional(write, read, flag_index, self._size - start)
+        if flag_index is not None and isinstance(node, EntityNode):
+            write, read = self._make_reference(
+                write, read, node, flag_index, identity_index - start, self._size - start
+            )
+
+        if not self._frames_stack:
+
+            def flatten(aggregate: EntityOrVo) -> Flat:
+                values: typing.List[typing.Any] = []
+                write(aggregate, values)
+                return tuple(values)
+
+            def unflatten(values: Flat, load_reference: typing.Optional[ReferenceLoader] = None) -> EntityOrVo:
+                return read(values, load_reference)
+
+            self._result = Flattener(flatten, unflatten)
+            return
+
+        name = node.name
+
+        def write_nested(ef_object: typing.Any, values: typing.List[typing.Any]) -> None:
+            write(getattr(ef_object, name), values)
+
+        parent_writers, parent_readers, _start = self._frames_stack[-1]
+        parent_writers.append(write_nested)
+        parent_readers.append(read)
+
+    @staticmethod
+    def _make_optional(write: Writer, read: Reader, flag_index: int, size: int) -> typing.Tuple[Writer, Reader]:
+        absent = (False,) + (None,) * size
+
+        def write_optional(ef_object: typing.Any, values: typing.List[typing.Any]) -> None:
+            if ef_object is None:
+                values.extend(absent)
+                return
+            values.append(True)
+            write(ef_object, values)
+
+        def read_optional(values: Flat, load_reference: typing.Optional[ReferenceLoader]) -> typing.Any:
+            if not values[flag_index]:
+                return None
+            return read(values, load_reference)
+
+        return write_optional, read_optional
+
+    @staticmethod
+    def _make_reference(
+        write: Writer, read: Reader, entity: EntityNode, flag_index: int, identity_offset: int, size: int
+    ) -> typing.Tuple[Writer, Reader]:
+        identity_name = entity.identity.name
+        identity_index = flag_index + 1 + identity_offset
+        fields_before_identity = (None,) * identity_offset
+        fields_after_identity = (None,) * (size - identity_offset - 1)
+
+        def write_reference(ef_object: typing.Any, values: typing.List[typing.Any]) -> None:
+            if not lazy.is_unloaded(ef_object):
+                write(ef_object, values)
+                return
+            # flattening must not load the entity, let alone from a session of someone else
+            values.append(REFERENCE)
+            values.extend(fields_before_identity)
+            values.append(getattr(ef_object, identity_name))
+            values.extend(fields_after_identity)
+
+        def read_reference(values: Flat, load_reference: typing.Optional[ReferenceLoader]) -> typing.Any:
+            if values[flag_index] != REFERENCE:
+                return read(values, load_reference)
+            if load_reference is None:
+                raise ValueError(f"Reference to {entity.type.__name__} can not be restored without load_reference")
+            return load_reference(entity, values[identity_index])
+
+        return write_reference, read_reference
+
+    def visit_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
+        self._visit_list()
+
+    def leave_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
+        self._leave_list(list_of_entities)
+
+    def visit_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> None:
+        self._visit_list()
+
+    def leave_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> None:
+        self._leave_list(list_of_value_objects)
+
+    def _visit_list(self) -> None:
+        # items are flattened into tuples of their own, with positions counted from zero
+        self._outer_sizes_stack.append(self._size)
+        self._size = 0
+        self._frames_stack.append(([], [], self._size))
+        self._identity_indexes_stack.append(None)
+
+    def _leave_list(self, node: Node) -> None:
+        writers, readers, _start = self._frames_stack.pop()
+        self._identity_indexes_stack.pop()
+        self._size = self._outer_sizes_stack.pop()
+        item_cls = node.type
+        name = node.name
+        get_items = itemgetter(self._size)
+        self._size += 1
+
+        def flatten_item(item: typing.Any) -> Flat:
+            values: typing.List[typing.Any] = []
+            for writer in writers:
+                writer(item, values)
+            return tuple(values)
+
+        def write_list(ef_object: typing.Any, values: typing.List[typing.Any]) -> None:
+            values.append(tuple(flatten_item(item) for item in getattr(ef_object, name)))
+
+        def read_list(values: Flat, load_reference: typing.Optional[ReferenceLoader]) -> typing.List[typing.Any]:
+            return [item_cls(*[reader(item, load_reference) for reader in readers]) for item in get_items(values)]
+
+        parent_writers, parent_readers, _start = self._frames_stack[-1]
+        parent_writers.append(write_list)
+        parent_readers.append(read_list)
+
+
+def for_entity(registry: Registry, entity_cls: typing.Type[Entity]) -> Flattener:
+    if entity_cls not in registry.entities_flatteners:
+        visitor = FlatteningVisitor()
+        visitor.traverse_from(registry.entities_to_aets[entity_cls].root)
+        registry.entities_flatteners[entity_cls] = visitor.result
+    return registry.entities_flatteners[entity_cls]
@@ -0,0 +1,101 @@
+import abc
+import math
+import threading
+import typing
+from collections import deque
+
+import attr
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class OperationMetrics:
+    entity_cls: typing.Type
+    # name of repository's method, e.g. "get" or "save_many"
+    operation: str
+    # wall time in seconds, split into phases below
+    duration: float
+    # executing statements and fetching results, including ORM's own work - all that is not spent in other phases
+    query_time: float
+    # translating between aggregates and models or rows, in both directions
+    hydrate_time: float
+    # writing - flushing models or executing write statements, merge loading stored models counts as query time
+    flush_time: float
+    # rows (or ORM results) aggregates were populated from
+    rows: int
+    statements: int
+
+
+class Instrumentation(abc.ABC):
+    """Receives metrics of every operation of repositories it is set on, in threads that run them."""
+
+    @abc.abstractmethod
+    def record(self, metrics: OperationMetrics) -> None:
+        pass
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Summary:
+    count: int
+    # percentiles of duration, in seconds
+    p50: float
+    p90: float
+    p99: float
+    max: float
+    mean_query_time: float
+    mean_hydrate_time: float
+    mean_flush_time: float
+    mean_rows: float
+    mean_statements: float
+
+
+def percentile(sorted_values: typing.Sequence[float], percent: float) -> float:
+    """Nearest-rank percentile of non-empty, sorted values."""
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class MetricsCollector(Instrumentation):
+    """Keeps the latest `max_samples` metrics of every operation of every entity, to be summarized on demand."""
+
+    def __init__(self, max_samples: int = 10000) -> None:
+        self._max_samples = max_samples
+        self._samples: typing.Dict[typing.Tuple[typing.Type, str], typing.Deque[OperationMetrics]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, metrics: OperationMetrics) -> None:
+        key = (metrics.entity_cls, metrics.operation)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self._max_samples)
+            samples.append(metrics)
+
+    def samples(self, entity_cls: typing.Type, operation: str) -> typing.List[OperationMetrics]:
+        with self._lock:
+            return list(self._samples.get((entity_cls, operation), ()))
+
+    def summaries(self) -> typing.Dict[typing.Tuple[typing.Type, str], Summary]:
+        with self._lock:
+            samples_by_key = {key: list(samples) for key, samples in self._samples.items()}
+        return {key: self._summarize(samples) for key, samples in samples_by_key.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+    @staticmethod
+    def _summarize(samples: typing.List[OperationMetrics]) -> Summary:
+        durations = sorted(metrics.duration for metrics in samples)
+        count = len(samples)
+        return Summary(
+            count=count,
+            p50=percentile(durations, 50),
+            p90=percentile(durations, 90),
+            p99=percentile(durations, 99),
+            max=durations[-1],
+            mean_query_time=sum(metrics.query_time for metrics in samples) / count,
+            mean_hydrate_time=sum(metrics.hydrate_time for metrics in samples) / count,
+            mean_flush_time=sum(metrics.flush_time for metrics in samples) / count,
+            mean_rows=sum(metrics.rows for metrics in samples) / count,
+            mean_statements=sum(metrics.statements for metrics in samples) / count,
+        )
@@ -0,0 +1,60 @@
+import typing
+
+from entity_framework.entity import Entity
+
+
+Loader = typing.Callable[[typing.Any], Entity]
+
+
+class LazyEntity:
+    """Stands in for a nested entity until any of its fields, other than identity, is accessed.
+
+    Pretends to be an instance of the entity class (via `__class__`), so that it compares equal to loaded entities.
+    Once loaded, all reads and writes go to the loaded entity.
+    """
+
+    __slots__ = ("_entity_cls", "_identity_name", "_identity", "_loader", "_target")
+
+    def __init__(
+        self, entity_cls: typing.Type[Entity], identity_name: str, identity: typing.Any, loader: Loader
+    ) -> None:
+        object.__setattr__(self, "_entity_cls", entity_cls)
+        object.__setattr__(self, "_identity_name", identity_name)
+        object.__setattr__(self, "_identity", identity)
+        object.__setattr__(self, "_loader", loader)
+        object.__setattr__(self, "_target", None)
+
+    @property  # type: ignore
+    def __class__(self) -> typing.Type[Entity]:
+        return self._entity_cls
+
+    def _load(self) -> Entity:
+        if self._target is None:
+            object.__setattr__(self, "_target", self._loader(self._identity))
+        return self._target
+
+    def __getattr__(self, name: str) -> typing.Any:
+        if name == self._identity_name and self._target is None:
+            return self._identity
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name: str, value: typing.Any) -> None:
+        setattr(self._load(), name, value)
+
+    def __eq__(self, other: typing.Any) -> bool:
+        return self._load() == other
+
+    def __ne__(self, other: typing.Any) -> bool:
+        return self._load() != other
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        if self._target is None:
+            return f"<lazy {self._entity_cls.__name__} {self._identity_name}={self._identity!r}>"
+        return repr(self._target)
+
+
+def is_unloaded(ef_object: typing.Any) -> bool:
+    # type() is not fooled by __class__ of the proxy
+    return type(ef_object) is LazyEntity and object.__getattribute__(ef_object, "_target") is None
@@ -1,4 +1,4 @@
-from typing import Dict, Type
+from typing import Any, Dict, Type
 
 import attr
 
@@ -9,3 +9,4 @@ from entity_framework.entity import Entity
 @attr.s(auto_attribs=True)
 class Registry:
     entities_to_aets: Dict[Type[Entity], AbstractEntityTree] = attr.Factory(dict)
+    entities_flatteners: Dict[Type[Entity], Any] = attr.Factory(dict)
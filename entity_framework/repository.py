@@ -10,6 +10,10 @@ EntityType = typing.TypeVar("EntityType")
 IdentityType = typing.TypeVar("IdentityType")
 
 
+class EntityNotFound(LookupError):
+    """Raised by repositories of all storages, which may subclass it with their own not found exceptions."""
+
+
 class RepositoryMeta(typing.GenericMeta):
     def __new__(
         mcs,
@@ -28,8 +32,11 @@ class RepositoryMeta(typing.GenericMeta):
         if not inspect.isabstract(cls):
             assert isinstance(getattr(cls, "registry", None), Registry)
             last_base_class_origin = getattr(bases[-1], "__origin__", None)
-            assert (
-                last_base_class_origin is ReadOnlyRepository or last_base_class_origin is Repository
+            assert last_base_class_origin in (
+                ReadOnlyRepository,
+                Repository,
+                AsyncReadOnlyRepository,
+                AsyncRepository,
             )  # TODO: komunikat?
             args = getattr(bases[-1], "__args__", None)
             if args:
@@ -54,6 +61,10 @@ class ReadOnlyRepository(typing.Generic[EntityType, IdentityType], metaclass=Rep
     def get(self, identity: IdentityType) -> EntityType:
         pass
 
+    @abc.abstractmethod
+    def get_many(self, identities: typing.Iterable[IdentityType]) -> typing.List[EntityType]:
+        pass
+
 
 class Repository(typing.Generic[EntityType, IdentityType], metaclass=RepositoryMeta):
     @classmethod
@@ -65,6 +76,52 @@ class Repository(typing.Generic[EntityType, IdentityType], metaclass=RepositoryM
     def get(self, identity: IdentityType) -> EntityType:
         pass
 
+    @abc.abstractmethod
+    def get_many(self, identities: typing.Iterable[IdentityType]) -> typing.List[EntityType]:
+        pass
+
     @abc.abstractmethod
     def save(self, entity: EntityType) -> None:
         pass
+
+    @abc.abstractmethod
+    def save_many(self, entities: typing.Iterable[EntityType]) -> None:
+        pass
+
+
+class AsyncReadOnlyRepository(typing.Generic[EntityType, IdentityType], metaclass=RepositoryMeta):
+    @classmethod
+    @abc.abstractmethod
+    def prepare(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def get(self, identity: IdentityType) -> EntityType:
+        pass
+
+    @abc.abstractmethod
+    async def get_many(self, identities: typing.Iterable[IdentityType]) -> typing.List[EntityType]:
+        pass
+
+
+class AsyncRepository(typing.Generic[EntityType, IdentityType], metaclass=RepositoryMeta):
+    @classmethod
+    @abc.abstractmethod
+    def prepare(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def get(self, identity: IdentityType) -> EntityType:
+        pass
+
+    @abc.abstractmethod
+    async def get_many(self, identities: typing.Iterable[IdentityType]) -> typing.List[EntityType]:
+        pass
+
+    @abc.abstractmethod
+    async def save(self, entity: EntityType) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def save_many(self, entities: typing.Iterable[EntityType]) -> None:
+        pass
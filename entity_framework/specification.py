@@ -0,0 +1,91 @@
+import typing
+
+import attr
+
+from entity_framework.entity import Entity
+
+
+class Specification:
+    """Storage-agnostic criteria on fields of an aggregate, combined with &, | and ~."""
+
+    def __and__(self, other: "Specification") -> "Specification":
+        return And(self, other)
+
+    def __or__(self, other: "Specification") -> "Specification":
+        return Or(self, other)
+
+    def __invert__(self) -> "Specification":
+        return Not(self)
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Comparison(Specification):
+    entity_cls: typing.Type[Entity]
+    # names of fields leading from the aggregate to compared one, e.g. ("current_subscription", "plan_id")
+    path: typing.Tuple[str, ...]
+    # one of "==", "!=", "<", "<=", ">", ">=", "in"
+    operator: str
+    value: typing.Any
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class And(Specification):
+    left: Specification
+    right: Specification
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Or(Specification):
+    left: Specification
+    right: Specification
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Not(Specification):
+    specification: Specification
+
+
+class Path:
+    """Records attribute accesses, so that comparing it builds a Comparison. Paths are checked once compiled."""
+
+    __slots__ = ("_entity_cls", "_names")
+
+    def __init__(self, entity_cls: typing.Type[Entity], names: typing.Tuple[str, ...] = ()) -> None:
+        self._entity_cls = entity_cls
+        self._names = names
+
+    def __getattr__(self, name: str) -> "Path":
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return Path(self._entity_cls, (*self._names, name))
+
+    def _compare(self, operator: str, value: typing.Any) -> Comparison:
+        return Comparison(self._entity_cls, self._names, operator, value)
+
+    def __eq__(self, value: typing.Any) -> Comparison:  # type: ignore
+        return self._compare("==", value)
+
+    def __ne__(self, value: typing.Any) -> Comparison:  # type: ignore
+        return self._compare("!=", value)
+
+    def __lt__(self, value: typing.Any) -> Comparison:
+        return self._compare("<", value)
+
+    def __le__(self, value: typing.Any) -> Comparison:
+        return self._compare("<=", value)
+
+    def __gt__(self, value: typing.Any) -> Comparison:
+        return self._compare(">", value)
+
+    def __ge__(self, value: typing.Any) -> Comparison:
+        return self._compare(">=", value)
+
+    def in_(self, values: typing.Iterable[typing.Any]) -> Comparison:
+        return self._compare("in", tuple(values))
+
+    __hash__ = None  # type: ignore
+
+
+def fields_of(entity_cls: typing.Type[Entity]) -> Path:
+    """Root of paths for specifications, e.g. `fields_of(Subscriber).current_subscription.plan_id == 3`."""
+    return Path(entity_cls)
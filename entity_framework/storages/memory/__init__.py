@@ -0,0 +1,144 @@
+from bisect import bisect_right, insort
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Type
+
+import attr
+
+from entity_framework import flattening
+from entity_framework.entity import Entity
+from entity_framework.flattening import Flat
+from entity_framework.registry import Registry
+from entity_framework.repository import EntityNotFound, EntityType, IdentityType
+from entity_framework.specification import Specification, Comparison, And
+from entity_framework.storages.memory.specification import ValuesGetter, compile_specification, values_getter
+
+
+@attr.s(auto_attribs=True)
+class MemoryStorage:
+    """Aggregates stored by all repositories sharing it, the in-memory counterpart of a database."""
+
+    # entity -> identity -> flattened aggregate
+    aggregates: Dict[Type[Entity], Dict[Any, Flat]] = attr.Factory(dict)
+    # entity -> sorted identities of its aggregates, kept alongside `aggregates` for reads ordered by identity
+    identities: Dict[Type[Entity], List[Any]] = attr.Factory(dict)
+    # (entity, indexed path) -> value -> identities of aggregates having it at that path
+    indexes: Dict[Tuple[Type[Entity], str], Dict[Any, Set[Any]]] = attr.Factory(dict)
+
+
+class InMemoryRepo:
+    """Keeps aggregates flattened (see `entity_framework.flattening`) in a dict keyed by identity.
+
+    Every read unflattens stored tuples into new objects, so changes to returned aggregates are not visible to anyone
+    until they are saved. Equality criteria of `find` on paths listed in `indexes` look up matching identities instead
+    of scanning all aggregates.
+    """
+
+    registry: Registry = None
+    # dotted paths of fields, e.g. "current_subscription.plan_id"
+    indexes: Sequence[str] = ()
+
+    _identity_name: Optional[str] = None
+    _indexes_getters: Dict[str, ValuesGetter] = {}
+
+    @classmethod
+    def prepare(cls, entity_cls: Type[EntityType]) -> None:
+        cls.entity = entity_cls
+        root = cls.registry.entities_to_aets[entity_cls].root
+        cls._identity_name = root.identity.name
+        cls._indexes_getters = {path: values_getter(root, path.split(".")) for path in cls.indexes}
+
+    def __init__(self, storage: MemoryStorage) -> None:
+        self._aggregates = storage.aggregates.setdefault(self.entity, {})
+        self._identities = storage.identities.setdefault(self.entity, [])
+        self._indexes = {path: storage.indexes.setdefault((self.entity, path), {}) for path in self.indexes}
+        self._flattener = flattening.for_entity(self.registry, self.entity)
+
+    def get(self, identity: IdentityType) -> EntityType:
+        flat = self._aggregates.get(identity)
+        if flat is None:
+            raise EntityNotFound(f"No aggregate found for identity: {identity}")
+        return self._flattener.unflatten(flat)
+
+    def get_many(self, identities: Iterable[IdentityType]) -> List[EntityType]:
+        identities = list(identities)
+        missing = [identity for identity in identities if identity not in self._aggregates]
+        if missing:
+            raise EntityNotFound(f"No aggregates found for identities: {missing}")
+        aggregates = {identity: self.get(identity) for identity in dict.fromkeys(identities)}
+        return [aggregates[identity] for identity in identities]
+
+    def save(self, entity: EntityType) -> None:
+        identity = getattr(entity, self._identity_name)
+        previous = self._aggregates.get(identity)
+        if self._indexes:
+            if previous is not None:
+                self._update_indexes(self._flattener.unflatten(previous), identity, set.discard)
+            self._update_indexes(entity, identity, set.add)
+        if previous is None:
+            insort(self._identities, identity)
+        self._aggregates[identity] = self._flattener.flatten(entity)
+
+    def save_many(self, entities: Iterable[EntityType]) -> None:
+        for entity in entities:
+            self.save(entity)
+
+    def _update_indexes(
+        self, aggregate: EntityType, identity: IdentityType, update: Callable[[set, Any], None]
+    ) -> None:
+        for path, index in self._indexes.items():
+            for value in self._indexes_getters[path](aggregate):
+                update(index.setdefault(value, set()), identity)
+
+    def exists(self, identity: IdentityType) -> bool:
+        return identity in self._aggregates
+
+    def exists_many(self, identities: Iterable[IdentityType]) -> List[bool]:
+        return [identity in self._aggregates for identity in identities]
+
+    def count(self, where: Optional[Specification] = None) -> int:
+        if where is None:
+            return len(self._aggregates)
+        return len(self.find(where))
+
+    def find(self, specification: Specification, limit: Optional[int] = None) -> List[EntityType]:
+        """Returns aggregates satisfying the specification, ordered by identity."""
+        return list(self._iterate_ordered(specification, limit))
+
+    def page(self, after_identity: Optional[IdentityType] = None, limit: int = 100) -> List[EntityType]:
+        start = 0 if after_identity is None else bisect_right(self._identities, after_identity)
+        end = start + limit
+        identities = self._identities[start:end]
+        return [self._flattener.unflatten(self._aggregates[identity]) for identity in identities]
+
+    def iterate(self, batch_size: int = 1000, where: Optional[Specification] = None) -> Iterator[EntityType]:
+        # batch_size is accepted for compatibility with other storages, aggregates are already in memory
+        if where is None:
+            return (self._flattener.unflatten(flat) for flat in list(self._aggregates.values()))
+        return self._iterate_ordered(where, None)
+
+    def _iterate_ordered(self, specification: Specification, limit: Optional[int]) -> Iterator[EntityType]:
+        matches = compile_specification(self.registry.entities_to_aets[self.entity].root, specification)
+        candidates = self._candidates(specification)
+        identities = list(self._identities) if candidates is None else sorted(candidates & self._aggregates.keys())
+        found = 0
+        for identity in identities:
+            if limit is not None and found >= limit:
+                return
+            aggregate = self._flattener.unflatten(self._aggregates[identity])
+            if matches(aggregate):
+                found += 1
+                yield aggregate
+
+    def _candidates(self, specification: Specification) -> Optional[Set[IdentityType]]:
+        """Identities possibly satisfying the specification according to indexes, None if all of them do."""
+        if isinstance(specification, Comparison) and specification.value is not None:
+            index = self._indexes.get(".".join(specification.path))
+            if index is not None and specification.operator == "==":
+                return index.get(specification.value, set())
+            if index is not None and specification.operator == "in":
+                return set().union(*[index.get(value, set()) for value in specification.value])
+        if isinstance(specification, And):
+            left, right = self._candidates(specification.left), self._candidates(specification.right)
+            if left is None or right is None:
+                return right if left is None else left
+            return left & right
+        return None
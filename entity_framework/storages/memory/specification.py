@@ -0,0 +1,87 @@
+import operator
+from typing import Any, Callable, Dict, Iterable, List, Sequence
+
+from entity_framework.abstract_entity_tree import Node, FieldNode, EntityNode, ValueObjectNode
+from entity_framework.entity import EntityOrVo
+from entity_framework.specification import Specification, Comparison, And, Or, Not
+
+
+Predicate = Callable[[EntityOrVo], bool]
+ValuesGetter = Callable[[EntityOrVo], List[Any]]
+
+operators: Dict[str, Callable[[Any, Any], bool]] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, values: value in values,
+}
+
+
+def compile_specification(root: EntityNode, specification: Specification) -> Predicate:
+    """Turns specification into a predicate on aggregates, following semantics of SQL storages.
+
+    Comparing with None checks for absence, otherwise absent values never match. Fields of an absent value object
+    are absent, while criteria on an absent entity never match. A list matches if any of its items does.
+    """
+    if isinstance(specification, (And, Or)):
+        left = compile_specification(root, specification.left)
+        right = compile_specification(root, specification.right)
+        if isinstance(specification, And):
+            return lambda aggregate: left(aggregate) and right(aggregate)
+        return lambda aggregate: left(aggregate) or right(aggregate)
+    if isinstance(specification, Not):
+        predicate = compile_specification(root, specification.specification)
+        return lambda aggregate: not predicate(aggregate)
+    if isinstance(specification, Comparison):
+        if specification.entity_cls is not root.type:
+            raise ValueError(f"Specification of {specification.entity_cls.__name__} used for {root.type.__name__}")
+        get_values = values_getter(root, specification.path)
+        matches = _matcher(specification.operator, specification.value)
+        return lambda aggregate: any(matches(value) for value in get_values(aggregate))
+
+    raise TypeError(f"Unsupported specification - {specification}")
+
+
+def _matcher(operator_name: str, compared: Any) -> Callable[[Any], bool]:
+    if compared is None and operator_name == "==":
+        return lambda value: value is None
+    if compared is None and operator_name == "!=":
+        return lambda value: value is not None
+    compare = operators[operator_name]
+    return lambda value: value is not None and compare(value, compared)
+
+
+def values_getter(node: Node, path: Sequence[str]) -> ValuesGetter:
+    """Compiles a function reading all values at the path of field names (more than one if it goes through lists)."""
+    if not path:
+        raise ValueError(f"Only fields can be compared, got {node.name}")
+
+    name, rest = path[0], path[1:]
+    children = [child for child in node.children if child.name == name]
+    if not children:
+        raise ValueError(f"{node.type.__name__} has no field {name}")
+    child = children[0]
+
+    if isinstance(child, FieldNode):
+        if rest:
+            raise ValueError(f"{name} is a field of {node.type.__name__}, it has no fields")
+        return lambda ef_object: [getattr(ef_object, name)]
+
+    get_nested_values = values_getter(child, rest)
+    if isinstance(child, ValueObjectNode):
+        return lambda ef_object: _values_of_value_object(getattr(ef_object, name), get_nested_values)
+    if isinstance(child, EntityNode):
+        return lambda ef_object: _values_of_entity(getattr(ef_object, name), get_nested_values)
+    # list of entities or value objects
+    return lambda ef_object: [value for item in getattr(ef_object, name) for value in get_nested_values(item)]
+
+
+def _values_of_value_object(vo: Any, get_values: ValuesGetter) -> List[Any]:
+    return [None] if vo is None else get_values(vo)
+
+
+def _values_of_entity(entity: Any, get_values: ValuesGetter) -> Iterable[Any]:
+    return [] if entity is None else get_values(entity)
@@ -0,0 +1,96 @@
+from typing import Iterable, List, Optional, Type
+
+import inflection
+from pymongo import ReplaceOne
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+from entity_framework.repository import EntityNotFound, EntityType, IdentityType
+from entity_framework.specification import Specification
+from entity_framework.storages.mongo.documents import IDENTITY_KEY, DocumentCodecBuildingVisitor
+from entity_framework.storages.mongo.registry import MongoRegistry
+from entity_framework.storages.mongo.specification import compile_specification
+
+
+class NoAggregateFound(EntityNotFound):
+    pass
+
+
+class MongoRepo:
+    """Keeps every aggregate as a single document, with nested entities and value objects embedded in it.
+
+    Encoder and decoder of documents are compiled once per entity class. Reads of many aggregates are a single `$in`
+    query and writes of many are a single unordered bulk of upserts, instead of a roundtrip per aggregate.
+    """
+
+    registry: MongoRegistry = None
+    # defaults to pluralized, underscored name of the entity, e.g. "subscribers"
+    collection_name: Optional[str] = None
+
+    @classmethod
+    def prepare(cls, entity_cls: Type[EntityType]) -> None:
+        cls.entity = entity_cls
+        if cls.collection_name is None:
+            cls.collection_name = inflection.pluralize(inflection.underscore(entity_cls.__name__))
+        if entity_cls not in cls.registry.documents_codecs:
+            visitor = DocumentCodecBuildingVisitor()
+            visitor.traverse_from(cls.registry.entities_to_aets[entity_cls].root)
+            cls.registry.documents_codecs[entity_cls] = visitor.result
+
+    def __init__(self, database: Database) -> None:
+        self._collection: Collection = database[self.collection_name]
+        self._codec = self.registry.documents_codecs[self.entity]
+
+    def get(self, identity: IdentityType) -> EntityType:
+        document = self._collection.find_one({IDENTITY_KEY: identity})
+        if document is None:
+            raise NoAggregateFound(f"No aggregate found for identity: {identity}")
+        return self._codec.decode(document)
+
+    def get_many(self, identities: Iterable[IdentityType]) -> List[EntityType]:
+        identities = list(identities)
+        documents = {
+            document[IDENTITY_KEY]: document
+            for document in self._collection.find({IDENTITY_KEY: {"$in": list(dict.fromkeys(identities))}})
+        }
+        missing = [identity for identity in identities if identity not in documents]
+        if missing:
+            raise NoAggregateFound(f"No aggregates found for identities: {missing}")
+        aggregates = {identity: self._codec.decode(document) for identity, document in documents.items()}
+        return [aggregates[identity] for identity in identities]
+
+    def save(self, entity: EntityType) -> None:
+        document = self._codec.encode(entity)
+        self._collection.replace_one({IDENTITY_KEY: document[IDENTITY_KEY]}, document, upsert=True)
+
+    def save_many(self, entities: Iterable[EntityType]) -> None:
+        # order of unordered bulk writes is not guaranteed, so only the last version of each aggregate is sent
+        documents = {}
+        for entity in entities:
+            document = self._codec.encode(entity)
+            documents[document[IDENTITY_KEY]] = document
+        if documents:
+            self._collection.bulk_write(
+                [
+                    ReplaceOne({IDENTITY_KEY: identity}, document, upsert=True)
+                    for identity, document in documents.items()
+                ],
+                ordered=False,
+            )
+
+    def exists(self, identity: IdentityType) -> bool:
+        return self._collection.count_documents({IDENTITY_KEY: identity}, limit=1) > 0
+
+    def exists_many(self, identities: Iterable[IdentityType]) -> List[bool]:
+        identities = list(identities)
+        found = {
+            document[IDENTITY_KEY]
+            for document in self._collection.find({IDENTITY_KEY: {"$in": identities}}, projection={IDENTITY_KEY: True})
+        }
+        return [identity in found for identity in identities]
+
+    def count(self, where: Optional[Specification] = None) -> int:
+        if where is None:
+            return self._collection.count_documents({})
+        root = self.registry.entities_to_aets[self.entity].root
+        return self._collection.count_documents(compile_specification(root, where))
@@ -0,0 +1,137 @@
+import typing
+from decimal import Decimal
+
+import attr
+from bson.decimal128 import Decimal128
+
+from entity_framework.abstract_entity_tree import (
+    Visitor,
+    Node,
+    FieldNode,
+    EntityNode,
+    ValueObjectNode,
+    ListOfEntitiesNode,
+    ListOfValueObjectsNode,
+)
+
+
+IDENTITY_KEY = "_id"
+
+# type -> (to BSON, from BSON), types missing here (int, str, datetime, UUID...) are stored as they are
+mapping: typing.Dict[typing.Type, typing.Tuple[typing.Callable, typing.Callable]] = {
+    Decimal: (Decimal128, lambda value: value.to_decimal())
+}
+
+Document = typing.Dict[str, typing.Any]
+Encoder = typing.Callable[[typing.Any, Document], None]
+Decoder = typing.Callable[[Document], typing.Any]
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class DocumentCodec:
+    encode: typing.Callable[[typing.Any], Document]
+    decode: typing.Callable[[Document], typing.Any]
+
+
+class DocumentCodecBuildingVisitor(Visitor):
+    """Compiles AET of an aggregate into encoder and decoder of its document.
+
+    Nested entities and value objects become embedded documents keyed by field names, lists become arrays of them.
+    Identity of the aggregate root is stored under `_id`, so that it is the primary key of the collection.
+    """
+
+    def __init__(self) -> None:
+        self._frames_stack: typing.List[typing.Tuple[typing.List[Encoder], typing.List[Decoder]]] = []
+        self._result: typing.Optional[DocumentCodec] = None
+
+    @property
+    def result(self) -> DocumentCodec:
+        return self._result
+
+    def visit_field(self, field: FieldNode) -> None:
+        name = field.name
+        key = IDENTITY_KEY if field.is_identity and len(self._frames_stack) == 1 else name
+        to_bson, from_bson = mapping.get(field.type, (None, None))
+
+        def encode_field(ef_object: typing.Any, document: Document) -> None:
+            value = getattr(ef_object, name)
+            document[key] = value if to_bson is None or value is None else to_bson(value)
+
+        def decode_field(document: Document) -> typing.Any:
+            value = document[key]
+            return value if from_bson is None or value is None else from_bson(value)
+
+        encoders, decoders = self._frames_stack[-1]
+        encoders.append(encode_field)
+        decoders.append(decode_field)
+
+    def visit_entity(self, entity: EntityNode) -> None:
+        self._frames_stack.append(([], []))
+
+    def leave_entity(self, entity: EntityNode) -> None:
+        self._finish(entity, *self._leave_complex_object(entity))
+
+    def visit_value_object(self, value_object: ValueObjectNode) -> None:
+        self._frames_stack.append(([], []))
+
+    def leave_value_object(self, value_object: ValueObjectNode) -> None:
+        self._finish(value_object, *self._leave_complex_object(value_object))
+
+    def visit_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
+        self._frames_stack.append(([], []))
+
+    def leave_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
+        self._leave_list(list_of_entities)
+
+    def visit_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> None:
+        self._frames_stack.append(([], []))
+
+    def leave_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> None:
+        self._leave_list(list_of_value_objects)
+
+    def _leave_list(self, node: Node) -> None:
+        encode_item, decode_item = self._leave_complex_object(node)
+
+        def encode_list(items: typing.List[typing.Any]) -> typing.List[Document]:
+            return [encode_item(item) for item in items]
+
+        def decode_list(documents: typing.List[Document]) -> typing.List[typing.Any]:
+            return [decode_item(document) for document in documents]
+
+        self._finish(node, encode_list, decode_list)
+
+    def _leave_complex_object(self, node: Node) -> typing.Tuple[typing.Callable, typing.Callable]:
+        encoders, decoders = self._frames_stack.pop()
+        node_cls = node.type
+
+        def encode(ef_object: typing.Any) -> typing.Optional[Document]:
+            if ef_object is None:
+                return None
+            document: Document = {}
+            for encoder in encoders:
+                encoder(ef_object, document)
+            return document
+
+        def decode(document: typing.Optional[Document]) -> typing.Any:
+            if document is None:
+                return None
+            return node_cls(*[decoder(document) for decoder in decoders])
+
+        return encode, decode
+
+    def _finish(self, node: Node, encode: typing.Callable, decode: typing.Callable) -> None:
+        if not self._frames_stack:
+            self._result = DocumentCodec(encode, decode)
+            return
+
+        name = node.name
+
+        def encode_nested(ef_object: typing.Any, document: Document) -> None:
+            document[name] = encode(getattr(ef_object, name))
+
+        def decode_nested(document: Document) -> typing.Any:
+            return decode(document[name])
+
+        encoders, decoders = self._frames_stack[-1]
+        encoders.append(encode_nested)
+        decoders.append(decode_nested)
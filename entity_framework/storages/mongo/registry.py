@@ -0,0 +1,12 @@
+from typing import Dict, Type
+
+import attr
+
+from entity_framework.entity import Entity
+from entity_framework.registry import Registry
+from entity_framework.storages.mongo.documents import DocumentCodec
+
+
+@attr.s(auto_attribs=True)
+class MongoRegistry(Registry):
+    documents_codecs: Dict[Type[Entity], DocumentCodec] = attr.Factory(dict)
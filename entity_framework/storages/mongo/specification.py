@@ -0,0 +1,69 @@
+import typing
+
+from entity_framework.abstract_entity_tree import Node, FieldNode, EntityNode
+from entity_framework.specification import Specification, Comparison, And, Or, Not
+from entity_framework.storages.mongo.documents import IDENTITY_KEY, Document, mapping
+
+
+operators: typing.Dict[str, str] = {
+    "==": "$eq",
+    "!=": "$ne",
+    "<": "$lt",
+    "<=": "$lte",
+    ">": "$gt",
+    ">=": "$gte",
+    "in": "$in",
+}
+
+
+def compile_specification(root: EntityNode, specification: Specification) -> Document:
+    """Turns specification into a query filter on documents built by DocumentCodecBuildingVisitor.
+
+    Paths become dotted keys, which MongoDB resolves through embedded documents and arrays alike, so a list matches
+    if any of its items does. Comparing with None checks for absence. Otherwise absent values never match, `!=`
+    included - though on lists it matches only if none of the items has the value, as MongoDB compares arrays.
+    """
+    if isinstance(specification, And):
+        return {
+            "$and": [compile_specification(root, specification.left), compile_specification(root, specification.right)]
+        }
+    if isinstance(specification, Or):
+        return {
+            "$or": [compile_specification(root, specification.left), compile_specification(root, specification.right)]
+        }
+    if isinstance(specification, Not):
+        return {"$nor": [compile_specification(root, specification.specification)]}
+    if isinstance(specification, Comparison):
+        if specification.entity_cls is not root.type:
+            raise ValueError(f"Specification of {specification.entity_cls.__name__} used for {root.type.__name__}")
+        field = _field_at(root, specification.path)
+        key = IDENTITY_KEY if field is root.identity else ".".join(specification.path)
+        return {key: _condition(field, specification.operator, specification.value)}
+
+    raise TypeError(f"Unsupported specification - {specification}")
+
+
+def _condition(field: FieldNode, operator_name: str, compared: typing.Any) -> Document:
+    to_bson, _from_bson = mapping.get(field.type, (None, None))
+    if to_bson is not None and compared is not None:
+        compared = [to_bson(value) for value in compared] if operator_name == "in" else to_bson(compared)
+    if operator_name == "!=" and compared is not None:
+        return {"$nin": [compared, None]}
+    return {operators[operator_name]: compared}
+
+
+def _field_at(node: Node, path: typing.Sequence[str]) -> FieldNode:
+    if not path:
+        raise ValueError(f"Only fields can be compared, got {node.name}")
+
+    name, rest = path[0], path[1:]
+    children = [child for child in node.children if child.name == name]
+    if not children:
+        raise ValueError(f"{node.type.__name__} has no field {name}")
+    child = children[0]
+
+    if isinstance(child, FieldNode):
+        if rest:
+            raise ValueError(f"{name} is a field of {node.type.__name__}, it has no fields")
+        return child
+    return _field_at(child, rest)
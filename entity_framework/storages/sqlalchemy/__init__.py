@@ -1,61 +1,694 @@
-from typing import Optional, Type
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type, Union
 
+from sqlalchemy import and_, bindparam, func, select
+from sqlalchemy.engine import ResultProxy
+from sqlalchemy.ext.baked import BakedQuery
 from sqlalchemy.orm import Session, Query, exc
+from sqlalchemy.orm.attributes import InstrumentedAttribute
+from sqlalchemy.sql import ClauseElement, Select
+from sqlalchemy.sql.dml import Insert
 from sqlalchemy.ext.declarative import DeclarativeMeta
 
-from entity_framework.repository import EntityType, IdentityType
-from entity_framework.storages.sqlalchemy.populating_aggregates.visitor import PopulatingAggregateVisitor
+from entity_framework import flattening
+from entity_framework.abstract_entity_tree import EntityNode, prune
+from entity_framework.caching import CacheBackend
+from entity_framework.instrumentation import Instrumentation
+from entity_framework.repository import EntityType, EntityNotFound, IdentityType
+from entity_framework.specification import Specification
+from entity_framework.storages.sqlalchemy.populating_aggregates.visitor import (
+    AggregatePopulator,
+    CollectionLoader,
+    PopulatingAggregateVisitor,
+    PopulatingAggregateFromRowVisitor,
+    RowsLoader,
+    lazy_reference_of,
+    nested_entities_of,
+)
 from entity_framework.storages.sqlalchemy.constructing_model.visitor import ModelConstructingVisitor
 from entity_framework.storages.sqlalchemy.populating_model.visitor import ModelPopulatingVisitor
+from entity_framework.storages.sqlalchemy.populating_rows.visitor import (
+    Collection,
+    Row,
+    RowsPopulator,
+    RowsPopulatingVisitor,
+    primary_key_of,
+)
+from entity_framework.storages.sqlalchemy.projecting.visitor import ProjectionPopulatingVisitor
 from entity_framework.storages.sqlalchemy.querying.visitor import QueryBuildingVisitor
-from entity_framework.storages.sqlalchemy.registry import SaRegistry
+from entity_framework.storages.sqlalchemy import identity_map, upserts
+from entity_framework.storages.sqlalchemy.instrumentation import flushing, hydrating, instrumented
+from entity_framework.storages.sqlalchemy.registry import LazyPaths, Projection, SaRegistry
+from entity_framework.storages.sqlalchemy.specification import compile_specification
+
+
+class NoAggregateFound(EntityNotFound, exc.NoResultFound):
+    pass
+
+
+def _chunks(sequence: Sequence, size: int) -> Iterable[Sequence]:
+    for start in range(0, len(sequence), size):
+        end = start + size
+        yield sequence[start:end]
+
+
+def _snapshot(rows: List[Row]) -> identity_map.Snapshot:
+    return {(model, primary_key_of(model, row)): tuple(row.values()) for model, row in rows}
+
+
+def _rows_by_model(rows: Iterable[Row]) -> Dict[Type, Dict[tuple, dict]]:
+    rows_by_model: Dict[Type, Dict[tuple, dict]] = defaultdict(dict)
+    for model, row in rows:
+        rows_by_model[model][primary_key_of(model, row)] = row
+    return rows_by_model
 
 
 class SqlAlchemyRepo:
     base: DeclarativeMeta = None
     registry: SaRegistry = None
 
+    # Keeps IN (...) clauses of get_many and save_many within limits of bound parameters of all supported dialects
+    get_many_chunk_size: int = 500
+    # Writes rows with dialect's INSERT ... ON CONFLICT instead of loading them first with session.merge
+    native_upsert: bool = False
+    # Second-level cache of flattened aggregates consulted by get/get_many after the identity map
+    cache: Optional[CacheBackend] = None
+    # Snapshots loaded aggregates, so that save() issues UPDATEs only for changed columns of changed tables
+    dirty_tracking: bool = False
+    # Reads with a Core select and populates aggregates straight from rows, skipping ORM instances altogether
+    core_reads: bool = False
+    # Receives timing, rows and statements of every operation, see `entity_framework.instrumentation`
+    instrumentation: Optional[Instrumentation] = None
+
+    # nested entities loaded lazily by default and all the ones which may be, see SaRegistry.lazy_fields
+    _lazy_paths: LazyPaths = frozenset()
+    _nested_entities_paths: LazyPaths = frozenset()
     _query: Optional[Query] = None
+    _select: Optional[Select] = None
+    _identity_column: Optional[InstrumentedAttribute] = None
+    _baked_query: Optional[BakedQuery] = None
+    _baked_many_query: Optional[BakedQuery] = None
+    _select_many: Optional[Select] = None
+    _select_existing: Optional[Select] = None
+    _select_count: Optional[Select] = None
 
     def __init__(self, session: Session) -> None:
         self._session = session
+        self._identity_map = identity_map.for_session(session)
+        self._snapshots = identity_map.snapshots_for_session(session)
 
     @classmethod
     def prepare(cls, entity_cls: Type[EntityType]) -> None:
         assert cls.base, "Must set cls base to an instance of DeclarativeMeta!"
         if not getattr(cls, "entity", None):
             cls.entity = entity_cls
-            aet = cls.registry.entities_to_aets[entity_cls]
+        if cls.entity not in cls.registry.entities_models:
+            # models are shared by all repositories of an entity using the same registry
+            aet = cls.registry.entities_to_aets[cls.entity]
             ModelConstructingVisitor(cls.base, cls.registry).traverse_from(aet.root)
 
+        aet = cls.registry.entities_to_aets[cls.entity]
+        nested_entities = list(nested_entities_of(aet.root))
+        cls._nested_entities_paths = frozenset(entity.path for _owner, entity in nested_entities)
+        cls._lazy_paths = frozenset(
+            entity.path for owner, entity in nested_entities if (owner, entity.name) in cls.registry.lazy_fields
+        )
+
+        if cls.entity not in cls.registry.models_populators:
+            model_populating_visitor = ModelPopulatingVisitor(cls.registry)
+            model_populating_visitor.traverse_from(aet.root)
+            cls.registry.models_populators[cls.entity] = model_populating_visitor.result
+
+        if cls.entity not in cls.registry.aggregates_populators:
+            aggregate_populating_visitor = PopulatingAggregateVisitor(cls.registry, cls._lazy_paths)
+            aggregate_populating_visitor.traverse_from(aet.root)
+            cls.registry.aggregates_populators[cls.entity] = aggregate_populating_visitor.result
+
     @property
     def query(self) -> Query:
         if not getattr(self.__class__, "_query", None):
             aet = self.registry.entities_to_aets[self.entity]
-            visitor = QueryBuildingVisitor(self.registry)
+            visitor = QueryBuildingVisitor(self.registry, lazy_paths=self._lazy_paths)
             visitor.traverse_from(aet.root)
             setattr(self.__class__, "_query", visitor.query)
 
         return self.__class__._query
 
+    @property
+    def select(self) -> Select:
+        # nested entities are always joined, since reads with lazy ones go through ORM
+        if getattr(self.__class__, "_select", None) is None:
+            aet = self.registry.entities_to_aets[self.entity]
+            visitor = QueryBuildingVisitor(self.registry)
+            visitor.traverse_from(aet.root)
+            setattr(self.__class__, "_select", visitor.select)
+
+        return self.__class__._select
+
+    @property
+    def identity_column(self) -> InstrumentedAttribute:
+        if not getattr(self.__class__, "_identity_column", None):
+            aet = self.registry.entities_to_aets[self.entity]
+            model = self.registry.entities_models[self.entity]
+            setattr(self.__class__, "_identity_column", getattr(model, aet.root.identity.name))
+
+        return self.__class__._identity_column
+
+    # Statements below are built once per repository class. Identities are bound to an expanding IN (...) parameter,
+    # so that chunks of any length share SQL compiled once
+
+    @property
+    def baked_query(self) -> BakedQuery:
+        if getattr(self.__class__, "_baked_query", None) is None:
+            query = self.query
+            # function's code is shared by all repositories, so entity has to be a part of the cache key
+            setattr(self.__class__, "_baked_query", self.registry.bakery(query.with_session, self.entity))
+
+        return self.__class__._baked_query
+
+    @property
+    def _baked_query_for_many(self) -> BakedQuery:
+        if getattr(self.__class__, "_baked_many_query", None) is None:
+            identity_column = self.identity_column
+            baked_query = self.baked_query + (
+                lambda query: query.filter(identity_column.in_(bindparam("identities", expanding=True)))
+            )
+            setattr(self.__class__, "_baked_many_query", baked_query)
+
+        return self.__class__._baked_many_query
+
+    @property
+    def _select_for_many(self) -> Select:
+        if getattr(self.__class__, "_select_many", None) is None:
+            statement = self.select.where(self.identity_column.in_(bindparam("identities", expanding=True)))
+            setattr(self.__class__, "_select_many", statement)
+
+        return self.__class__._select_many
+
+    @property
+    def _select_for_existing(self) -> Select:
+        # identities alone, from the root table - nothing is joined, nor hydrated
+        if getattr(self.__class__, "_select_existing", None) is None:
+            identity_column = self.identity_column
+            statement = select([identity_column]).where(identity_column.in_(bindparam("identities", expanding=True)))
+            setattr(self.__class__, "_select_existing", statement)
+
+        return self.__class__._select_existing
+
+    @property
+    def _select_for_count(self) -> Select:
+        if getattr(self.__class__, "_select_count", None) is None:
+            statement = select([func.count()]).select_from(self.registry.entities_models[self.entity].__table__)
+            setattr(self.__class__, "_select_count", statement)
+
+        return self.__class__._select_count
+
+    def _execute_compiled(self, model: Type, statement: ClauseElement, *multiparams: Any) -> ResultProxy:
+        # Connection's compiled cache is keyed by the statement object, so it has to be built only once
+        connection = self._session.connection(mapper=model.__mapper__)
+        return connection.execution_options(compiled_cache=self.registry.compiled_cache).execute(
+            statement, *multiparams
+        )
+
+    # Populators below are needed only by some of the settings, so they are compiled only once used
+
+    def _compile_rows_populator(self) -> None:
+        if self.entity not in self.registry.rows_populators:
+            visitor = RowsPopulatingVisitor(self.registry)
+            visitor.traverse_from(self.registry.entities_to_aets[self.entity].root)
+            self.registry.rows_collections[self.entity] = visitor.collections
+            self.registry.rows_populators[self.entity] = visitor.result
+
+    @property
+    def _rows_populator(self) -> RowsPopulator:
+        self._compile_rows_populator()
+        return self._hydrating(self.registry.rows_populators[self.entity], reads_rows=False)
+
+    @property
+    def _collections(self) -> Tuple[Collection, ...]:
+        self._compile_rows_populator()
+        return self.registry.rows_collections[self.entity]
+
+    @property
+    def _rows_loader(self) -> RowsLoader:
+        if self.entity not in self.registry.rows_loaders:
+            visitor = PopulatingAggregateFromRowVisitor(self.registry)
+            visitor.traverse_from(self.registry.entities_to_aets[self.entity].root)
+            self.registry.rows_loaders[self.entity] = visitor.result
+        return self.registry.rows_loaders[self.entity]
+
+    def _load_rows(self, loader: RowsLoader, rows: Iterable[Sequence]) -> List[Any]:
+        """Populates objects from rows, then fills their lists with one SELECT ... IN per list and chunk of owners."""
+        populate = self._hydrating(loader.populate)
+        ef_objects = [populate(row) for row in rows]
+        for collection in loader.collections:
+            self._load_collection(collection, ef_objects)
+        return ef_objects
+
+    def _load_collection(self, collection: CollectionLoader, ef_objects: List[Any]) -> None:
+        owners = collection.owners_of(ef_objects)
+        model = self.registry.entities_models[self.entity]
+        for chunk in _chunks(list(owners), self.get_many_chunk_size):
+            rows = self._execute_compiled(model, collection.select, {"owners": chunk}).fetchall()
+            collection.fill(owners, rows, self._load_rows(collection.items, rows))
+
+    @property
+    def _aggregates_populator(self) -> Callable[[Any], EntityType]:
+        return self._hydrating(self.registry.aggregates_populators[self.entity])
+
+    def _requested_lazy_paths(self, lazy: Iterable[str]) -> LazyPaths:
+        lazy_paths = frozenset(tuple(path.split(".")) for path in lazy)
+        invalid = lazy_paths - self._nested_entities_paths
+        if invalid:
+            paths = ", ".join(sorted(".".join(path) for path in invalid))
+            raise ValueError(f"Only nested entities can be loaded lazily, got: {paths}")
+        return lazy_paths
+
+    def _reads_rows(self, lazy_paths: LazyPaths) -> bool:
+        # lazy entities are loaded through ORM session, so core reads apply only when everything is loaded eagerly
+        return self.core_reads and not lazy_paths
+
+    def _loading(self, lazy_paths: LazyPaths) -> Tuple[Query, AggregatePopulator]:
+        """ORM query and aggregates populator loading given nested entities lazily, compiled once per laziness."""
+        key = (self.entity, lazy_paths)
+        if key not in self.registry.lazy_loadings:
+            root = self.registry.entities_to_aets[self.entity].root
+            query_building_visitor = QueryBuildingVisitor(self.registry, lazy_paths=lazy_paths)
+            query_building_visitor.traverse_from(root)
+            populating_visitor = PopulatingAggregateVisitor(self.registry, lazy_paths)
+            populating_visitor.traverse_from(root)
+            self.registry.lazy_loadings[key] = (query_building_visitor.query, populating_visitor.result)
+        return self.registry.lazy_loadings[key]
+
+    def _load_reference(self, entity: EntityNode, identity: Any) -> Any:
+        # nested entity of cached aggregate, that was not loaded when the aggregate was cached
+        return lazy_reference_of(self.registry, entity)(self._session, identity)
+
+    def _hydrating(self, populate: Callable, reads_rows: bool = True) -> Callable:
+        if self.instrumentation is None:
+            return populate
+        return hydrating(populate, reads_rows)
+
+    @property
+    def _flattener(self) -> flattening.Flattener:
+        return flattening.for_entity(self.registry, self.entity)
+
     # TODO: sqlalchemy class could have an utility for creating IDS
     # Or it could be put into a separate utility function that would accept repo, then would get descendant classes
     # and got the new id.
 
-    def get(self, identity: IdentityType) -> EntityType:
-        # TODO: memoize populating func
-        result = self.query.with_session(self._session).get(identity)
-        if not result:
-            # TODO: Raise more specialized exception
-            raise exc.NoResultFound
+    @instrumented
+    def get(self, identity: IdentityType, lazy: Optional[Iterable[str]] = None) -> EntityType:
+        """Fetches the aggregate, raising NoResultFound if it is missing.
+
+        Nested entities of SaRegistry.lazy_fields are loaded once any of their fields other than identity is
+        accessed. Dotted paths of nested entities given as `lazy` replace them for this call, e.g. `lazy=()` loads
+        everything eagerly. Aggregates present in the identity map or the cache are returned as they are.
+        """
+        key = (self.entity, identity)
+        if key in self._identity_map:
+            return self._identity_map[key]
+
+        if self.cache is not None and self._load_cached(identity):
+            return self._identity_map[key]
+
+        lazy_paths = self._lazy_paths if lazy is None else self._requested_lazy_paths(lazy)
+        if lazy_paths != self._lazy_paths or self._reads_rows(lazy_paths):
+            aggregate = self._fetch_many([identity], lazy_paths).get(identity)
+        else:
+            result = self.baked_query(self._session).get(identity)
+            aggregate = None if result is None else self._aggregates_populator(result)
+        if aggregate is None:
+            raise NoAggregateFound
+
+        self._track(key, aggregate)
+        if self.cache is not None:
+            self.cache.set(key, self._flattener.flatten(aggregate))
+        return aggregate
+
+    @instrumented
+    def get_many(self, identities: Iterable[IdentityType], lazy: Optional[Iterable[str]] = None) -> List[EntityType]:
+        """Fetches aggregates in chunked IN (...) queries, preserving order of requested identities.
+
+        Just like `get`, raises NoResultFound if any of the identities is missing and takes `lazy`. Repeated identity
+        yields the same aggregate instance. Aggregates present in the identity map or the cache are not queried.
+        """
+        lazy_paths = self._lazy_paths if lazy is None else self._requested_lazy_paths(lazy)
+        identities = list(identities)
+        identities_to_fetch = [
+            identity for identity in dict.fromkeys(identities) if (self.entity, identity) not in self._identity_map
+        ]
+        if self.cache is not None:
+            identities_to_fetch = [identity for identity in identities_to_fetch if not self._load_cached(identity)]
+
+        fetched = self._fetch_many(identities_to_fetch, lazy_paths)
+        missing = [identity for identity in identities_to_fetch if identity not in fetched]
+        if missing:
+            raise NoAggregateFound(f"No rows found for identities: {missing}")
+
+        for identity, aggregate in fetched.items():
+            self._track((self.entity, identity), aggregate)
+            if self.cache is not None:
+                self.cache.set((self.entity, identity), self._flattener.flatten(aggregate))
+        return [self._identity_map[(self.entity, identity)] for identity in identities]
+
+    def _fetch_many(self, identities: List[IdentityType], lazy_paths: LazyPaths) -> Dict[IdentityType, EntityType]:
+        identity_column = self.identity_column
+        aggregates = {}
+        if self._reads_rows(lazy_paths):
+            loader = self._rows_loader
+            model = self.registry.entities_models[self.entity]
+            for chunk in _chunks(identities, self.get_many_chunk_size):
+                rows = self._execute_compiled(model, self._select_for_many, {"identities": chunk})
+                for aggregate in self._load_rows(loader, rows):
+                    aggregates[getattr(aggregate, identity_column.key)] = aggregate
+            return aggregates
+
+        if lazy_paths == self._lazy_paths:
+            query = self._baked_query_for_many(self._session)
+            populate = self._aggregates_populator
+        else:
+            loading_query, populate = self._loading(lazy_paths)
+            query = loading_query.with_session(self._session).filter(
+                identity_column.in_(bindparam("identities", expanding=True))
+            )
+            populate = self._hydrating(populate)
+        for chunk in _chunks(identities, self.get_many_chunk_size):
+            for db_result in query.params(identities=chunk):
+                aggregates[getattr(db_result, identity_column.key)] = populate(db_result)
+        return aggregates
+
+    @instrumented
+    def exists(self, identity: IdentityType) -> bool:
+        return self.exists_many([identity])[0]
+
+    @instrumented
+    def exists_many(self, identities: Iterable[IdentityType]) -> List[bool]:
+        """Tells which of identities are stored, in requested order, selecting only identities from the root table."""
+        identities = list(identities)
+        identities_to_check = [
+            identity for identity in dict.fromkeys(identities) if (self.entity, identity) not in self._identity_map
+        ]
+        model = self.registry.entities_models[self.entity]
+        existing = set()
+        for chunk in _chunks(identities_to_check, self.get_many_chunk_size):
+            existing.update(
+                identity
+                for identity, in self._execute_compiled(model, self._select_for_existing, {"identities": chunk})
+            )
+        return [identity in existing or (self.entity, identity) in self._identity_map for identity in identities]
+
+    @instrumented
+    def count(self, where: Optional[Union[Specification, ClauseElement]] = None) -> int:
+        """Counts (optionally filtered) aggregates with a single COUNT over the root table."""
+        if where is None:
+            return self._execute_compiled(self.registry.entities_models[self.entity], self._select_for_count).scalar()
+        return self._session.execute(self._select_for_count.where(self._criterion(where))).scalar()
+
+    @instrumented
+    def page(self, after_identity: Optional[IdentityType] = None, limit: int = 100) -> List[EntityType]:
+        """Returns up to `limit` aggregates ordered by identity, starting right after `after_identity`.
+
+        Keyset pagination - cost of fetching a page does not depend on how deep it is. Pass identity of the last
+        aggregate of previous page to get the next one.
+        """
+        where = None if after_identity is None else self.identity_column > after_identity
+        return self._fetch_ordered(where, limit)
+
+    @instrumented
+    def find(self, specification: Specification, limit: Optional[int] = None) -> List[EntityType]:
+        """Returns aggregates satisfying the specification (see `entity_framework.specification`), ordered by identity.
+
+        Specification is compiled to a WHERE clause on generated models, so aggregates are filtered by the database.
+        """
+        return self._fetch_ordered(self._criterion(specification), limit)
+
+    def _fetch_ordered(self, where: Optional[ClauseElement], limit: Optional[int]) -> List[EntityType]:
+        identity_column = self.identity_column
+        if self._reads_rows(self._lazy_paths):
+            statement = self.select
+            if where is not None:
+                statement = statement.where(where)
+            rows = self._session.execute(statement.order_by(identity_column).limit(limit))
+            aggregates = self._load_rows(self._rows_loader, rows)
+        else:
+            query = self.query.with_session(self._session)
+            if where is not None:
+                query = query.filter(where)
+            populate = self._aggregates_populator
+            aggregates = [populate(db_result) for db_result in query.order_by(identity_column).limit(limit)]
+
+        tracked = []
+        for aggregate in aggregates:
+            key = (self.entity, getattr(aggregate, identity_column.key))
+            if key not in self._identity_map:
+                self._track(key, aggregate)
+            tracked.append(self._identity_map[key])
+        return tracked
+
+    def _criterion(self, where: Union[Specification, ClauseElement]) -> ClauseElement:
+        if isinstance(where, Specification):
+            return compile_specification(self.registry, self.registry.entities_to_aets[self.entity].root, where)
+        return where
+
+    @instrumented
+    def project(
+        self, identity_or_filter: Union[IdentityType, Specification, ClauseElement], fields: Sequence[str]
+    ) -> Union[tuple, List[tuple]]:
+        """Reads only given fields (dotted paths, e.g. "current_subscription.start_at") into namedtuples.
+
+        Selects just the columns of these fields, joining only the nested entities they belong to. Given identity,
+        returns a single namedtuple (raising NoResultFound if missing), given a specification or a clause on
+        generated models - a list.
+        """
+        statement, statement_by_identity, project = self._projection(tuple(fields))
+        project = self._hydrating(project)
+        if isinstance(identity_or_filter, (Specification, ClauseElement)):
+            where = self._criterion(identity_or_filter)
+            return [project(row) for row in self._session.execute(statement.where(where))]
 
-        converting_visitor = PopulatingAggregateVisitor(result)
-        aet = self.registry.entities_to_aets[self.entity]
-        converting_visitor.traverse_from(aet.root)
-        return converting_visitor.result
+        model = self.registry.entities_models[self.entity]
+        row = self._execute_compiled(model, statement_by_identity, {"identity": identity_or_filter}).first()
+        if row is None:
+            raise NoAggregateFound
+        return project(row)
 
+    def _projection(self, fields: Tuple[str, ...]) -> Projection:
+        key = (self.entity, fields)
+        if key not in self.registry.projections:
+            pruned_root = prune(
+                self.registry.entities_to_aets[self.entity].root, [field.split(".") for field in fields]
+            )
+            query_building_visitor = QueryBuildingVisitor(self.registry)
+            query_building_visitor.traverse_from(pruned_root)
+            projection_visitor = ProjectionPopulatingVisitor(self.registry, fields)
+            projection_visitor.traverse_from(pruned_root)
+            statement = query_building_visitor.select
+            statement_by_identity = statement.where(self.identity_column == bindparam("identity"))
+            self.registry.projections[key] = (statement, statement_by_identity, projection_visitor.result)
+
+        return self.registry.projections[key]
+
+    @instrumented
+    def iterate(
+        self, batch_size: int = 1000, where: Optional[Union[Specification, ClauseElement]] = None
+    ) -> Iterator[EntityType]:
+        """Streams all aggregates (optionally filtered with a specification or a clause) with bounded memory.
+
+        Rows are fetched from a server-side cursor `batch_size` at a time. Aggregates are neither put in the identity
+        map nor in the cache, so that long scans do not accumulate them.
+        """
+        where = None if where is None else self._criterion(where)
+        if self._reads_rows(self._lazy_paths):
+            statement = self.select if where is None else self.select.where(where)
+            result = self._session.execute(statement.execution_options(stream_results=True))
+            loader = self._rows_loader
+            rows = result.fetchmany(batch_size)
+            while rows:
+                yield from self._load_rows(loader, rows)
+                rows = result.fetchmany(batch_size)
+            return
+
+        query = self.query.with_session(self._session)
+        if where is not None:
+            query = query.filter(where)
+        populate = self._aggregates_populator
+        for db_result in query.yield_per(batch_size):
+            yield populate(db_result)
+
+    def _load_cached(self, identity: IdentityType) -> bool:
+        key = (self.entity, identity)
+        cached = self.cache.get(key)
+        if cached is None:
+            return False
+        self._track(key, self._flattener.unflatten(cached, self._load_reference))
+        return True
+
+    def _track(self, key: identity_map.Key, aggregate: EntityType) -> None:
+        self._identity_map[key] = aggregate
+        if self.dirty_tracking:
+            self._snapshots[key] = _snapshot(self._rows_populator(aggregate))
+
+    def _evict(self, key: identity_map.Key) -> None:
+        # deleted right away for this transaction, and again on commit for rows other sessions cached in the meantime
+        self.cache.delete(key)
+        identity_map.evict_on_commit(self._session, self.cache, key)
+
+    @instrumented
     def save(self, entity: EntityType) -> None:
-        visitor = ModelPopulatingVisitor(entity, self.registry)
-        visitor.traverse_from(self.registry.entities_to_aets[self.entity].root)
-        self._session.merge(visitor.result)
+        key = (self.entity, getattr(entity, self.identity_column.key))
+        self._identity_map[key] = entity
+        if self.cache is not None:
+            self._evict(key)
+        if not self.dirty_tracking:
+            self._write(entity)
+            return
+
+        rows = self._rows_populator(entity)
+        snapshot = self._snapshots.get(key)
+        if snapshot is None or not self._write_changes(rows, snapshot):
+            self._write(entity)
+        self._snapshots[key] = _snapshot(rows)
+
+    def _write(self, entity: EntityType) -> None:
+        if self.native_upsert:
+            self._upsert_aggregate(self._rows_populator(entity))
+            return
+
+        # merge loads stored rows of the aggregate, which counts as querying - only the flush writes them
+        self._session.merge(self._hydrating(self.registry.models_populators[self.entity], reads_rows=False)(entity))
+        self._flush()
+
+    @flushing
+    def _flush(self) -> None:
         self._session.flush()
+
+    @flushing
+    def _upsert_aggregate(self, rows: List[Row]) -> None:
+        for model, row in rows:
+            self._execute_compiled(model, self._upsert_statement(model), row)
+        self._delete_stale_items(_rows_by_model(rows))
+
+    @flushing
+    def _write_changes(self, rows: List[Row], snapshot: identity_map.Snapshot) -> bool:
+        """Updates only changed columns of rows known from snapshot. Returns False, writing nothing, on unknown rows.
+
+        Rows of lists' items missing from `rows` are deleted, items of their own lists first.
+        """
+        updates = []
+        written_keys = set()
+        for model, row in rows:
+            primary_key = primary_key_of(model, row)
+            written_keys.add((model, primary_key))
+            old_values = snapshot.get((model, primary_key))
+            if old_values is None:
+                return False
+            changes = {
+                column: value for (column, value), old_value in zip(row.items(), old_values) if value != old_value
+            }
+            if changes:
+                where = [column == value for column, value in zip(model.__mapper__.primary_key, primary_key)]
+                updates.append(model.__table__.update().where(and_(*where)).values(changes))
+
+        collections = {collection.model: collection for collection in self._collections}
+        tables_order = {table: index for index, table in enumerate(self.base.metadata.sorted_tables)}
+        removed_keys = sorted(
+            (key for key in snapshot.keys() - written_keys if key[0] in collections),
+            key=lambda key: tables_order[key[0].__table__],
+            reverse=True,
+        )
+        for model, primary_key in removed_keys:
+            self._execute_compiled(model, collections[model].delete, self._primary_key_params(model, primary_key))
+        for update in updates:
+            self._session.execute(update)
+        return True
+
+    @instrumented
+    def save_many(self, entities: Iterable[EntityType]) -> None:
+        """Writes aggregates table by table with executemany-style bulk statements, skipping the ORM unit of work.
+
+        Tables of nested entities are written before tables referencing them. With `native_upsert` every table is
+        written by a single upsert executemany. Otherwise existing rows are found with one chunked primary key query
+        per table, then updated, the rest is inserted. Since bulk operations bypass session's identity map, instances
+        already loaded into the session are not refreshed.
+        """
+        populate_rows = self._rows_populator
+        all_rows: List[Row] = []
+        identity_name = self.identity_column.key
+        for entity in entities:
+            key = (self.entity, getattr(entity, identity_name))
+            self._identity_map[key] = entity
+            if self.cache is not None:
+                self._evict(key)
+            rows = populate_rows(entity)
+            if self.dirty_tracking:
+                self._snapshots[key] = _snapshot(rows)
+            all_rows.extend(rows)
+
+        rows_by_model = _rows_by_model(all_rows)
+        tables_order = {table: index for index, table in enumerate(self.base.metadata.sorted_tables)}
+        for model in sorted(rows_by_model, key=lambda model: tables_order[model.__table__]):
+            self._upsert_rows(model, rows_by_model[model])
+        self._delete_stale_items(rows_by_model)
+
+    @flushing
+    def _upsert_rows(self, model: Type, rows: Dict[tuple, dict]) -> None:
+        if self.native_upsert:
+            self._execute_compiled(model, self._upsert_statement(model), list(rows.values()))
+            return
+
+        # rows of lists of value objects are keyed by owner and position, they are looked up by owners
+        primary_key_columns = model.__mapper__.primary_key
+        existing_keys = set()
+        for chunk in _chunks(list(dict.fromkeys(key[0] for key in rows)), self.get_many_chunk_size):
+            existing_keys.update(
+                tuple(key)
+                for key in self._session.query(*primary_key_columns).filter(primary_key_columns[0].in_(chunk))
+            )
+
+        rows_to_update = [row for key, row in rows.items() if key in existing_keys]
+        rows_to_insert = [row for key, row in rows.items() if key not in existing_keys]
+        if rows_to_update:
+            self._session.bulk_update_mappings(model, rows_to_update)
+        if rows_to_insert:
+            self._session.bulk_insert_mappings(model, rows_to_insert, render_nulls=True)
+
+    @flushing
+    def _delete_stale_items(self, rows_by_model: Dict[Type, Dict[tuple, dict]]) -> None:
+        """Deletes stored items of lists of written owners, which are not among written rows anymore."""
+        for collection in self._collections:
+            owners = [row[collection.owner_identity] for row in rows_by_model.get(collection.owner_model, {}).values()]
+            written_keys = rows_by_model.get(collection.model, {})
+            self._delete_items(
+                collection, [key for key in self._stored_items(collection, owners) if key not in written_keys]
+            )
+
+    def _stored_items(self, collection: Collection, owners: List[Any]) -> List[tuple]:
+        keys = []
+        for chunk in _chunks(owners, self.get_many_chunk_size):
+            keys.extend(
+                tuple(key)
+                for key in self._execute_compiled(collection.model, collection.select_keys, {"owners": chunk})
+            )
+        return keys
+
+    def _delete_items(self, collection: Collection, keys: List[tuple]) -> None:
+        if not keys:
+            return
+        # items referencing the deleted ones go first - entities on lists may own lists as well
+        for nested_collection in self._collections:
+            if nested_collection.owner_model is collection.model:
+                self._delete_items(nested_collection, self._stored_items(nested_collection, [key[0] for key in keys]))
+        model = collection.model
+        self._execute_compiled(model, collection.delete, [self._primary_key_params(model, key) for key in keys])
+
+    @staticmethod
+    def _primary_key_params(model: Type, primary_key: tuple) -> dict:
+        return {column.key: value for column, value in zip(model.__mapper__.primary_key, primary_key)}
+
+    def _upsert_statement(self, model: Type) -> Insert:
+        dialect_name = self._session.get_bind(mapper=model.__mapper__).dialect.name
+        key = (dialect_name, model.__table__)
+        if key not in self.registry.upserts:
+            self.registry.upserts[key] = upserts.build(model.__table__, dialect_name)
+        return self.registry.upserts[key]
@@ -0,0 +1,117 @@
+import itertools
+from typing import Any, AsyncIterator, Callable, Iterable, List, Optional, Type, Union
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.declarative import DeclarativeMeta
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import ClauseElement
+
+from entity_framework.caching import CacheBackend
+from entity_framework.instrumentation import Instrumentation
+from entity_framework.repository import EntityType, IdentityType, Repository
+from entity_framework.specification import Specification
+from entity_framework.storages.sqlalchemy import SqlAlchemyRepo
+from entity_framework.storages.sqlalchemy.registry import SaRegistry
+
+
+def _call(_session: Session, function: Callable, *args: Any) -> Any:
+    return function(*args)
+
+
+class AsyncSqlAlchemyRepo:
+    """Awaitable counterpart of SqlAlchemyRepo working on AsyncSession, configured with the same class attributes.
+
+    Every call runs a synchronous repository on session's `sync_session` through `AsyncSession.run_sync`, which
+    awaits the asyncio driver (e.g. asyncpg or aiosqlite) whenever the repository talks to the database. All of it
+    happens on the event loop, without any threads. Generated models, populators and compiled statements are shared
+    with synchronous repositories of the same registry.
+
+    Nested entities are always loaded eagerly, so registries with `lazy_fields` of the aggregate are rejected.
+    """
+
+    base: DeclarativeMeta = None
+    registry: SaRegistry = None
+
+    # Settings of SqlAlchemyRepo, read once the repository class is created
+    get_many_chunk_size: int = SqlAlchemyRepo.get_many_chunk_size
+    native_upsert: bool = SqlAlchemyRepo.native_upsert
+    cache: Optional[CacheBackend] = SqlAlchemyRepo.cache
+    dirty_tracking: bool = SqlAlchemyRepo.dirty_tracking
+    core_reads: bool = SqlAlchemyRepo.core_reads
+    instrumentation: Optional[Instrumentation] = SqlAlchemyRepo.instrumentation
+
+    SETTINGS = (
+        "base",
+        "registry",
+        "get_many_chunk_size",
+        "native_upsert",
+        "cache",
+        "dirty_tracking",
+        "core_reads",
+        "instrumentation",
+    )
+
+    sync_repo: Optional[Type[SqlAlchemyRepo]] = None
+
+    @classmethod
+    def prepare(cls, entity_cls: Type[EntityType]) -> None:
+        assert cls.base, "Must set cls base to an instance of DeclarativeMeta!"
+        cls.entity = entity_cls
+        namespace = {name: getattr(cls, name) for name in cls.SETTINGS}
+        cls.sync_repo = type(f"Sync{cls.__name__}", (SqlAlchemyRepo, Repository[entity_cls, Any]), namespace)
+        if cls.sync_repo._lazy_paths:
+            # proxies would load through the synchronous session outside of run_sync, where it cannot talk to database
+            paths = ", ".join(sorted(".".join(path) for path in cls.sync_repo._lazy_paths))
+            raise ValueError(f"Nested entities cannot be loaded lazily by asynchronous repositories, got: {paths}")
+
+    def __init__(self, session: AsyncSession) -> None:
+        self._session = session
+        self._repo = self.sync_repo(session.sync_session)
+
+    async def get(self, identity: IdentityType) -> EntityType:
+        return await self._run(self._repo.get, identity)
+
+    async def get_many(self, identities: Iterable[IdentityType]) -> List[EntityType]:
+        return await self._run(self._repo.get_many, list(identities))
+
+    async def exists(self, identity: IdentityType) -> bool:
+        return await self._run(self._repo.exists, identity)
+
+    async def exists_many(self, identities: Iterable[IdentityType]) -> List[bool]:
+        return await self._run(self._repo.exists_many, list(identities))
+
+    async def count(self, where: Optional[Union[Specification, ClauseElement]] = None) -> int:
+        return await self._run(self._repo.count, where)
+
+    async def page(self, after_identity: Optional[IdentityType] = None, limit: int = 100) -> List[EntityType]:
+        return await self._run(self._repo.page, after_identity, limit)
+
+    async def find(self, specification: Specification, limit: Optional[int] = None) -> List[EntityType]:
+        return await self._run(self._repo.find, specification, limit)
+
+    async def iterate(
+        self, batch_size: int = 1000, where: Optional[Union[Specification, ClauseElement]] = None
+    ) -> AsyncIterator[EntityType]:
+        aggregates = self._repo.iterate(batch_size, where)
+
+        def next_batch() -> List[EntityType]:
+            return list(itertools.islice(aggregates, batch_size))
+
+        try:
+            batch = await self._run(next_batch)
+            while batch:
+                for aggregate in batch:
+                    yield aggregate
+                batch = await self._run(next_batch)
+        finally:
+            # consumer may stop early, leaving the cursor of synchronous generator open on session's connection
+            await self._run(aggregates.close)
+
+    async def save(self, entity: EntityType) -> None:
+        await self._run(self._repo.save, entity)
+
+    async def save_many(self, entities: Iterable[EntityType]) -> None:
+        await self._run(self._repo.save_many, list(entities))
+
+    async def _run(self, function: Callable, *args: Any) -> Any:
+        return await self._session.run_sync(_call, function, *args)
@@ -17,5 +17,10 @@ class RawModel:
     def append_relationship(self, name: str, related_model_name: str, nullable: bool) -> None:
         self.namespace[name] = relationship(related_model_name, innerjoin=not nullable)
 
+    def append_collection(self, name: str, related_model_name: str, position_column_name: str) -> None:
+        self.namespace[name] = relationship(
+            related_model_name, order_by=f"{related_model_name}.{position_column_name}", cascade="all, delete-orphan"
+        )
+
     def materialize(self) -> Type:
         return type(self.name, self.bases, self.namespace)
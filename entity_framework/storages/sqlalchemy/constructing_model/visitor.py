@@ -1,7 +1,7 @@
-from typing import Dict, List, Type, Optional
+from typing import Any, Dict, List, Type, Optional, Union
 
 import inflection
-from sqlalchemy import Column, ForeignKey
+from sqlalchemy import Column, ForeignKey, Integer
 from sqlalchemy.ext.declarative import DeclarativeMeta
 
 from entity_framework.abstract_entity_tree import (
@@ -16,49 +16,55 @@ from entity_framework.entity import Entity
 from entity_framework.storages.sqlalchemy import native_type_to_column
 from entity_framework.storages.sqlalchemy.registry import SaRegistry
 from entity_framework.storages.sqlalchemy.constructing_model.raw_model import RawModel
+from entity_framework.storages.sqlalchemy.json_value_objects import Json, is_stored_as_json
 
 
-class ModelConstructingVisitor(Visitor):
-    EMPTY_PREFIX = ""
+EntityLikeNode = Union[EntityNode, ListOfEntitiesNode]
+
+
+def table_name_of(entity: EntityLikeNode) -> str:
+    return inflection.pluralize(inflection.underscore(entity.type.__name__))
+
+
+def parent_reference_column_name(parent: EntityLikeNode) -> str:
+    # Rows of collections point to the entity owning them
+    return f"{inflection.underscore(parent.type.__name__)}_{parent.identity.name}"
+
+
+def position_column_name(collection: Union[ListOfEntitiesNode, ListOfValueObjectsNode]) -> str:
+    return f"{collection.name}_position"
 
+
+class ModelConstructingVisitor(Visitor):
     def __init__(self, base: DeclarativeMeta, registry: SaRegistry) -> None:
         self._base = base
         self._registry = registry
-        self._entities_stack: List[EntityNode] = []
+        self._entities_stack: List[EntityLikeNode] = []
         self._entities_raw_models: Dict[Type[Entity], RawModel] = {}
+        self._raw_models_stack: List[RawModel] = []
         self._last_optional_vo_node: Optional[ValueObjectNode] = None
         self._stacked_vo: List[ValueObjectNode] = []
 
     @property
-    def _prefix(self) -> str:
-        if not self._stacked_vo:
-            return self.EMPTY_PREFIX
-        return "_".join(vo.name for vo in self._stacked_vo) + "_"
-
-    @property
-    def current_entity(self) -> EntityNode:
+    def current_entity(self) -> EntityLikeNode:
         return self._entities_stack[-1]
 
     def visit_field(self, field: FieldNode) -> None:
         kwargs = {"primary_key": field.is_identity, "nullable": field.optional or self._last_optional_vo_node}
-        raw_model: RawModel = self._entities_raw_models[self.current_entity.type]
-        raw_model.append_column(
-            f"{self._prefix}{field.name}", Column(native_type_to_column.convert(field.type), **kwargs)
-        )
+        raw_model: RawModel = self._raw_models_stack[-1]
+        raw_model.append_column(field.column_name, Column(native_type_to_column.convert(field.type), **kwargs))
 
     def visit_entity(self, entity: EntityNode) -> None:
         if entity.type in self._entities_raw_models:
             raise NotImplementedError("Probably recursive, not supported")
 
         model_name = f"{entity.type.__name__}Model"
-        table_name = inflection.pluralize(inflection.underscore(entity.type.__name__))
+        table_name = table_name_of(entity)
 
         if self._entities_stack:  # nested, include foreign key
-            identity_nodes: List[FieldNode] = [node for node in entity.children if getattr(node, "is_identity", None)]
-            assert len(identity_nodes) == 1, "Multiple primary keys not supported"
-            identity_node = identity_nodes.pop()
-            raw_model: RawModel = self._entities_raw_models[self.current_entity.type]
-            raw_model.append_column(
+            identity_node = entity.identity
+            parent_raw_model: RawModel = self._raw_models_stack[-1]
+            parent_raw_model.append_column(
                 f"{entity.name}_{identity_node.name}",
                 Column(
                     native_type_to_column.convert(identity_node.type),
@@ -66,19 +72,28 @@ class ModelConstructingVisitor(Visitor):
                     nullable=entity.optional,
                 ),
             )
-            raw_model.append_relationship(entity.name, model_name, entity.optional)
+            parent_raw_model.append_relationship(entity.name, model_name, entity.optional)
 
-        self._entities_stack.append(entity)
-        self._entities_raw_models[entity.type] = RawModel(
-            name=model_name, bases=(self._base,), namespace={"__tablename__": table_name}
-        )
+        raw_model = RawModel(name=model_name, bases=(self._base,), namespace={"__tablename__": table_name})
+        self._push_entity(entity, raw_model)
 
     def leave_entity(self, entity: EntityNode) -> None:
+        self._pop_entity(entity)
+
+    def _push_entity(self, entity: EntityLikeNode, raw_model: RawModel) -> None:
+        self._entities_stack.append(entity)
+        self._entities_raw_models[entity.type] = raw_model
+        self._raw_models_stack.append(raw_model)
+
+    def _pop_entity(self, entity: EntityLikeNode) -> None:
         entity_node = self._entities_stack.pop()
-        raw_model: RawModel = self._entities_raw_models[entity_node.type]
-        self._registry.entities_models[entity.type] = raw_model.materialize()
+        raw_model = self._raw_models_stack.pop()
+        self._registry.entities_models[entity_node.type] = raw_model.materialize()
+
+    def visit_value_object(self, value_object: ValueObjectNode) -> Any:
+        if is_stored_as_json(value_object, self._registry):
+            return self._append_json_column(value_object)
 
-    def visit_value_object(self, value_object: ValueObjectNode) -> None:
         # value objects' fields are embedded into entity above it
         self._stacked_vo.append(value_object)
         if not self._last_optional_vo_node and value_object.optional:
@@ -90,13 +105,65 @@ class ModelConstructingVisitor(Visitor):
             self._last_optional_vo_node = None
 
     def visit_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
-        raise NotImplementedError
-
-    def leave_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
-        raise NotImplementedError
+        if list_of_entities.type in self._entities_raw_models:
+            raise NotImplementedError("Probably recursive, not supported")
 
-    def visit_list_of_value_objects(self, list_of_entities: ListOfValueObjectsNode) -> None:
-        raise NotImplementedError
+        model_name = f"{list_of_entities.type.__name__}Model"
+        raw_model = RawModel(
+            name=model_name, bases=(self._base,), namespace={"__tablename__": table_name_of(list_of_entities)}
+        )
+        self._append_collection(list_of_entities, model_name, raw_model, is_part_of_primary_key=False)
+        self._push_entity(list_of_entities, raw_model)
 
-    def leave_list_of_value_objects(self, list_of_entities: ListOfValueObjectsNode) -> None:
-        raise NotImplementedError
+    def leave_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
+        self._pop_entity(list_of_entities)
+
+    def visit_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> Any:
+        if is_stored_as_json(list_of_value_objects, self._registry):
+            return self._append_json_column(list_of_value_objects)
+
+        # Items have no identity of their own - they are identified by the owner and position on the list
+        parent_name = inflection.underscore(self.current_entity.type.__name__)
+        model_name = f"{self.current_entity.type.__name__}{inflection.camelize(list_of_value_objects.name)}Model"
+        raw_model = RawModel(
+            name=model_name,
+            bases=(self._base,),
+            namespace={"__tablename__": f"{parent_name}_{list_of_value_objects.name}"},
+        )
+        self._append_collection(list_of_value_objects, model_name, raw_model, is_part_of_primary_key=True)
+        self._raw_models_stack.append(raw_model)
+
+    def leave_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> None:
+        raw_model = self._raw_models_stack.pop()
+        key = (self.current_entity.type, list_of_value_objects.name)
+        self._registry.value_objects_lists_models[key] = raw_model.materialize()
+
+    def _append_json_column(self, node: Union[ValueObjectNode, ListOfValueObjectsNode]) -> Any:
+        nullable = bool(node.optional or self._last_optional_vo_node)
+        self._raw_models_stack[-1].append_column(node.column_name, Column(Json, nullable=nullable))
+        return self.SKIP_CHILDREN
+
+    def _append_collection(
+        self,
+        collection: Union[ListOfEntitiesNode, ListOfValueObjectsNode],
+        model_name: str,
+        raw_model: RawModel,
+        is_part_of_primary_key: bool,
+    ) -> None:
+        if self._stacked_vo:
+            raise NotImplementedError("Lists nested in value objects are not supported")
+
+        parent = self.current_entity
+        parent_identity = parent.identity
+        raw_model.append_column(
+            parent_reference_column_name(parent),
+            Column(
+                native_type_to_column.convert(parent_identity.type),
+                ForeignKey(f"{table_name_of(parent)}.{parent_identity.name}"),
+                primary_key=is_part_of_primary_key,
+                nullable=False,
+            ),
+        )
+        position_column = position_column_name(collection)
+        raw_model.append_column(position_column, Column(Integer, primary_key=is_part_of_primary_key, nullable=False))
+        self._raw_models_stack[-1].append_collection(collection.name, model_name, position_column)
@@ -0,0 +1,60 @@
+import typing
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.session import SessionTransaction
+
+
+Key = typing.Tuple[typing.Type, typing.Any]
+IdentityMap = typing.Dict[Key, typing.Any]
+# (model, primary key) -> row's column values, as last read from or written to the database
+Snapshot = typing.Dict[typing.Tuple[typing.Type, typing.Any], typing.Tuple[typing.Any, ...]]
+Snapshots = typing.Dict[Key, Snapshot]
+
+SESSION_INFO_KEY = "entity_framework_identity_map"
+SNAPSHOTS_SESSION_INFO_KEY = "entity_framework_snapshots"
+EVICTIONS_SESSION_INFO_KEY = "entity_framework_cache_evictions"
+
+
+def _clear(session: Session, transaction: SessionTransaction) -> None:
+    # Flushes run in subtransactions, aggregates are forgotten only when the outermost one ends
+    if transaction.parent is None:
+        for info_key in (SESSION_INFO_KEY, SNAPSHOTS_SESSION_INFO_KEY):
+            session.info[info_key].clear()
+
+
+def _session_scoped(session: Session, info_key: str) -> dict:
+    try:
+        return session.info[info_key]
+    except KeyError:
+        session.info.setdefault(SESSION_INFO_KEY, {})
+        session.info.setdefault(SNAPSHOTS_SESSION_INFO_KEY, {})
+        if not event.contains(session, "after_transaction_end", _clear):
+            event.listen(session, "after_transaction_end", _clear)
+        return session.info[info_key]
+
+
+def for_session(session: Session) -> IdentityMap:
+    """Returns aggregates loaded or saved within session's current transaction, keyed by (entity class, identity)."""
+    return _session_scoped(session, SESSION_INFO_KEY)
+
+
+def snapshots_for_session(session: Session) -> Snapshots:
+    """Returns snapshots of rows backing aggregates in the identity map, used to write only what changed."""
+    return _session_scoped(session, SNAPSHOTS_SESSION_INFO_KEY)
+
+
+def _evict(session: Session) -> None:
+    for cache, key in session.info.pop(EVICTIONS_SESSION_INFO_KEY, ()):
+        cache.delete(key)
+
+
+def evict_on_commit(session: Session, cache: typing.Any, key: Key) -> None:
+    """Deletes the key from the cache once session's transaction commits.
+
+    Until then other sessions read the previously committed row and may put it back in the cache, where it would stay
+    after the commit.
+    """
+    session.info.setdefault(EVICTIONS_SESSION_INFO_KEY, set()).add((cache, key))
+    if not event.contains(session, "after_commit", _evict):
+        event.listen(session, "after_commit", _evict)
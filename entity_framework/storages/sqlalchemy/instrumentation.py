@@ -0,0 +1,184 @@
+import functools
+import inspect
+import threading
+import time
+import typing
+import weakref
+
+from greenlet import getcurrent
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+
+from entity_framework.instrumentation import OperationMetrics
+
+
+# Probes of operations being run in the current thread, keyed by greenlets running them - every thread runs in its own
+# main greenlet, while AsyncSqlAlchemyRepo runs every call in a greenlet of its own, interleaved on the event loop's
+# thread. Operations called by other operations are not measured apart.
+_current = threading.local()
+_listened_engines: "weakref.WeakSet[Engine]" = weakref.WeakSet()
+
+
+class Probe:
+    __slots__ = ("hydrate_time", "flush_time", "flushing", "rows", "statements")
+
+    def __init__(self) -> None:
+        self.hydrate_time = 0.0
+        self.flush_time = 0.0
+        # whether a write is being timed already, so that writes called by writes are not counted twice
+        self.flushing = False
+        self.rows = 0
+        self.statements = 0
+
+
+def _current_probe() -> typing.Optional[Probe]:
+    probes = getattr(_current, "probes", None)
+    return None if probes is None else probes.get(getcurrent())
+
+
+def _set_current_probe(probe: typing.Optional[Probe]) -> None:
+    probes = getattr(_current, "probes", None)
+    if probes is None:
+        probes = _current.probes = {}
+    if probe is None:
+        probes.pop(getcurrent(), None)
+    else:
+        probes[getcurrent()] = probe
+
+
+def _count_statement(*_args: typing.Any) -> None:
+    probe = _current_probe()
+    if probe is not None:
+        probe.statements += 1
+
+
+def listen_to_statements(bind: typing.Union[Engine, Connection]) -> None:
+    engine = bind.engine
+    if engine not in _listened_engines:
+        event.listen(engine, "before_cursor_execute", _count_statement)
+        _listened_engines.add(engine)
+
+
+def _start_measuring(repo: typing.Any) -> Probe:
+    model = repo.registry.entities_models[repo.entity]
+    listen_to_statements(repo._session.get_bind(mapper=model.__mapper__))
+    return Probe()
+
+
+def _report(repo: typing.Any, operation: str, duration: float, probe: Probe) -> None:
+    repo.instrumentation.record(
+        OperationMetrics(
+            entity_cls=repo.entity,
+            operation=operation,
+            duration=duration,
+            query_time=max(0.0, duration - probe.hydrate_time - probe.flush_time),
+            hydrate_time=probe.hydrate_time,
+            flush_time=probe.flush_time,
+            rows=probe.rows,
+            statements=probe.statements,
+        )
+    )
+
+
+def instrumented(method: typing.Callable) -> typing.Callable:
+    """Measures repository's method and reports it to repository's instrumentation, unless it is None.
+
+    Generator methods are measured while they are consumed - only the time spent producing items counts, and the
+    operation is reported once the generator is exhausted or closed.
+    """
+    if inspect.isgeneratorfunction(method):
+        return _instrumented_generator(method)
+    operation = method.__name__
+
+    @functools.wraps(method)
+    def measured(repo: typing.Any, *args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+        if repo.instrumentation is None or _current_probe() is not None:
+            return method(repo, *args, **kwargs)
+
+        probe = _start_measuring(repo)
+        _set_current_probe(probe)
+        started_at = time.perf_counter()
+        try:
+            result = method(repo, *args, **kwargs)
+        finally:
+            _set_current_probe(None)
+        _report(repo, operation, time.perf_counter() - started_at, probe)
+        return result
+
+    return measured
+
+
+def _instrumented_generator(method: typing.Callable) -> typing.Callable:
+    operation = method.__name__
+
+    @functools.wraps(method)
+    def measured(repo: typing.Any, *args: typing.Any, **kwargs: typing.Any) -> typing.Iterator:
+        iterator = method(repo, *args, **kwargs)
+        if repo.instrumentation is None:
+            yield from iterator
+            return
+
+        probe = _start_measuring(repo)
+        duration = 0.0
+        try:
+            while True:
+                # items consumed by another operation count towards it
+                measuring = _current_probe() is None
+                if measuring:
+                    _set_current_probe(probe)
+                started_at = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    if measuring:
+                        _set_current_probe(None)
+                        duration += time.perf_counter() - started_at
+                yield item
+        finally:
+            iterator.close()
+            _report(repo, operation, duration, probe)
+
+    return measured
+
+
+def flushing(method: typing.Callable) -> typing.Callable:
+    """Counts time of repository's method writing to the database as flush, except for hydration done within it."""
+
+    @functools.wraps(method)
+    def measured(repo: typing.Any, *args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+        probe = None if repo.instrumentation is None else _current_probe()
+        if probe is None or probe.flushing:
+            return method(repo, *args, **kwargs)
+
+        hydrate_time = probe.hydrate_time
+        probe.flushing = True
+        started_at = time.perf_counter()
+        try:
+            return method(repo, *args, **kwargs)
+        finally:
+            probe.flush_time += time.perf_counter() - started_at - (probe.hydrate_time - hydrate_time)
+            probe.flushing = False
+
+    return measured
+
+
+def hydrating(populate: typing.Callable, reads_rows: bool) -> typing.Callable:
+    """Wraps a populator, so that its time (and rows read, if it populates aggregates) count towards the operation."""
+
+    @functools.wraps(populate)
+    def measured(source: typing.Any) -> typing.Any:
+        probe = _current_probe()
+        if probe is None:
+            return populate(source)
+
+        started_at = time.perf_counter()
+        try:
+            return populate(source)
+        finally:
+            probe.hydrate_time += time.perf_counter() - started_at
+            if reads_rows:
+                probe.rows += 1
+
+    return measured
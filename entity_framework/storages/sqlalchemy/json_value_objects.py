@@ -0,0 +1,168 @@
+import json
+import typing
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import attr
+from sqlalchemy import Text
+from sqlalchemy.dialects import postgresql as postgresql_dialect
+from sqlalchemy.engine import Dialect
+from sqlalchemy.types import TypeDecorator, TypeEngine
+
+from entity_framework.abstract_entity_tree import (
+    Visitor,
+    Node,
+    FieldNode,
+    EntityNode,
+    ValueObjectNode,
+    ListOfEntitiesNode,
+    ListOfValueObjectsNode,
+)
+from entity_framework.storages.sqlalchemy.registry import SaRegistry
+
+
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+# type -> (to JSON, from JSON), types missing here are stored as they are
+mapping: typing.Dict[typing.Type, typing.Tuple[typing.Callable, typing.Callable]] = {
+    datetime: (lambda value: value.strftime(DATETIME_FORMAT), lambda value: datetime.strptime(value, DATETIME_FORMAT)),
+    uuid.UUID: (str, uuid.UUID),
+    Decimal: (str, Decimal),
+}
+
+
+class Json(TypeDecorator):
+    """JSONB on PostgreSQL, JSON text elsewhere - e.g. on SQLite, where it can be queried with JSON1 functions."""
+
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect: Dialect) -> TypeEngine:
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(postgresql_dialect.JSONB(none_as_null=True))
+        return dialect.type_descriptor(Text())
+
+    def process_bind_param(self, value: typing.Any, dialect: Dialect) -> typing.Any:
+        if value is None or dialect.name == "postgresql":
+            return value
+        return json.dumps(value, separators=(",", ":"))
+
+    def process_result_value(self, value: typing.Any, dialect: Dialect) -> typing.Any:
+        if value is None or dialect.name == "postgresql":
+            return value
+        return json.loads(value)
+
+
+def is_stored_as_json(node: Node, registry: SaRegistry) -> bool:
+    return isinstance(node, (ValueObjectNode, ListOfValueObjectsNode)) and node.type in registry.json_value_objects
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Codec:
+    encode: typing.Callable[[typing.Any], typing.Any]
+    decode: typing.Callable[[typing.Any], typing.Any]
+
+
+Encoder = typing.Callable[[typing.Any, dict], None]
+Decoder = typing.Callable[[dict], typing.Any]
+
+
+class CodecBuildingVisitor(Visitor):
+    """Compiles AET subtree of a value object (or list of them) into JSON encoder and decoder.
+
+    Value objects become objects keyed by field names, lists become arrays.
+    """
+
+    def __init__(self) -> None:
+        self._frames_stack: typing.List[typing.Tuple[typing.List[Encoder], typing.List[Decoder]]] = []
+        self._result: typing.Optional[Codec] = None
+
+    @property
+    def result(self) -> Codec:
+        return self._result
+
+    def visit_field(self, field: FieldNode) -> None:
+        name = field.name
+        to_json, from_json = mapping.get(field.type, (None, None))
+
+        def encode_field(vo: typing.Any, data: dict) -> None:
+            value = getattr(vo, name)
+            data[name] = value if to_json is None or value is None else to_json(value)
+
+        def decode_field(data: dict) -> typing.Any:
+            value = data[name]
+            return value if from_json is None or value is None else from_json(value)
+
+        encoders, decoders = self._frames_stack[-1]
+        encoders.append(encode_field)
+        decoders.append(decode_field)
+
+    def visit_value_object(self, value_object: ValueObjectNode) -> None:
+        self._frames_stack.append(([], []))
+
+    def leave_value_object(self, value_object: ValueObjectNode) -> None:
+        encode_item, decode_item = self._leave_complex_object(value_object)
+        self._finish(value_object, encode_item, decode_item)
+
+    def visit_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> None:
+        self._frames_stack.append(([], []))
+
+    def leave_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> None:
+        encode_item, decode_item = self._leave_complex_object(list_of_value_objects)
+
+        def encode_list(items: typing.Optional[typing.List[typing.Any]]) -> typing.Optional[list]:
+            return None if items is None else [encode_item(item) for item in items]
+
+        def decode_list(data: typing.Optional[list]) -> typing.Optional[typing.List[typing.Any]]:
+            return None if data is None else [decode_item(item) for item in data]
+
+        self._finish(list_of_value_objects, encode_list, decode_list)
+
+    def _leave_complex_object(self, node: Node) -> typing.Tuple[typing.Callable, typing.Callable]:
+        encoders, decoders = self._frames_stack.pop()
+        vo_cls = node.type
+
+        def encode(vo: typing.Any) -> typing.Optional[dict]:
+            if vo is None:
+                return None
+            data: dict = {}
+            for encoder in encoders:
+                encoder(vo, data)
+            return data
+
+        def decode(data: typing.Optional[dict]) -> typing.Any:
+            if data is None:
+                return None
+            return vo_cls(*[decoder(data) for decoder in decoders])
+
+        return encode, decode
+
+    def _finish(self, node: Node, encode: typing.Callable, decode: typing.Callable) -> None:
+        if not self._frames_stack:
+            self._result = Codec(encode, decode)
+            return
+
+        name = node.name
+
+        def encode_nested(vo: typing.Any, data: dict) -> None:
+            data[name] = encode(getattr(vo, name))
+
+        def decode_nested(data: dict) -> typing.Any:
+            return decode(data[name])
+
+        encoders, decoders = self._frames_stack[-1]
+        encoders.append(encode_nested)
+        decoders.append(decode_nested)
+
+    def visit_entity(self, entity: EntityNode) -> None:
+        raise TypeError("Entities can not be stored in JSON columns")
+
+    def visit_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
+        raise TypeError("Entities can not be stored in JSON columns")
+
+
+def build_codec(node: typing.Union[ValueObjectNode, ListOfValueObjectsNode]) -> Codec:
+    visitor = CodecBuildingVisitor()
+    visitor.traverse_from(node)
+    return visitor.result
@@ -1,91 +1,378 @@
-from typing import List, Any, Union
+from collections import defaultdict
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type, Union
+
+import attr
+from sqlalchemy.orm import Session, exc, object_session
+from sqlalchemy.sql import Select
 
 from entity_framework.abstract_entity_tree import (
     Visitor,
+    Node,
     FieldNode,
     EntityNode,
     ValueObjectNode,
     ListOfEntitiesNode,
     ListOfValueObjectsNode,
 )
+from entity_framework.entity import Entity, EntityOrVo
+from entity_framework.lazy import LazyEntity
+from entity_framework.storages.sqlalchemy.constructing_model.visitor import EntityLikeNode
+from entity_framework.storages.sqlalchemy.json_value_objects import build_codec, is_stored_as_json
+from entity_framework.storages.sqlalchemy.querying.visitor import QueryBuildingVisitor
+from entity_framework.storages.sqlalchemy.registry import LazyPaths, SaRegistry
+
+
+Getter = Callable[[Any], Any]
+AggregatePopulator = Callable[[Any], EntityOrVo]
+RowAggregatePopulator = Callable[[Sequence], EntityOrVo]
 
 
 class PopulatingAggregateVisitor(Visitor):
-    EMPTY_PREFIX = ""
+    """Compiles AET into a function that turns fetched model instance into an aggregate.
 
-    def __init__(self, db_result: object) -> None:
-        self._db_result = db_result
-        self._entities_stack: List[EntityNode] = []
-        self._ef_objects_stack: List[Union[EntityNode, ValueObjectNode]] = []
-        self._ef_dicts_stack: List[dict] = []
-        self._result: Any = None
-        self._stacked_vo: List[ValueObjectNode] = []
+    Tree is traversed only once - prefixes and getters are resolved here, so populating itself boils down to
+    calling a chain of closures.
+    """
+
+    def __init__(self, registry: SaRegistry, lazy_paths: LazyPaths = frozenset()) -> None:
+        self._registry = registry
+        self._lazy_paths = lazy_paths
+        self._getters_stack: List[List[Getter]] = []
+        self._result: Optional[AggregatePopulator] = None
 
     @property
-    def _prefix(self) -> str:
-        if not self._stacked_vo:
-            return self.EMPTY_PREFIX
-        return "_".join(vo.name for vo in self._stacked_vo) + "_"
+    def result(self) -> AggregatePopulator:
+        return self._result
+
+    def visit_field(self, field: FieldNode) -> None:
+        column_name = field.column_name
+
+        def get_field(db_object: Any) -> Any:
+            return getattr(db_object, column_name)
+
+        self._getters_stack[-1].append(get_field)
+
+    def visit_entity(self, entity: EntityNode) -> Any:
+        if self._getters_stack and entity.path in self._lazy_paths:
+            return self._get_lazy_entity(entity)
+        self._getters_stack.append([])
+
+    def _get_lazy_entity(self, entity: EntityNode) -> Any:
+        foreign_key_column = f"{entity.name}_{entity.identity.name}"
+        reference = lazy_reference_of(self._registry, entity)
+
+        def get_lazy_entity(db_object: Any) -> Optional[EntityOrVo]:
+            identity = getattr(db_object, foreign_key_column)
+            if identity is None:
+                return None
+            # loads through the session owning the model
+            return reference(object_session(db_object), identity)
+
+        self._getters_stack[-1].append(get_lazy_entity)
+        return self.SKIP_CHILDREN
+
+    def leave_entity(self, entity: EntityNode) -> None:
+        getters = self._getters_stack.pop()
+        entity_cls = entity.type
+
+        def populate_entity(db_object: Any) -> Optional[EntityOrVo]:
+            if db_object is None:
+                return None
+            return entity_cls(*[getter(db_object) for getter in getters])
+
+        if not self._getters_stack:
+            self._result = populate_entity
+            return
+
+        relationship_name = entity.name
+
+        def get_nested_entity(db_object: Any) -> Optional[EntityOrVo]:
+            return populate_entity(getattr(db_object, relationship_name))
+
+        self._getters_stack[-1].append(get_nested_entity)
+
+    def visit_value_object(self, value_object: ValueObjectNode) -> Any:
+        if is_stored_as_json(value_object, self._registry):
+            return self._get_json(value_object)
+        self._getters_stack.append([])
+
+    def leave_value_object(self, value_object: ValueObjectNode) -> None:
+        getters = self._getters_stack.pop()
+        vo_cls = value_object.type
+        optional = value_object.optional
+
+        def get_value_object(db_object: Any) -> Optional[EntityOrVo]:
+            values = [getter(db_object) for getter in getters]
+            if optional and values and all(v is None for v in values):
+                # One is not able to tell the difference between optional object with all its fields = None or
+                # an absence of entire value object
+                return None
+            return vo_cls(*values)
+
+        self._getters_stack[-1].append(get_value_object)
+
+    def visit_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
+        self._getters_stack.append([])
+
+    def leave_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
+        self._leave_list(list_of_entities)
+
+    def visit_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> Any:
+        if is_stored_as_json(list_of_value_objects, self._registry):
+            return self._get_json(list_of_value_objects)
+        # items are stored in a table of their own, so their fields are not prefixed by the list's name
+        self._getters_stack.append([])
+
+    def leave_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> None:
+        self._leave_list(list_of_value_objects)
+
+    def _get_json(self, node: Union[ValueObjectNode, ListOfValueObjectsNode]) -> Any:
+        column_name = node.column_name
+        decode = build_codec(node).decode
+
+        def get_json(db_object: Any) -> Any:
+            return decode(getattr(db_object, column_name))
+
+        self._getters_stack[-1].append(get_json)
+        return self.SKIP_CHILDREN
+
+    def _leave_list(self, list_node: Union[ListOfEntitiesNode, ListOfValueObjectsNode]) -> None:
+        getters = self._getters_stack.pop()
+        item_cls = list_node.type
+        relationship_name = list_node.name
+
+        def get_list(db_object: Any) -> List[EntityOrVo]:
+            return [item_cls(*[getter(item) for getter in getters]) for item in getattr(db_object, relationship_name)]
+
+        self._getters_stack[-1].append(get_list)
+
+
+def lazy_loader_of(registry: SaRegistry, entity: EntityNode) -> Callable[[Session, Any], EntityOrVo]:
+    """Compiles (once per entity class) a function loading the nested entity on its own, eagerly with its subtree."""
+    if entity.type not in registry.lazy_loaders:
+        query_building_visitor = QueryBuildingVisitor(registry)
+        query_building_visitor.traverse_from(entity)
+        query = query_building_visitor.query
+        populating_visitor = PopulatingAggregateVisitor(registry)
+        populating_visitor.traverse_from(entity)
+        populate = populating_visitor.result
+
+        def load(session: Session, identity: Any) -> EntityOrVo:
+            db_object = query.with_session(session).get(identity)
+            if db_object is None:
+                raise exc.NoResultFound
+            return populate(db_object)
+
+        registry.lazy_loaders[entity.type] = load
+
+    return registry.lazy_loaders[entity.type]
+
+
+def lazy_reference_of(registry: SaRegistry, entity: EntityNode) -> Callable[[Session, Any], EntityOrVo]:
+    """Makes a function creating proxies of the nested entity, loading it through given session on first access."""
+    entity_cls = entity.type
+    identity_name = entity.identity.name
+    load = lazy_loader_of(registry, entity)
+
+    def reference(session: Session, identity: Any) -> EntityOrVo:
+        return LazyEntity(entity_cls, identity_name, identity, lambda identity: load(session, identity))
+
+    return reference
+
+
+def nested_entities_of(node: Node) -> Iterator[Tuple[Type[Entity], EntityNode]]:
+    """Yields nested entities (not lists of them) below the node, at any depth, with classes of entities owning them."""
+    for child in node.children:
+        if isinstance(child, EntityNode):
+            yield node.type, child
+        yield from nested_entities_of(child)
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class RowsLoader:
+    """Compiled populating of objects from rows of a select, followed by loading of their lists."""
+
+    populate: RowAggregatePopulator
+    collections: Tuple["CollectionLoader", ...] = ()
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class CollectionLoader:
+    """Compiled loading of a list's items for many owners at once, with a single SELECT ... IN of `select`.
+
+    Rows of `select` (see QueryBuildingVisitor) end with identity of the owner, they come in order of lists.
+    """
+
+    name: str
+    # names of nested entities leading from objects populated by the statement above to owners of the list
+    owner_path: Tuple[str, ...]
+    owner_identity_name: str
+    select: Select
+    items: RowsLoader
+
+    def owners_of(self, ef_objects: Iterable[EntityOrVo]) -> Dict[Any, List[EntityOrVo]]:
+        """Groups owners of the list by their identities - the same entity may be nested in many aggregates."""
+        owners: Dict[Any, List[EntityOrVo]] = defaultdict(list)
+        for owner in ef_objects:
+            for name in self.owner_path:
+                if owner is None:
+                    break
+                owner = getattr(owner, name)
+            if owner is not None:
+                owners[getattr(owner, self.owner_identity_name)].append(owner)
+        return owners
+
+    def fill(self, owners: Dict[Any, List[EntityOrVo]], rows: Sequence[Sequence], items: List[EntityOrVo]) -> None:
+        for row, item in zip(rows, items):
+            for owner in owners[row[-1]]:
+                getattr(owner, self.name).append(item)
+
+
+@attr.s(auto_attribs=True)
+class _Statement:
+    # position of the next column to be read
+    position: int = 0
+    # names of nested entities leading from objects populated from statement's rows to the current one
+    path: List[str] = attr.Factory(list)
+    collections: List[CollectionLoader] = attr.Factory(list)
+
+
+class PopulatingAggregateFromRowVisitor(Visitor):
+    """Compiles AET into a loader turning rows of QueryBuildingVisitor.select into aggregates.
+
+    Columns are read by position, which follows depth-first order of fields in AET. Lists are populated empty and
+    filled by their own loaders, with items read from statements selecting lists of all owners at once.
+    """
+
+    def __init__(self, registry: SaRegistry) -> None:
+        self._registry = registry
+        self._statements_stack: List[_Statement] = []
+        self._entities_stack: List[EntityLikeNode] = []
+        self._readers_stack: List[List[Getter]] = []
+        self._identity_positions_stack: List[Optional[int]] = []
+        self._result: Optional[RowsLoader] = None
 
     @property
-    def result(self) -> Any:
+    def result(self) -> RowsLoader:
         return self._result
 
+    @property
+    def _statement(self) -> _Statement:
+        return self._statements_stack[-1]
+
+    def _read_next_column(self) -> Getter:
+        reader = itemgetter(self._statement.position)
+        self._statement.position += 1
+        return reader
+
     def visit_field(self, field: FieldNode) -> None:
-        if isinstance(self._ef_objects_stack[-1], EntityNode):
-            field_name = field.name
+        if field.is_identity:
+            self._identity_positions_stack[-1] = self._statement.position
+        self._readers_stack[-1].append(self._read_next_column())
+
+    def visit_entity(self, entity: EntityNode) -> None:
+        if self._statements_stack:
+            self._statement.path.append(entity.name)
         else:
-            field_name = f"{self._prefix}{field.name}"
+            self._statements_stack.append(_Statement())
+        self._push_entity(entity)
 
-        db_object = self._db_result
-        for index, entity in enumerate(self._entities_stack[:-1]):
-            next_entity = self._entities_stack[index + 1]
-            db_object = getattr(db_object, next_entity.name)
+    def leave_entity(self, entity: EntityNode) -> None:
+        populate_entity = self._pop_entity(entity)
 
-        self._ef_dicts_stack[-1][field.name] = getattr(db_object, field_name)
+        if not self._readers_stack:
+            self._result = RowsLoader(populate_entity, tuple(self._statements_stack.pop().collections))
+        else:
+            self._statement.path.pop()
+            self._readers_stack[-1].append(populate_entity)
 
-    def visit_entity(self, entity: EntityNode) -> None:
+    def _push_entity(self, entity: EntityLikeNode) -> None:
         self._entities_stack.append(entity)
-        self._stack_complex_object(entity)
+        self._readers_stack.append([])
+        self._identity_positions_stack.append(None)
 
-    def leave_entity(self, entity: EntityNode) -> None:
+    def _pop_entity(self, entity: EntityLikeNode) -> RowAggregatePopulator:
         self._entities_stack.pop()
-        self._construct_complex_object(entity)
+        readers = self._readers_stack.pop()
+        identity_position = self._identity_positions_stack.pop()
+        entity_cls = entity.type
+
+        def populate_entity(row: Sequence) -> Optional[EntityOrVo]:
+            if row[identity_position] is None:  # outer join did not match
+                return None
+            return entity_cls(*[reader(row) for reader in readers])
+
+        return populate_entity
 
-    def visit_value_object(self, value_object: ValueObjectNode) -> None:
-        self._stacked_vo.append(value_object)
-        self._stack_complex_object(value_object)
+    def visit_value_object(self, value_object: ValueObjectNode) -> Any:
+        if is_stored_as_json(value_object, self._registry):
+            return self._read_json(value_object)
+        self._readers_stack.append([])
 
     def leave_value_object(self, value_object: ValueObjectNode) -> None:
-        self._stacked_vo.pop()
-        self._construct_complex_object(value_object)
-
-    def _stack_complex_object(self, vo_or_entity: Union[ValueObjectNode, EntityNode]) -> None:
-        self._ef_objects_stack.append(vo_or_entity)
-        self._ef_dicts_stack.append({})
-
-    def _construct_complex_object(self, vo_or_entity: Union[ValueObjectNode, EntityNode]) -> None:
-        self._ef_objects_stack.pop()
-        entity_dict = self._ef_dicts_stack.pop()
-        if vo_or_entity.optional and entity_dict and all(v is None for v in entity_dict.values()):
-            # One is not able to tell the difference between optional object with all its fields = None or
-            # an absence of entire vo_or_entity
-            instance = None
-        else:
-            instance = vo_or_entity.type(**entity_dict)
-        if self._ef_dicts_stack:
-            self._ef_dicts_stack[-1][vo_or_entity.name] = instance
-        else:
-            self._result = instance
+        readers = self._readers_stack.pop()
+        vo_cls = value_object.type
+        optional = value_object.optional
+
+        def populate_value_object(row: Sequence) -> Optional[EntityOrVo]:
+            values = [reader(row) for reader in readers]
+            if optional and values and all(v is None for v in values):
+                return None
+            return vo_cls(*values)
+
+        self._readers_stack[-1].append(populate_value_object)
+
+    def _read_json(self, node: Union[ValueObjectNode, ListOfValueObjectsNode]) -> Any:
+        read_column = self._read_next_column()
+        decode = build_codec(node).decode
+
+        def read_json(row: Sequence) -> Any:
+            return decode(read_column(row))
+
+        self._readers_stack[-1].append(read_json)
+        return self.SKIP_CHILDREN
 
     def visit_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
-        raise NotImplementedError
+        self._statements_stack.append(_Statement())
+        self._push_entity(list_of_entities)
 
     def leave_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
-        raise NotImplementedError
+        self._leave_list(list_of_entities, self._pop_entity(list_of_entities))
 
-    def visit_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> None:
-        raise NotImplementedError
+    def visit_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> Any:
+        if is_stored_as_json(list_of_value_objects, self._registry):
+            return self._read_json(list_of_value_objects)
+        self._statements_stack.append(_Statement())
+        self._readers_stack.append([])
 
     def leave_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> None:
-        raise NotImplementedError
+        readers = self._readers_stack.pop()
+        vo_cls = list_of_value_objects.type
+
+        def populate_value_object(row: Sequence) -> EntityOrVo:
+            return vo_cls(*[reader(row) for reader in readers])
+
+        self._leave_list(list_of_value_objects, populate_value_object)
+
+    def _leave_list(
+        self, list_node: Union[ListOfEntitiesNode, ListOfValueObjectsNode], populate_item: RowAggregatePopulator
+    ) -> None:
+        items = RowsLoader(populate_item, tuple(self._statements_stack.pop().collections))
+        owner = self._entities_stack[-1]
+        query_building_visitor = QueryBuildingVisitor(self._registry, owner)
+        query_building_visitor.traverse_from(list_node)
+        self._statement.collections.append(
+            CollectionLoader(
+                name=list_node.name,
+                owner_path=tuple(self._statement.path),
+                owner_identity_name=owner.identity.name,
+                select=query_building_visitor.select,
+                items=items,
+            )
+        )
+
+        def read_empty_list(_row: Sequence) -> List[EntityOrVo]:
+            return []
+
+        self._readers_stack[-1].append(read_empty_list)
@@ -1,4 +1,4 @@
-from typing import List, Union, Any
+from typing import Any, Callable, List, Optional, Tuple, Type, Union
 
 from entity_framework.abstract_entity_tree import (
     Visitor,
@@ -8,96 +8,153 @@ from entity_framework.abstract_entity_tree import (
     ListOfEntitiesNode,
     ListOfValueObjectsNode,
 )
+from entity_framework import lazy
 from entity_framework.entity import EntityOrVo
+from entity_framework.storages.sqlalchemy.constructing_model.visitor import (
+    EntityLikeNode,
+    parent_reference_column_name,
+    position_column_name,
+)
+from entity_framework.storages.sqlalchemy.json_value_objects import build_codec, is_stored_as_json
 from entity_framework.storages.sqlalchemy.registry import SaRegistry
 
 
+Writer = Callable[[EntityOrVo, dict], None]
+ModelPopulator = Callable[[Optional[EntityOrVo]], Any]
+
+
 class ModelPopulatingVisitor(Visitor):
-    EMPTY_PREFIX = ""
+    """Compiles AET into a function that turns an aggregate into model instance ready to be merged.
 
-    def __init__(self, aggregate: EntityOrVo, registry: SaRegistry) -> None:
-        self._aggregate = aggregate
-        self._registry = registry
-        self._complex_objects_stack: List[EntityOrVo] = []
-        self._entities_stack: List[EntityNode] = []
-        self._ef_objects_stack: List[Union[EntityNode, ValueObjectNode]] = []
-        self._models_dicts_stack: List[dict] = []
-        self._result: Any = None
-        self._stacked_vo: List[ValueObjectNode] = []
+    Every complex object gets a list of writers putting its (prefixed) columns into model's kwargs. Absent optional
+    value objects null all their columns, absent optional entities null the relationship. Items of lists carry
+    reference to their owner and position explicitly, so that merge matches them with rows already stored.
+    """
 
-    @property
-    def _prefix(self) -> str:
-        if not self._stacked_vo:
-            return self.EMPTY_PREFIX
-        return "_".join(vo.name for vo in self._stacked_vo) + "_"
+    def __init__(self, registry: SaRegistry) -> None:
+        self._registry = registry
+        self._entities_stack: List[EntityLikeNode] = []
+        self._frames_stack: List[Tuple[List[Writer], List[str]]] = []
+        self._result: Optional[ModelPopulator] = None
 
     @property
-    def result(self) -> Any:
+    def result(self) -> ModelPopulator:
         return self._result
 
     def visit_field(self, field: FieldNode) -> None:
-        if isinstance(self._ef_objects_stack[-1], EntityNode):
-            field_name = field.name
-        else:
-            field_name = f"{self._prefix}{field.name}"
+        column_name = field.column_name
+        field_name = field.name
+
+        def write_field(ef_object: EntityOrVo, model_kwargs: dict) -> None:
+            model_kwargs[column_name] = getattr(ef_object, field_name)
 
-        if self._complex_objects_stack[-1]:  # may be none if optional
-            self._models_dicts_stack[-1][field_name] = getattr(self._complex_objects_stack[-1], field.name)
+        writers, columns = self._frames_stack[-1]
+        writers.append(write_field)
+        columns.append(column_name)
 
     def visit_entity(self, entity: EntityNode) -> None:
         self._entities_stack.append(entity)
-        self._stack_complex_object(entity)
-        self._models_dicts_stack.append({})
+        self._frames_stack.append(([], []))
 
     def leave_entity(self, entity: EntityNode) -> None:
         self._entities_stack.pop()
-        self._construct_model(entity)
-        self._complex_objects_stack.pop()
-
-    def visit_value_object(self, value_object: ValueObjectNode) -> None:
-        self._stacked_vo.append(value_object)
-        self._stack_complex_object(value_object)
+        writers, _columns = self._frames_stack.pop()
+        model_cls = self._registry.entities_models[entity.type]
+
+        def populate_model(ef_object: Optional[EntityOrVo]) -> Any:
+            if ef_object is None:
+                return None
+            model_kwargs: dict = {}
+            for writer in writers:
+                writer(ef_object, model_kwargs)
+            return model_cls(**model_kwargs)
+
+        if not self._frames_stack:
+            self._result = populate_model
+            return
+
+        relationship_name = entity.name
+        identity_name = entity.identity.name
+        foreign_key_column = f"{entity.name}_{identity_name}"
+
+        def write_nested_entity(ef_object: EntityOrVo, model_kwargs: dict) -> None:
+            nested = getattr(ef_object, relationship_name)
+            if lazy.is_unloaded(nested):
+                # never loaded, hence not changed either - only the reference is written
+                model_kwargs[foreign_key_column] = getattr(nested, identity_name)
+                return
+            model_kwargs[relationship_name] = populate_model(nested)
+
+        self._frames_stack[-1][0].append(write_nested_entity)
+
+    def visit_value_object(self, value_object: ValueObjectNode) -> Any:
+        if is_stored_as_json(value_object, self._registry):
+            return self._write_json(value_object)
+        self._frames_stack.append(([], []))
 
     def leave_value_object(self, value_object: ValueObjectNode) -> None:
-        self._stacked_vo.pop()
-        self._complex_objects_stack.pop()
-
-    def _stack_complex_object(self, vo_or_entity: Union[ValueObjectNode, EntityNode]) -> None:
-        self._ef_objects_stack.append(vo_or_entity)
-        if not self._complex_objects_stack:
-            self._complex_objects_stack.append(self._aggregate)
-        else:
-            current = self._complex_objects_stack[-1]
-            if current is None:
-                another = None
-            else:
-                another = getattr(current, vo_or_entity.name)
-
-            self._complex_objects_stack.append(another)
-
-    def _construct_model(self, entity: EntityNode) -> None:
-        self._ef_objects_stack.pop()
-        entity_dict = self._models_dicts_stack.pop()
-        if entity.optional and entity_dict and all(v is None for v in entity_dict.values()):
-            # One is not able to tell the difference between optional object with all its fields = None or
-            # an absence of entire vo_or_entity
-            instance = None
-        else:
-            model_cls = self._registry.entities_models[entity.type]
-            instance = model_cls(**entity_dict)
-        if self._models_dicts_stack:
-            self._models_dicts_stack[-1][entity.name] = instance
-        else:
-            self._result = instance
+        writers, columns = self._frames_stack.pop()
+        vo_name = value_object.name
+        nulled_columns = dict.fromkeys(columns)
+
+        def write_value_object(ef_object: EntityOrVo, model_kwargs: dict) -> None:
+            vo = getattr(ef_object, vo_name)
+            if vo is None:
+                model_kwargs.update(nulled_columns)
+                return
+            for writer in writers:
+                writer(vo, model_kwargs)
+
+        parent_writers, parent_columns = self._frames_stack[-1]
+        parent_writers.append(write_value_object)
+        parent_columns.extend(columns)
 
     def visit_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
-        raise NotImplementedError
+        self._entities_stack.append(list_of_entities)
+        self._frames_stack.append(([], []))
 
     def leave_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
-        raise NotImplementedError
+        self._entities_stack.pop()
+        self._leave_list(list_of_entities, self._registry.entities_models[list_of_entities.type])
 
-    def visit_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> None:
-        raise NotImplementedError
+    def visit_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> Any:
+        if is_stored_as_json(list_of_value_objects, self._registry):
+            return self._write_json(list_of_value_objects)
+        self._frames_stack.append(([], []))
 
     def leave_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> None:
-        raise NotImplementedError
+        key = (self._entities_stack[-1].type, list_of_value_objects.name)
+        self._leave_list(list_of_value_objects, self._registry.value_objects_lists_models[key])
+
+    def _write_json(self, node: Union[ValueObjectNode, ListOfValueObjectsNode]) -> Any:
+        column_name = node.column_name
+        field_name = node.name
+        encode = build_codec(node).encode
+
+        def write_json(ef_object: EntityOrVo, model_kwargs: dict) -> None:
+            model_kwargs[column_name] = encode(getattr(ef_object, field_name))
+
+        writers, columns = self._frames_stack[-1]
+        writers.append(write_json)
+        columns.append(column_name)
+        return self.SKIP_CHILDREN
+
+    def _leave_list(self, list_node: Union[ListOfEntitiesNode, ListOfValueObjectsNode], model_cls: Type) -> None:
+        writers, _columns = self._frames_stack.pop()
+        parent = self._entities_stack[-1]
+        parent_identity_name = parent.identity.name
+        reference_column = parent_reference_column_name(parent)
+        position_column = position_column_name(list_node)
+        list_name = list_node.name
+
+        def write_list(ef_object: EntityOrVo, model_kwargs: dict) -> None:
+            parent_identity = getattr(ef_object, parent_identity_name)
+            models = []
+            for position, item in enumerate(getattr(ef_object, list_name)):
+                item_kwargs = {reference_column: parent_identity, position_column: position}
+                for writer in writers:
+                    writer(item, item_kwargs)
+                models.append(model_cls(**item_kwargs))
+            model_kwargs[list_name] = models
+
+        self._frames_stack[-1][0].append(write_list)
@@ -0,0 +1,219 @@
+from typing import Any, Callable, List, Optional, Tuple, Type, Union
+
+import attr
+from sqlalchemy import and_, bindparam, select
+from sqlalchemy.sql import Delete, Select
+
+from entity_framework.abstract_entity_tree import (
+    Visitor,
+    FieldNode,
+    EntityNode,
+    ValueObjectNode,
+    ListOfEntitiesNode,
+    ListOfValueObjectsNode,
+)
+from entity_framework import lazy
+from entity_framework.entity import EntityOrVo
+from entity_framework.storages.sqlalchemy.constructing_model.visitor import (
+    EntityLikeNode,
+    parent_reference_column_name,
+    position_column_name,
+)
+from entity_framework.storages.sqlalchemy.json_value_objects import build_codec, is_stored_as_json
+from entity_framework.storages.sqlalchemy.registry import SaRegistry
+
+
+Row = Tuple[Type, dict]
+Writer = Callable[[EntityOrVo, dict, List[Row]], None]
+RowsPopulator = Callable[[EntityOrVo], List[Row]]
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Collection:
+    """Table of a list's items, written as rows referencing the owner, so that items gone from lists can be deleted."""
+
+    owner_model: Type
+    # column of owner's row holding its identity
+    owner_identity: str
+    model: Type
+    # primary keys of items of owners bound to expanding "owners" parameter
+    select_keys: Select
+    # deletes an item by its primary key bound to parameters named after primary key columns
+    delete: Delete
+
+
+def primary_key_of(model: Type, row: dict) -> tuple:
+    return tuple(row[column.key] for column in model.__mapper__.primary_key)
+
+
+def _collection(owner: EntityLikeNode, owner_model: Type, model: Type) -> Collection:
+    primary_key = model.__mapper__.primary_key
+    reference = model.__table__.c[parent_reference_column_name(owner)]
+    return Collection(
+        owner_model=owner_model,
+        owner_identity=owner.identity.name,
+        model=model,
+        select_keys=select(primary_key).where(reference.in_(bindparam("owners", expanding=True))),
+        delete=model.__table__.delete().where(and_(*[column == bindparam(column.key) for column in primary_key])),
+    )
+
+
+def _entity_rows_populator(model_cls: Type, writers: List[Writer], lists_writers: List[Writer]) -> Writer:
+    def populate_entity_rows(ef_object: EntityOrVo, row: dict, rows: List[Row]) -> None:
+        for writer in writers:
+            writer(ef_object, row, rows)
+        rows.append((model_cls, row))
+        # items reference their owner, so they follow its row
+        for writer in lists_writers:
+            writer(ef_object, row, rows)
+
+    return populate_entity_rows
+
+
+class RowsPopulatingVisitor(Visitor):
+    """Compiles AET into a function flattening an aggregate into (model, row mapping) pairs.
+
+    Rows of nested entities precede rows referencing them, so they can be written in returned order. Unlike models
+    built by ModelPopulatingVisitor, rows carry foreign keys instead of relationships. Items of lists carry reference
+    to their owner and position on the list, tables of lists are described by `collections`.
+    """
+
+    def __init__(self, registry: SaRegistry) -> None:
+        self._registry = registry
+        self._entities_stack: List[EntityLikeNode] = []
+        self._frames_stack: List[Tuple[List[Writer], List[str]]] = []
+        # writers of lists owned by entities on the stack, run once owner's row is written
+        self._lists_writers_stack: List[List[Writer]] = []
+        self._collections: List[Collection] = []
+        self._result: Optional[RowsPopulator] = None
+
+    @property
+    def result(self) -> RowsPopulator:
+        return self._result
+
+    @property
+    def collections(self) -> Tuple[Collection, ...]:
+        return tuple(self._collections)
+
+    def visit_field(self, field: FieldNode) -> None:
+        column_name = field.column_name
+        field_name = field.name
+
+        def write_field(ef_object: EntityOrVo, row: dict, _rows: List[Row]) -> None:
+            row[column_name] = getattr(ef_object, field_name)
+
+        writers, columns = self._frames_stack[-1]
+        writers.append(write_field)
+        columns.append(column_name)
+
+    def visit_entity(self, entity: EntityNode) -> None:
+        self._push_entity(entity)
+
+    def leave_entity(self, entity: EntityNode) -> None:
+        populate_entity_rows = self._pop_entity(self._registry.entities_models[entity.type])
+
+        if not self._frames_stack:
+
+            def populate_rows(aggregate: EntityOrVo) -> List[Row]:
+                rows: List[Row] = []
+                populate_entity_rows(aggregate, {}, rows)
+                return rows
+
+            self._result = populate_rows
+            return
+
+        identity_name = entity.identity.name
+        relationship_name = entity.name
+        foreign_key_column = f"{entity.name}_{identity_name}"
+
+        def write_nested_entity(ef_object: EntityOrVo, row: dict, rows: List[Row]) -> None:
+            nested: Any = getattr(ef_object, relationship_name)
+            if nested is None:
+                row[foreign_key_column] = None
+                return
+            row[foreign_key_column] = getattr(nested, identity_name)
+            if not lazy.is_unloaded(nested):  # entity that was never loaded could not have been changed
+                populate_entity_rows(nested, {}, rows)
+
+        self._frames_stack[-1][0].append(write_nested_entity)
+
+    def _push_entity(self, entity: EntityLikeNode) -> None:
+        self._entities_stack.append(entity)
+        self._frames_stack.append(([], []))
+        self._lists_writers_stack.append([])
+
+    def _pop_entity(self, model_cls: Type) -> Writer:
+        self._entities_stack.pop()
+        writers, _columns = self._frames_stack.pop()
+        return _entity_rows_populator(model_cls, writers, self._lists_writers_stack.pop())
+
+    def visit_value_object(self, value_object: ValueObjectNode) -> Any:
+        if is_stored_as_json(value_object, self._registry):
+            return self._write_json(value_object)
+        self._frames_stack.append(([], []))
+
+    def leave_value_object(self, value_object: ValueObjectNode) -> None:
+        writers, columns = self._frames_stack.pop()
+        vo_name = value_object.name
+        nulled_columns = dict.fromkeys(columns)
+
+        def write_value_object(ef_object: EntityOrVo, row: dict, rows: List[Row]) -> None:
+            vo = getattr(ef_object, vo_name)
+            if vo is None:
+                row.update(nulled_columns)
+                return
+            for writer in writers:
+                writer(vo, row, rows)
+
+        parent_writers, parent_columns = self._frames_stack[-1]
+        parent_writers.append(write_value_object)
+        parent_columns.extend(columns)
+
+    def _write_json(self, node: Union[ValueObjectNode, ListOfValueObjectsNode]) -> Any:
+        column_name = node.column_name
+        field_name = node.name
+        encode = build_codec(node).encode
+
+        def write_json(ef_object: EntityOrVo, row: dict, _rows: List[Row]) -> None:
+            row[column_name] = encode(getattr(ef_object, field_name))
+
+        writers, columns = self._frames_stack[-1]
+        writers.append(write_json)
+        columns.append(column_name)
+        return self.SKIP_CHILDREN
+
+    def visit_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
+        self._push_entity(list_of_entities)
+
+    def leave_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
+        model_cls = self._registry.entities_models[list_of_entities.type]
+        self._leave_list(list_of_entities, model_cls, self._pop_entity(model_cls))
+
+    def visit_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> Any:
+        if is_stored_as_json(list_of_value_objects, self._registry):
+            return self._write_json(list_of_value_objects)
+        self._frames_stack.append(([], []))
+
+    def leave_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> None:
+        writers, _columns = self._frames_stack.pop()
+        model_cls = self._registry.value_objects_lists_models[
+            (self._entities_stack[-1].type, list_of_value_objects.name)
+        ]
+        self._leave_list(list_of_value_objects, model_cls, _entity_rows_populator(model_cls, writers, []))
+
+    def _leave_list(
+        self, list_node: Union[ListOfEntitiesNode, ListOfValueObjectsNode], model_cls: Type, populate_item_rows: Writer
+    ) -> None:
+        owner = self._entities_stack[-1]
+        owner_identity_name = owner.identity.name
+        reference_column = parent_reference_column_name(owner)
+        position_column = position_column_name(list_node)
+        list_name = list_node.name
+
+        def write_list(ef_object: EntityOrVo, _row: dict, rows: List[Row]) -> None:
+            owner_identity = getattr(ef_object, owner_identity_name)
+            for position, item in enumerate(getattr(ef_object, list_name)):
+                populate_item_rows(item, {reference_column: owner_identity, position_column: position}, rows)
+
+        self._lists_writers_stack[-1].append(write_list)
+        self._collections.append(_collection(owner, self._registry.entities_models[owner.type], model_cls))
@@ -0,0 +1,80 @@
+from collections import namedtuple
+from operator import itemgetter
+from typing import Any, Callable, Dict, Optional, Sequence, Union
+
+from entity_framework.abstract_entity_tree import (
+    Visitor,
+    FieldNode,
+    EntityNode,
+    ValueObjectNode,
+    ListOfEntitiesNode,
+    ListOfValueObjectsNode,
+)
+from entity_framework.storages.sqlalchemy.json_value_objects import build_codec, is_stored_as_json
+from entity_framework.storages.sqlalchemy.registry import SaRegistry
+
+
+Projector = Callable[[Sequence], tuple]
+
+
+class ProjectionPopulatingVisitor(Visitor):
+    """Compiles (pruned) AET into a function turning a row of QueryBuildingVisitor.select into a namedtuple.
+
+    Only fields at given dotted paths (and value objects stored as JSON) end up in the namedtuple, named after
+    paths with dots replaced by underscores. Columns are read by position, just like in
+    PopulatingAggregateFromRowVisitor.
+    """
+
+    def __init__(self, registry: SaRegistry, fields: Sequence[str]) -> None:
+        self._registry = registry
+        self._fields = fields
+        self._position = 0
+        self._readers: Dict[str, Callable[[Sequence], Any]] = {}
+        self._root: Optional[EntityNode] = None
+
+    @property
+    def result(self) -> Projector:
+        missing = [field for field in self._fields if field not in self._readers]
+        if missing:
+            raise ValueError(f"Only fields can be projected, got: {', '.join(missing)}")
+
+        projection_cls = namedtuple(
+            f"{self._root.type.__name__}Projection", [field.replace(".", "_") for field in self._fields]
+        )
+        readers = [self._readers[field] for field in self._fields]
+
+        def project(row: Sequence) -> tuple:
+            return projection_cls(*[reader(row) for reader in readers])
+
+        return project
+
+    def visit_field(self, field: FieldNode) -> None:
+        self._readers[".".join(field.path)] = itemgetter(self._position)
+        self._position += 1
+
+    def visit_entity(self, entity: EntityNode) -> None:
+        if self._root is None:
+            self._root = entity
+
+    def visit_value_object(self, value_object: ValueObjectNode) -> Any:
+        if is_stored_as_json(value_object, self._registry):
+            return self._read_json(value_object)
+
+    def _read_json(self, node: Union[ValueObjectNode, ListOfValueObjectsNode]) -> Any:
+        read_column = itemgetter(self._position)
+        decode = build_codec(node).decode
+        self._position += 1
+
+        def read_json(row: Sequence) -> Any:
+            return decode(read_column(row))
+
+        self._readers[".".join(node.path)] = read_json
+        return self.SKIP_CHILDREN
+
+    def visit_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
+        raise NotImplementedError("Projecting lists is not supported")
+
+    def visit_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> Any:
+        if is_stored_as_json(list_of_value_objects, self._registry):
+            return self._read_json(list_of_value_objects)
+        raise NotImplementedError("Projecting lists is not supported")
@@ -1,41 +1,180 @@
-from typing import Optional, List, DefaultDict, Set, Type
-from collections import defaultdict
+from typing import Any, Callable, Optional, List, Set, Type, Union
 
-from sqlalchemy.orm import Query, joinedload
+from sqlalchemy import Column, bindparam, select
+from sqlalchemy.orm import Query, Load
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.selectable import FromClause
 
-from entity_framework.abstract_entity_tree import Visitor, EntityNode
-from entity_framework.storages.sqlalchemy.registry import SaRegistry
+from entity_framework.abstract_entity_tree import (
+    Visitor,
+    EntityNode,
+    FieldNode,
+    ValueObjectNode,
+    ListOfEntitiesNode,
+    ListOfValueObjectsNode,
+)
+from entity_framework.storages.sqlalchemy.constructing_model.visitor import (
+    EntityLikeNode,
+    parent_reference_column_name,
+    position_column_name,
+)
+from entity_framework.storages.sqlalchemy.json_value_objects import is_stored_as_json
+from entity_framework.storages.sqlalchemy.registry import LazyPaths, SaRegistry
 
 
 class QueryBuildingVisitor(Visitor):
-    def __init__(self, registry: SaRegistry) -> None:
+    """Builds ORM query and Core select of an aggregate, or - given the owner - of items of its list.
+
+    ORM query loads lists with their own SELECT ... IN statements. So does the repository reading with Core select,
+    which covers only what can be joined to a single row of the root and leaves items of lists out.
+    """
+
+    def __init__(
+        self, registry: SaRegistry, owner: Optional[EntityLikeNode] = None, lazy_paths: LazyPaths = frozenset()
+    ) -> None:
         self._registry = registry
+        self._lazy_paths = lazy_paths
+        # entity owning the list traversed from, in place of an aggregate
+        self._owner = owner
+        self._root: Optional[Union[EntityNode, ListOfEntitiesNode, ListOfValueObjectsNode]] = None
         self._root_model: Optional[Type] = None
         self._models_stack: List[Type] = []
-        self._models_to_join: DefaultDict[Type, List[str]] = defaultdict(list)
+        self._entity_types_stack: List[Type] = [] if owner is None else [owner.type]
+        # lists being visited below the root, neither their columns nor their joins end up in the select
+        self._collections_depth = 0
+        # loader option reaching each model on the stack from the root
+        self._loads_stack: List[Load] = []
+        self._loader_options: List[Load] = []
         self._all_models: Set[Type] = set()
         self._query: Optional[Query] = None
+        self._columns: List[Column] = []
+        self._from_clause: Optional[FromClause] = None
+        self._outer_joins_stack: List[bool] = []
+        self._has_lazy_entities = False
 
     @property
     def query(self) -> Query:
         if not self._root_model:
             raise Exception("No root model")
 
-        # TODO: support more nesting levels than just one
-        return Query(self._root_model).options(
-            joinedload(getattr(self._root_model, rel_name)) for rel_name in self._models_to_join[self._root_model]
+        # Options are chained down from the root, so entities nested at any depth are loaded eagerly as well
+        return Query(self._root_model).options(*self._loader_options)
+
+    @property
+    def select(self) -> Select:
+        """Core statement selecting columns of all fields in AET's depth-first order, without ORM instances."""
+        if not self._root_model:
+            raise Exception("No root model")
+        if self._has_lazy_entities:
+            raise NotImplementedError("Lazy entities are loaded through ORM session, core reads are not supported")
+
+        if self._owner is None:
+            return select(self._columns).select_from(self._from_clause).apply_labels()
+
+        # items of owners bound to expanding "owners" parameter, in order of lists, each followed by its owner
+        table = self._root_model.__table__
+        reference = table.c[parent_reference_column_name(self._owner)]
+        return (
+            select([*self._columns, reference])
+            .select_from(self._from_clause)
+            .where(reference.in_(bindparam("owners", expanding=True)))
+            .order_by(reference, table.c[position_column_name(self._root)])
+            .apply_labels()
         )
 
-    def visit_entity(self, entity: EntityNode) -> None:
+    def visit_field(self, field: FieldNode) -> None:
+        if not self._collections_depth:
+            table = self._models_stack[-1].__table__
+            self._columns.append(table.c[field.column_name])
+
+    def visit_entity(self, entity: EntityNode) -> Any:
         # TODO: decide what to do with fields used magically, like entity.name which is really just a node name
+        if self._models_stack and entity.path in self._lazy_paths:
+            # neither joined nor eagerly loaded, populators read just the foreign key of the model above
+            self._has_lazy_entities = True
+            return self.SKIP_CHILDREN
         model = self._registry.entities_models[entity.type]
         if not self._root_model:
-            self._root_model = model
+            self._start(entity, model)
         elif self._models_stack:
-            self._models_to_join[self._models_stack[-1]].append(entity.name)
+            self._join(entity, model)
+            self._push_load(Load.joinedload, entity.name)
 
         self._models_stack.append(model)
+        self._entity_types_stack.append(entity.type)
         self._all_models.add(model)
 
+    def _start(self, root: Union[EntityNode, ListOfEntitiesNode, ListOfValueObjectsNode], model: Type) -> None:
+        self._root = root
+        self._root_model = model
+        self._from_clause = model.__table__
+        self._outer_joins_stack.append(False)
+        self._loads_stack.append(Load(model))
+
+    def _join(self, entity: EntityNode, model: Type) -> None:
+        identity_name = entity.identity.name
+        parent_table = self._models_stack[-1].__table__
+        table = model.__table__
+        # once outer joined, all tables below have to be outer joined as well, not to filter out the root row
+        is_outer = entity.optional or self._outer_joins_stack[-1]
+        if not self._collections_depth:
+            self._from_clause = self._from_clause.join(
+                table, parent_table.c[f"{entity.name}_{identity_name}"] == table.c[identity_name], isouter=is_outer
+            )
+        self._outer_joins_stack.append(is_outer)
+
     def leave_entity(self, entity: EntityNode) -> None:
         self._models_stack.pop()
+        self._entity_types_stack.pop()
+        self._outer_joins_stack.pop()
+        self._loads_stack.pop()
+
+    def _push_load(self, strategy: Callable[[Load, Any], Load], name: str) -> None:
+        # Entities are joined, collections are loaded with one additional SELECT ... IN per relationship instead of
+        # joins multiplying rows
+        option = strategy(self._loads_stack[-1], getattr(self._models_stack[-1], name))
+        self._loader_options.append(option)
+        self._loads_stack.append(option)
+
+    def visit_value_object(self, value_object: ValueObjectNode) -> Any:
+        if is_stored_as_json(value_object, self._registry):
+            return self._select_json_column(value_object)
+
+    def visit_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
+        self._visit_list(list_of_entities, self._registry.entities_models[list_of_entities.type])
+        self._entity_types_stack.append(list_of_entities.type)
+
+    def leave_list_of_entities(self, list_of_entities: ListOfEntitiesNode) -> None:
+        self._leave_list(list_of_entities)
+        self._entity_types_stack.pop()
+
+    def visit_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> Any:
+        if is_stored_as_json(list_of_value_objects, self._registry):
+            return self._select_json_column(list_of_value_objects)
+        model = self._registry.value_objects_lists_models[(self._entity_types_stack[-1], list_of_value_objects.name)]
+        self._visit_list(list_of_value_objects, model)
+
+    def leave_list_of_value_objects(self, list_of_value_objects: ListOfValueObjectsNode) -> None:
+        self._leave_list(list_of_value_objects)
+
+    def _visit_list(self, list_node: Union[ListOfEntitiesNode, ListOfValueObjectsNode], model: Type) -> None:
+        if not self._root_model:
+            self._start(list_node, model)
+        else:
+            self._push_load(Load.selectinload, list_node.name)
+            self._collections_depth += 1
+        self._models_stack.append(model)
+        self._all_models.add(model)
+
+    def _leave_list(self, list_node: Union[ListOfEntitiesNode, ListOfValueObjectsNode]) -> None:
+        self._models_stack.pop()
+        self._loads_stack.pop()
+        if list_node is not self._root:
+            self._collections_depth -= 1
+
+    def _select_json_column(self, node: Union[ValueObjectNode, ListOfValueObjectsNode]) -> Any:
+        # column of owning model, loaded with it - no join nor additional query needed
+        if not self._collections_depth:
+            table = self._models_stack[-1].__table__
+            self._columns.append(table.c[node.column_name])
+        return self.SKIP_CHILDREN
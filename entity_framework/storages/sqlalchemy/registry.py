@@ -1,13 +1,45 @@
-from typing import Dict, Type
+from typing import Any, Callable, Dict, FrozenSet, List, Sequence, Set, Tuple, Type
 
 import attr
+from sqlalchemy import Table
+from sqlalchemy.ext.baked import Bakery, BakedQuery
 from sqlalchemy.ext.declarative import DeclarativeMeta
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql import Select
 
-from entity_framework.entity import Entity
+from entity_framework.entity import Entity, ValueObject
 from entity_framework.registry import Registry
 
 
+# select of projected columns, the same select by identity, function turning its rows into namedtuples
+Projection = Tuple[Select, Select, Callable[[Sequence], tuple]]
+# paths of fields (see `Node.path`) leading from the aggregate root to nested entities loaded lazily
+LazyPaths = FrozenSet[Tuple[str, ...]]
+
+
 @attr.s(auto_attribs=True)
 class SaRegistry(Registry):
     # TODO: Think of refactoring, so that this does not have semantics of a global variable
     entities_models: Dict[Type[Entity], Type[DeclarativeMeta]] = attr.Factory(dict)
+    # (owning entity, list's field name) -> model of list of value objects
+    value_objects_lists_models: Dict[Tuple[Type[Entity], str], Type[DeclarativeMeta]] = attr.Factory(dict)
+    models_populators: Dict[Type[Entity], Callable[[Entity], Any]] = attr.Factory(dict)
+    rows_populators: Dict[Type[Entity], Callable[[Entity], List[Tuple[Type, dict]]]] = attr.Factory(dict)
+    # tables of lists written by rows populators, see `populating_rows.visitor.Collection`
+    rows_collections: Dict[Type[Entity], Tuple[Any, ...]] = attr.Factory(dict)
+    aggregates_populators: Dict[Type[Entity], Callable[[Any], Entity]] = attr.Factory(dict)
+    # see `populating_aggregates.visitor.RowsLoader`
+    rows_loaders: Dict[Type[Entity], Any] = attr.Factory(dict)
+    upserts: Dict[Tuple[str, Table], Any] = attr.Factory(dict)
+    projections: Dict[Tuple[Type[Entity], Tuple[str, ...]], Projection] = attr.Factory(dict)
+    # SQL compiled once per statement of repositories, so that each call only binds parameters
+    bakery: Bakery = attr.Factory(BakedQuery.bakery)
+    compiled_cache: Dict[Any, Any] = attr.Factory(dict)
+    # value objects (and lists of them) of these types are stored in a single JSON column instead of flattened ones
+    json_value_objects: Set[Type[ValueObject]] = attr.Factory(set)
+    # (owning entity, field name) of nested entities loaded only once any of their fields other than identity is
+    # accessed, unless a read asks for other ones
+    lazy_fields: Set[Tuple[Type[Entity], str]] = attr.Factory(set)
+    lazy_loaders: Dict[Type[Entity], Callable[[Session, Any], Entity]] = attr.Factory(dict)
+    # ORM query and aggregates populator of reads asking for laziness other than the one of `lazy_fields`
+    lazy_loadings: Dict[Tuple[Type[Entity], LazyPaths], Tuple[Query, Callable[[Any], Entity]]] = attr.Factory(dict)
@@ -0,0 +1,92 @@
+import operator
+from typing import Any, Callable, Dict, Sequence
+
+from sqlalchemy import and_, not_, or_
+from sqlalchemy.sql import ClauseElement
+
+from entity_framework.abstract_entity_tree import (
+    Node,
+    FieldNode,
+    EntityNode,
+    ValueObjectNode,
+    ListOfEntitiesNode,
+    ListOfValueObjectsNode,
+)
+from entity_framework.specification import Specification, Comparison, And, Or, Not
+from entity_framework.storages.sqlalchemy.json_value_objects import is_stored_as_json
+from entity_framework.storages.sqlalchemy.registry import SaRegistry
+
+
+operators: Dict[str, Callable[[Any, Any], ClauseElement]] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda column, values: column.in_(values),
+}
+
+
+def compile_specification(registry: SaRegistry, root: EntityNode, specification: Specification) -> ClauseElement:
+    """Turns specification into a WHERE clause on generated models of the aggregate.
+
+    Fields of value objects are found under their nodes' column names, which ModelConstructingVisitor names columns by.
+    Criteria on nested entities and lists become EXISTS subqueries (relationship's has/any), so they work both with
+    ORM queries and Core selects, without joining anything to them.
+    """
+    if isinstance(specification, And):
+        return and_(
+            compile_specification(registry, root, specification.left),
+            compile_specification(registry, root, specification.right),
+        )
+    if isinstance(specification, Or):
+        return or_(
+            compile_specification(registry, root, specification.left),
+            compile_specification(registry, root, specification.right),
+        )
+    if isinstance(specification, Not):
+        return not_(compile_specification(registry, root, specification.specification))
+    if isinstance(specification, Comparison):
+        if specification.entity_cls is not root.type:
+            raise ValueError(f"Specification of {specification.entity_cls.__name__} used for {root.type.__name__}")
+        compare = operators[specification.operator]
+        model = registry.entities_models[root.type]
+        return _compile_path(
+            registry, root, model, specification.path, lambda column: compare(column, specification.value)
+        )
+
+    raise TypeError(f"Unsupported specification - {specification}")
+
+
+def _compile_path(
+    registry: SaRegistry, node: Node, model: Any, path: Sequence[str], criterion: Callable[[Any], ClauseElement]
+) -> ClauseElement:
+    if not path:
+        raise ValueError(f"Only fields can be compared, got {node.name}")
+
+    name, rest = path[0], path[1:]
+    children = [child for child in node.children if child.name == name]
+    if not children:
+        raise ValueError(f"{node.type.__name__} has no field {name}")
+    child = children[0]
+
+    if isinstance(child, FieldNode):
+        if rest:
+            raise ValueError(f"{name} is a field of {node.type.__name__}, it has no fields")
+        return criterion(getattr(model, child.column_name))
+    if is_stored_as_json(child, registry):
+        raise NotImplementedError("Criteria on value objects stored as JSON are not supported")
+    if isinstance(child, ValueObjectNode):
+        return _compile_path(registry, child, model, rest, criterion)
+    if isinstance(child, EntityNode):
+        nested_model = registry.entities_models[child.type]
+        return getattr(model, name).has(_compile_path(registry, child, nested_model, rest, criterion))
+    if isinstance(child, ListOfEntitiesNode):
+        item_model = registry.entities_models[child.type]
+        return getattr(model, name).any(_compile_path(registry, child, item_model, rest, criterion))
+    if isinstance(child, ListOfValueObjectsNode):
+        item_model = registry.value_objects_lists_models[(node.type, name)]
+        return getattr(model, name).any(_compile_path(registry, child, item_model, rest, criterion))
+
+    raise TypeError(f"Unsupported node - {child}")
@@ -0,0 +1,33 @@
+import typing
+
+from sqlalchemy import Table
+from sqlalchemy.dialects import postgresql as postgresql_dialect, sqlite as sqlite_dialect
+from sqlalchemy.sql.dml import Insert
+
+
+def _on_conflict_upsert(insert: typing.Callable[[Table], Insert]) -> typing.Callable[[Table], Insert]:
+    # PostgreSQL and SQLite (since 3.24) share INSERT ... ON CONFLICT, so do their constructs in SQLAlchemy
+    def upsert(table: Table) -> Insert:
+        statement = insert(table)
+        primary_key_columns = list(table.primary_key.columns)
+        updated_columns = {
+            column.name: statement.excluded[column.name] for column in table.columns if not column.primary_key
+        }
+        if not updated_columns:
+            return statement.on_conflict_do_nothing(index_elements=primary_key_columns)
+        return statement.on_conflict_do_update(index_elements=primary_key_columns, set_=updated_columns)
+
+    return upsert
+
+
+mapping = {
+    "postgresql": _on_conflict_upsert(postgresql_dialect.insert),
+    "sqlite": _on_conflict_upsert(sqlite_dialect.insert),
+}
+
+
+def build(table: Table, dialect_name: str) -> Insert:
+    try:
+        return mapping[dialect_name](table)
+    except KeyError:
+        raise NotImplementedError(f"Native upsert is not supported for dialect - {dialect_name}")
@@ -3,6 +3,8 @@ from decimal import Decimal
 from enum import Enum
 from uuid import UUID
 
+import pytest
+
 from entity_framework import abstract_entity_tree
 from entity_framework.abstract_entity_tree import (
     AbstractEntityTree,
@@ -149,3 +151,64 @@ def test_optional_nested_entity_makes_all_its_fields_optional():
             ),
         )
     )
+
+
+def test_prunes_tree_to_given_paths_keeping_identities():
+    root = abstract_entity_tree.build(SomeAggregate).root
+
+    result = abstract_entity_tree.prune(root, [["balance", "currency"], ["nested"]])
+
+    assert result == EntityNode(
+        name="some_aggregate",
+        type=SomeAggregate,
+        optional=False,
+        children=(
+            FieldNode(name="guid", type=UUID, optional=False, children=(), is_identity=True),
+            root.children[1],
+            ValueObjectNode(
+                name="balance",
+                type=NestedValueObject,
+                optional=False,
+                children=(FieldNode(name="currency", type=str, optional=False, children=(), is_identity=False),),
+            ),
+        ),
+    )
+
+
+def test_pruning_to_unknown_field_fails():
+    root = abstract_entity_tree.build(SomeAggregate).root
+
+    with pytest.raises(ValueError):
+        abstract_entity_tree.prune(root, [["balance", "rate"]])
+
+
+def test_builds_tree_once_per_entity_class():
+    tree = abstract_entity_tree.build(SomeAggregate)
+
+    assert abstract_entity_tree.build(SomeAggregate) is tree
+    assert hash(tree.root) == hash(abstract_entity_tree.build(SomeAggregate).root)
+    with pytest.raises(AttributeError):
+        tree.root.name = "other"
+
+
+def test_parses_new_tree_on_every_call():
+    tree = AbstractEntityTree.parse(SomeAggregate)
+
+    assert AbstractEntityTree.parse(SomeAggregate) is not tree
+    assert tree is not abstract_entity_tree.build(SomeAggregate)
+    assert tree == abstract_entity_tree.build(SomeAggregate)
+
+
+def test_precomputes_paths_column_names_and_identities():
+    root = abstract_entity_tree.build(SomeAggregate).root
+    guid, nested, balance = root.children
+
+    assert root.identity is guid
+    assert nested.identity is nested.children[0]
+    assert balance.identity is None
+    assert [(node.path, node.column_name) for node in (nested.children[1], balance, *balance.children)] == [
+        (("nested", "name"), "name"),
+        (("balance",), "balance"),
+        (("balance", "amount"), "balance_amount"),
+        (("balance", "currency"), "balance_currency"),
+    ]
@@ -1,6 +1,20 @@
+from typing import Callable, Generator, Type
+
 import pytest
 from _pytest.fixtures import SubRequest
 from sqlalchemy.engine import Engine, create_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from entity_framework import Repository
+from entity_framework.registry import Registry
+from entity_framework.storages.memory import InMemoryRepo, MemoryStorage
+from entity_framework.storages.sqlalchemy import SqlAlchemyRepo
+from entity_framework.storages.sqlalchemy.registry import SaRegistry
+
+
+# instantiates a repository of given Repository[Entity, Identity] backed by the storage under test
+RepoFactory = Callable[[Type[Repository]], Repository]
 
 
 @pytest.fixture()
@@ -8,3 +22,33 @@ def engine(request: SubRequest) -> Engine:
     connection_url = request.config.getoption("--sqlalchemy-postgres-url")
     assert connection_url, "You have to define --sqlalchemy-postgres-url cmd line option!"
     return create_engine(connection_url)
+
+
+@pytest.fixture()
+def memory_storage() -> MemoryStorage:
+    return MemoryStorage()
+
+
+@pytest.fixture(params=["memory", "sqlalchemy"])
+def make_repo(request: SubRequest) -> Generator[RepoFactory, None, None]:
+    """Runs storage-agnostic tests on every storage, SQLAlchemy one only if --sqlalchemy-postgres-url is given."""
+    if request.param == "memory":
+        storage = request.getfixturevalue("memory_storage")
+        yield lambda repo_base: type("MemoryRepo", (InMemoryRepo, repo_base), {"registry": Registry()})(storage)
+        return
+
+    if not request.config.getoption("--sqlalchemy-postgres-url"):
+        pytest.skip("--sqlalchemy-postgres-url is not given")
+    engine = request.getfixturevalue("engine")
+    sa_base = declarative_base()
+    session = sessionmaker(engine)()
+
+    def make_sa_repo(repo_base: Type[Repository]) -> Repository:
+        repo_cls = type("SaRepo", (SqlAlchemyRepo, repo_base), {"base": sa_base, "registry": SaRegistry()})
+        sa_base.metadata.drop_all(engine)
+        sa_base.metadata.create_all(engine)
+        return repo_cls(session)
+
+    yield make_sa_repo
+    session.close()
+    sa_base.metadata.drop_all(engine)
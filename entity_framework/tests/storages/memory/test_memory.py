@@ -0,0 +1,102 @@
+from typing import List, Optional, Type, Union
+
+import attr
+import pytest
+
+from entity_framework import Entity, Identity, ValueObject, Repository
+from entity_framework.registry import Registry
+from entity_framework.repository import EntityNotFound
+from entity_framework.specification import fields_of
+from entity_framework.storages.memory import InMemoryRepo, MemoryStorage
+
+
+class Plan(Entity):
+    id: Identity[int]
+    discount: float
+
+
+class Subscription(ValueObject):
+    plan_id: int
+    start_at: int
+
+
+class Subscriber(Entity):
+    id: Identity[int]
+    plan: Plan
+    current_subscription: Optional[Subscription] = None
+    tags: List[Subscription] = attr.Factory(list)
+
+
+SubscriberRepo = Repository[Subscriber, int]
+
+
+@pytest.fixture()
+def repo_cls() -> Type[Union[InMemoryRepo, SubscriberRepo]]:
+    class MemorySubscriberRepo(InMemoryRepo, SubscriberRepo):
+        registry = Registry()
+        indexes = ("current_subscription.plan_id",)
+
+    return MemorySubscriberRepo
+
+
+@pytest.fixture()
+def repo(
+    repo_cls: Type[Union[InMemoryRepo, SubscriberRepo]], memory_storage: MemoryStorage
+) -> Union[InMemoryRepo, SubscriberRepo]:
+    repo = repo_cls(memory_storage)
+    repo.save_many(
+        [
+            Subscriber(1, Plan(1, 0.5), Subscription(3, 0), [Subscription(1, 1)]),
+            Subscriber(2, Plan(2, 0.1), Subscription(3, 10)),
+            Subscriber(3, Plan(2, 0.1)),
+        ]
+    )
+    return repo
+
+
+def test_gets_copies_of_saved_aggregates(repo: Union[InMemoryRepo, SubscriberRepo]) -> None:
+    subscriber = repo.get(1)
+    subscriber.tags.append(Subscription(2, 2))
+
+    assert repo.get(1) == Subscriber(1, Plan(1, 0.5), Subscription(3, 0), [Subscription(1, 1)])
+    assert repo.get(1) is not repo.get(1)
+    assert [subscriber.id for subscriber in repo.get_many([3, 1])] == [3, 1]
+    with pytest.raises(EntityNotFound):
+        repo.get_many([1, 4])
+
+
+def test_shares_storage_between_repositories(repo_cls: Type[Union[InMemoryRepo, SubscriberRepo]]) -> None:
+    storage = MemoryStorage()
+    repo_cls(storage).save(Subscriber(1, Plan(1, 0.5)))
+
+    assert repo_cls(storage).exists_many([1, 2]) == [True, False]
+    assert not repo_cls(MemoryStorage()).exists(1)
+
+
+def test_finds_aggregates_using_indexes(repo: Union[InMemoryRepo, SubscriberRepo]) -> None:
+    subscriber = fields_of(Subscriber)
+    plan_3 = subscriber.current_subscription.plan_id == 3
+
+    assert repo._candidates(plan_3 & (subscriber.plan.discount > 0.3)) == {1, 2}
+    assert [found.id for found in repo.find(plan_3 & (subscriber.plan.discount > 0.3))] == [1]
+    assert [found.id for found in repo.find(subscriber.current_subscription.start_at == None)] == [3]  # noqa: E711
+    assert [found.id for found in repo.find(subscriber.tags.plan_id == 1)] == [1]
+    assert repo.count(subscriber.plan.id.in_([2])) == 2
+
+    repo.save(Subscriber(2, Plan(2, 0.1)))
+    assert [found.id for found in repo.find(plan_3)] == [1]
+
+
+def test_pages_through_aggregates_by_identity(repo: Union[InMemoryRepo, SubscriberRepo]) -> None:
+    assert [found.id for found in repo.page(limit=2)] == [1, 2]
+    assert [found.id for found in repo.page(after_identity=2)] == [3]
+    assert sorted(found.id for found in repo.iterate()) == [1, 2, 3]
+
+
+def test_keeps_identities_sorted_in_storage(
+    repo: Union[InMemoryRepo, SubscriberRepo], memory_storage: MemoryStorage
+) -> None:
+    repo.save_many([Subscriber(0, Plan(1, 0.5)), Subscriber(2, Plan(2, 0.1))])
+
+    assert memory_storage.identities[Subscriber] == [0, 1, 2, 3]
+    assert [found.id for found in repo.page(after_identity=0, limit=2)] == [1, 2]
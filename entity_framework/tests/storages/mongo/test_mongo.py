@@ -0,0 +1,114 @@
+from decimal import Decimal
+from typing import List, Optional, Union
+
+import attr
+from bson.decimal128 import Decimal128
+import mongomock
+import pytest
+from pymongo.database import Database
+
+from entity_framework import Entity, Identity, ValueObject, Repository
+from entity_framework.repository import EntityNotFound
+from entity_framework.specification import fields_of
+from entity_framework.storages.mongo import MongoRepo
+from entity_framework.storages.mongo.registry import MongoRegistry
+
+
+class Plan(Entity):
+    id: Identity[int]
+    discount: Decimal
+
+
+class Subscription(ValueObject):
+    plan_id: int
+    start_at: int
+
+
+class Subscriber(Entity):
+    id: Identity[int]
+    plan: Plan
+    current_subscription: Optional[Subscription] = None
+    subscriptions: List[Subscription] = attr.Factory(list)
+    previous_plans: List[Plan] = attr.Factory(list)
+
+
+SubscriberRepo = Repository[Subscriber, int]
+
+
+@pytest.fixture()
+def database() -> Database:
+    return mongomock.MongoClient().db
+
+
+@pytest.fixture()
+def repo(database: Database) -> Union[MongoRepo, SubscriberRepo]:
+    class MongoSubscriberRepo(MongoRepo, SubscriberRepo):
+        registry = MongoRegistry()
+
+    return MongoSubscriberRepo(database)
+
+
+@pytest.fixture()
+def subscribers() -> List[Subscriber]:
+    return [
+        Subscriber(
+            1,
+            Plan(1, Decimal("0.5")),
+            Subscription(1, 10),
+            [Subscription(2, 0), Subscription(1, 10)],
+            [Plan(2, Decimal("0.1"))],
+        ),
+        Subscriber(2, Plan(2, Decimal("0.1"))),
+    ]
+
+
+def test_saves_aggregate_as_single_document(
+    repo: Union[MongoRepo, SubscriberRepo], database: Database, subscribers: List[Subscriber]
+) -> None:
+    repo.save(subscribers[0])
+
+    assert database.subscribers.find_one({"_id": 1}) == {
+        "_id": 1,
+        "plan": {"id": 1, "discount": Decimal128("0.5")},
+        "current_subscription": {"plan_id": 1, "start_at": 10},
+        "subscriptions": [{"plan_id": 2, "start_at": 0}, {"plan_id": 1, "start_at": 10}],
+        "previous_plans": [{"id": 2, "discount": Decimal128("0.1")}],
+    }
+    assert repo.get(1) == subscribers[0]
+
+
+def test_saves_and_gets_many(repo: Union[MongoRepo, SubscriberRepo], subscribers: List[Subscriber]) -> None:
+    repo.save_many(subscribers)
+    subscribers[1].current_subscription = Subscription(2, 20)
+    repo.save_many([subscribers[1]])
+
+    assert repo.get_many([2, 1, 2]) == [subscribers[1], subscribers[0], subscribers[1]]
+    assert repo.exists_many([1, 3, 2]) == [True, False, True]
+    assert repo.exists(2)
+    assert repo.count() == 2
+
+
+def test_raises_for_missing_aggregates(repo: Union[MongoRepo, SubscriberRepo], subscribers: List[Subscriber]) -> None:
+    repo.save(subscribers[0])
+
+    with pytest.raises(EntityNotFound):
+        repo.get(2)
+    with pytest.raises(EntityNotFound):
+        repo.get_many([1, 2])
+
+
+def test_counts_aggregates_satisfying_specification(
+    repo: Union[MongoRepo, SubscriberRepo], subscribers: List[Subscriber]
+) -> None:
+    repo.save_many(subscribers)
+    subscriber = fields_of(Subscriber)
+
+    assert repo.count(subscriber.id == 2) == 1
+    assert repo.count(subscriber.plan.discount == Decimal("0.1")) == 1
+    assert repo.count(subscriber.current_subscription.start_at > 5) == 1
+    assert repo.count(subscriber.plan.id != 1) == 1
+    assert repo.count(subscriber.subscriptions.plan_id == 2) == 1
+    assert repo.count(subscriber.previous_plans.id.in_([2, 3]) | (subscriber.id >= 2)) == 2
+    assert repo.count(~(subscriber.plan.id == 1) & (subscriber.id > 0)) == 1
+    with pytest.raises(ValueError):
+        repo.count(subscriber.plan == 1)
@@ -2,7 +2,7 @@ from typing import Generator
 
 import pytest
 from sqlalchemy.engine import Engine
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.orm import close_all_sessions, sessionmaker, Session
 from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
 
 
@@ -17,5 +17,5 @@ def session(sa_base: DeclarativeMeta, engine: Engine) -> Generator[Session, None
     sa_base.metadata.create_all(engine)
     session_factory = sessionmaker(engine)
     yield session_factory()
-    session_factory.close_all()
+    close_all_sessions()
     sa_base.metadata.drop_all(engine)
@@ -0,0 +1,171 @@
+import asyncio
+import inspect
+import threading
+from pathlib import Path
+from typing import Any, Awaitable, Generator, List, Optional, Set, Type, Union
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.ext.declarative import DeclarativeMeta
+
+from entity_framework import Entity, Identity, AsyncRepository
+from entity_framework.instrumentation import Instrumentation, MetricsCollector, OperationMetrics
+from entity_framework.specification import fields_of
+from entity_framework.storages.sqlalchemy import SqlAlchemyRepo
+from entity_framework.storages.sqlalchemy.asynchronous import AsyncSqlAlchemyRepo
+from entity_framework.storages.sqlalchemy.registry import SaRegistry
+
+
+class Company(Entity):
+    id: Identity[int]
+
+
+class Customer(Entity):
+    id: Identity[int]
+    full_name: str
+    company: Optional[Company] = None
+
+
+AsyncCustomerRepo = AsyncRepository[Customer, int]
+
+
+class ThreadsRecorder(Instrumentation):
+    def __init__(self) -> None:
+        self.threads: Set[int] = set()
+
+    def record(self, metrics: OperationMetrics) -> None:
+        self.threads.add(threading.get_ident())
+
+
+def run(awaitable: Awaitable) -> Any:
+    return asyncio.get_event_loop().run_until_complete(awaitable)
+
+
+@pytest.fixture()
+def sa_repo(sa_base: DeclarativeMeta) -> Type[Union[AsyncSqlAlchemyRepo, AsyncCustomerRepo]]:
+    class SaAsyncCustomerRepo(AsyncSqlAlchemyRepo, AsyncCustomerRepo):
+        base = sa_base
+        registry = SaRegistry()
+        instrumentation = ThreadsRecorder()
+
+    return SaAsyncCustomerRepo
+
+
+@pytest.fixture()
+def async_engine(sa_base: DeclarativeMeta, tmp_path: Path) -> Generator[AsyncEngine, None, None]:
+    # a file, unlike in-memory database, is shared by all connections of the pool
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+
+    async def create_tables() -> None:
+        async with engine.begin() as connection:
+            await connection.run_sync(sa_base.metadata.create_all)
+
+    run(create_tables())
+    yield engine
+    run(engine.dispose())
+
+
+def test_shares_models_with_synchronous_repository(
+    sa_repo: Type[Union[AsyncSqlAlchemyRepo, AsyncCustomerRepo]]
+) -> None:
+    assert issubclass(sa_repo.sync_repo, SqlAlchemyRepo)
+    assert sa_repo.sync_repo.registry is sa_repo.registry
+    assert sa_repo.registry.entities_models[Customer].__table__.name == "customers"
+
+
+def test_saves_and_gets_aggregates_on_event_loop_thread(
+    sa_repo: Type[Union[AsyncSqlAlchemyRepo, AsyncCustomerRepo]], async_engine: AsyncEngine
+) -> None:
+    async def scenario() -> None:
+        async with AsyncSession(async_engine) as session:
+            repo = sa_repo(session)
+            await repo.save(Customer(1, "Jane Doe"))
+            await repo.save_many([Customer(2, "John Doe"), Customer(3, "Joe Doe")])
+            await session.commit()
+
+        async with AsyncSession(async_engine) as session:
+            repo = sa_repo(session)
+            assert await repo.get(1) == Customer(1, "Jane Doe")
+            assert await repo.get_many([3, 2]) == [Customer(3, "Joe Doe"), Customer(2, "John Doe")]
+            assert await repo.page(after_identity=1, limit=1) == [Customer(2, "John Doe")]
+            iterated: List[Customer] = [customer async for customer in repo.iterate(batch_size=2)]
+            assert sorted(customer.id for customer in iterated) == [1, 2, 3]
+
+    run(scenario())
+
+    assert sa_repo.instrumentation.threads == {threading.get_ident()}
+
+
+def test_serves_concurrent_calls_with_own_sessions(
+    sa_repo: Type[Union[AsyncSqlAlchemyRepo, AsyncCustomerRepo]], async_engine: AsyncEngine
+) -> None:
+    async def get(identity: int) -> Customer:
+        async with AsyncSession(async_engine) as session:
+            return await sa_repo(session).get(identity)
+
+    async def scenario() -> List[Customer]:
+        async with AsyncSession(async_engine) as session:
+            await sa_repo(session).save_many([Customer(identity, f"Customer {identity}") for identity in range(10)])
+            await session.commit()
+        return await asyncio.gather(*[get(identity) for identity in range(10)])
+
+    customers = run(scenario())
+
+    assert customers == [Customer(identity, f"Customer {identity}") for identity in range(10)]
+
+
+def test_measures_concurrent_calls_apart(
+    sa_repo: Type[Union[AsyncSqlAlchemyRepo, AsyncCustomerRepo]], async_engine: AsyncEngine
+) -> None:
+    sa_repo.sync_repo.instrumentation = collector = MetricsCollector()
+
+    async def get(identity: int) -> Customer:
+        async with AsyncSession(async_engine) as session:
+            return await sa_repo(session).get(identity)
+
+    async def scenario() -> None:
+        async with AsyncSession(async_engine) as session:
+            await sa_repo(session).save_many([Customer(identity, f"Customer {identity}") for identity in range(10)])
+            await session.commit()
+        await asyncio.gather(*[get(identity) for identity in range(10)])
+
+    run(scenario())
+
+    samples = collector.samples(Customer, "get")
+    assert len(samples) == 10
+    assert [metrics.statements for metrics in samples] == [1] * 10
+    assert [metrics.rows for metrics in samples] == [1] * 10
+
+
+def test_rejects_nested_entities_loaded_lazily(sa_base: DeclarativeMeta) -> None:
+    with pytest.raises(ValueError, match="company"):
+
+        class LazyAsyncCustomerRepo(AsyncSqlAlchemyRepo, AsyncCustomerRepo):
+            base = sa_base
+            registry = SaRegistry(lazy_fields={(Customer, "company")})
+
+
+def test_closes_iteration_stopped_early(
+    sa_repo: Type[Union[AsyncSqlAlchemyRepo, AsyncCustomerRepo]], async_engine: AsyncEngine, monkeypatch: MonkeyPatch
+) -> None:
+    generators: List[Generator] = []
+    iterate = sa_repo.sync_repo.iterate
+
+    def recording_iterate(repo: SqlAlchemyRepo, *args: Any) -> Generator:
+        generators.append(iterate(repo, *args))
+        return generators[-1]
+
+    monkeypatch.setattr(sa_repo.sync_repo, "iterate", recording_iterate)
+
+    async def scenario() -> Customer:
+        async with AsyncSession(async_engine) as session:
+            repo = sa_repo(session)
+            await repo.save_many([Customer(identity, f"Customer {identity}") for identity in range(5)])
+            iterated = repo.iterate(batch_size=2, where=fields_of(Customer).id > 0)
+            first = await iterated.__anext__()
+            await iterated.aclose()
+            return first
+
+    assert run(scenario()) == Customer(1, "Customer 1")
+    assert inspect.getgeneratorstate(generators[0]) == inspect.GEN_CLOSED
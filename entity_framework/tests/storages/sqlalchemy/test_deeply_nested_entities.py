@@ -0,0 +1,87 @@
+from typing import List, Optional, Type, Union
+
+import attr
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.declarative import DeclarativeMeta
+
+from entity_framework import Entity, Identity, Repository
+from entity_framework.storages.sqlalchemy import SqlAlchemyRepo
+from entity_framework.storages.sqlalchemy.registry import SaRegistry
+
+
+class Country(Entity):
+    id: Identity[int]
+    name: str
+
+
+class City(Entity):
+    id: Identity[int]
+    name: str
+    country: Country
+
+
+class Mentor(Entity):
+    id: Identity[int]
+    name: str
+
+
+class Manager(Entity):
+    id: Identity[int]
+    name: str
+    mentor: Optional[Mentor] = None
+
+
+class Branch(Entity):
+    id: Identity[int]
+    manager: Manager
+
+
+class Company(Entity):
+    id: Identity[int]
+    headquarters: City
+    branches: List[Branch] = attr.Factory(list)
+
+
+CompanyRepo = Repository[Company, int]
+
+
+@pytest.fixture()
+def sa_repo(sa_base: DeclarativeMeta) -> Type[Union[SqlAlchemyRepo, CompanyRepo]]:
+    class SaCompanyRepo(SqlAlchemyRepo, CompanyRepo):
+        base = sa_base
+        registry = SaRegistry()
+
+    return SaCompanyRepo
+
+
+def company(identity: int) -> Company:
+    return Company(
+        id=identity,
+        headquarters=City(identity, "Warsaw", Country(identity, "Poland")),
+        branches=[
+            Branch(identity * 10, Manager(identity * 10, "Jane", Mentor(identity * 10, "John"))),
+            Branch(identity * 10 + 1, Manager(identity * 10 + 1, "Joe")),
+        ],
+    )
+
+
+def test_loads_nested_entities_of_any_depth_eagerly(
+    sa_repo: Type[Union[SqlAlchemyRepo, CompanyRepo]], session: Session, engine: Engine
+) -> None:
+    for identity in (1, 2):
+        sa_repo(session).save(company(identity))
+    session.commit()
+    session.close()
+    statements: List[str] = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    assert sa_repo(session).get(1) == company(1)
+    # one for the company joined with nested entities, one for branches joined with their managers and mentors
+    assert len(statements) == 2
+    session.close()
+
+    assert sa_repo(session).get_many([1, 2]) == [company(1), company(2)]
+    assert len(statements) == 4
@@ -0,0 +1,99 @@
+import json
+from datetime import datetime
+from typing import List, Optional, Type, Union
+
+import attr
+import pytest
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.declarative import DeclarativeMeta
+
+from entity_framework import Entity, Identity, ValueObject, Repository
+from entity_framework.storages.sqlalchemy import SqlAlchemyRepo
+from entity_framework.storages.sqlalchemy.json_value_objects import Json
+from entity_framework.storages.sqlalchemy.registry import SaRegistry
+
+
+class Money(ValueObject):
+    amount: int
+    currency: str
+
+
+class Discount(ValueObject):
+    code: str
+    value: Optional[Money] = None
+
+
+class Shipment(ValueObject):
+    sent_at: datetime
+    carrier: str
+
+
+class Invoice(Entity):
+    id: Identity[int]
+    total: Money
+    shipment: Optional[Shipment] = None
+    discounts: List[Discount] = attr.Factory(list)
+
+
+InvoiceRepo = Repository[Invoice, int]
+
+
+@pytest.fixture(params=[False, True], ids=["orm_reads", "core_reads"])
+def sa_repo(request, sa_base: DeclarativeMeta) -> Type[Union[SqlAlchemyRepo, InvoiceRepo]]:
+    class SaInvoiceRepo(SqlAlchemyRepo, InvoiceRepo):
+        base = sa_base
+        registry = SaRegistry(json_value_objects={Shipment, Discount})
+        core_reads = request.param
+
+    return SaInvoiceRepo
+
+
+def test_stores_chosen_value_objects_in_single_columns(sa_repo: Type[Union[SqlAlchemyRepo, InvoiceRepo]]) -> None:
+    table = sa_repo.registry.entities_models[Invoice].__table__
+
+    assert set(table.columns.keys()) == {"id", "total_amount", "total_currency", "shipment", "discounts"}
+    assert isinstance(table.c.shipment.type, Json)
+    assert isinstance(table.c.discounts.type, Json)
+    assert (Invoice, "discounts") not in sa_repo.registry.value_objects_lists_models
+
+
+def test_saves_and_gets_value_objects_stored_as_json(
+    sa_repo: Type[Union[SqlAlchemyRepo, InvoiceRepo]], session: Session
+) -> None:
+    invoice = Invoice(
+        id=1,
+        total=Money(10, "EUR"),
+        shipment=Shipment(datetime(2019, 3, 1, 12, 30, 15, 123), "DHL"),
+        discounts=[Discount("SPRING", Money(1, "EUR")), Discount("LOYAL")],
+    )
+    without_json_objects = Invoice(id=2, total=Money(5, "EUR"))
+
+    sa_repo(session).save_many([invoice, without_json_objects])
+    session.commit()
+    session.expunge_all()
+
+    assert sa_repo(session).get_many([1, 2]) == [invoice, without_json_objects]
+    raw = session.execute("SELECT shipment, discounts FROM invoices WHERE id = 1").first()
+    # JSONB comes back decoded on PostgreSQL, as text elsewhere
+    shipment, discounts = (json.loads(value) if isinstance(value, str) else value for value in raw)
+    assert shipment == {"sent_at": "2019-03-01T12:30:15.000123", "carrier": "DHL"}
+    assert discounts == [
+        {"code": "SPRING", "value": {"amount": 1, "currency": "EUR"}},
+        {"code": "LOYAL", "value": None},
+    ]
+
+
+def test_updates_value_objects_stored_as_json(
+    sa_repo: Type[Union[SqlAlchemyRepo, InvoiceRepo]], session: Session
+) -> None:
+    sa_repo(session).save(Invoice(id=1, total=Money(10, "EUR"), shipment=Shipment(datetime(2019, 3, 1), "DHL")))
+    session.commit()
+    invoice = sa_repo(session).get(1)
+    invoice.shipment = None
+    invoice.discounts.append(Discount("LOYAL"))
+
+    sa_repo(session).save(invoice)
+    session.commit()
+    session.expunge_all()
+
+    assert sa_repo(session).get(1) == invoice
@@ -0,0 +1,122 @@
+from typing import List, Optional, Set, Type, Union
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.declarative import DeclarativeMeta
+
+from entity_framework import Entity, Identity, Repository
+from entity_framework.caching import LruCacheBackend
+from entity_framework.storages.sqlalchemy import SqlAlchemyRepo
+from entity_framework.storages.sqlalchemy.registry import SaRegistry
+
+
+class Plan(Entity):
+    id: Identity[int]
+    discount: float
+
+
+class Referrer(Entity):
+    id: Identity[int]
+    name: str
+
+
+class Subscriber(Entity):
+    id: Identity[int]
+    plan: Plan
+    referrer: Optional[Referrer] = None
+
+
+SubscriberRepo = Repository[Subscriber, int]
+
+
+@pytest.fixture()
+def sa_repo(sa_base: DeclarativeMeta) -> Type[Union[SqlAlchemyRepo, SubscriberRepo]]:
+    class SaSubscriberRepo(SqlAlchemyRepo, SubscriberRepo):
+        base = sa_base
+        registry = SaRegistry(lazy_fields={(Subscriber, "plan"), (Subscriber, "referrer")})
+
+    return SaSubscriberRepo
+
+
+@pytest.fixture()
+def statements(sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session, engine: Engine) -> List[str]:
+    sa_repo(session).save(Subscriber(id=1, plan=Plan(id=1, discount=0.5), referrer=Referrer(id=1, name="Jane")))
+    session.commit()
+    session.close()
+    executed: List[str] = []
+    event.listen(engine, "before_cursor_execute", lambda *args: executed.append(args[2]))
+    return executed
+
+
+def test_loads_nested_entity_on_first_access(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session, statements: List[str]
+) -> None:
+    subscriber = sa_repo(session).get(1)
+
+    assert subscriber.plan.id == 1
+    assert subscriber.referrer.id == 1
+    assert len(statements) == 1
+    assert "JOIN" not in statements[0]
+
+    assert subscriber.plan.discount == 0.5
+    assert len(statements) == 2
+    assert subscriber == Subscriber(id=1, plan=Plan(id=1, discount=0.5), referrer=Referrer(id=1, name="Jane"))
+    assert isinstance(subscriber.plan, Plan)
+
+
+def test_saves_reference_to_nested_entity_without_loading_it(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session, statements: List[str]
+) -> None:
+    subscriber = sa_repo(session).get(1)
+    subscriber.plan = Plan(id=2, discount=0.25)
+
+    sa_repo(session).save(subscriber)
+    session.commit()
+    session.close()
+
+    assert not [statement for statement in statements if "FROM referrers" in statement]
+    assert sa_repo(session).get(1) == Subscriber(
+        id=1, plan=Plan(id=2, discount=0.25), referrer=Referrer(id=1, name="Jane")
+    )
+
+
+@pytest.mark.parametrize("lazy, loaded_eagerly", [((), {"plans", "referrers"}), (["referrer"], {"plans"})])
+def test_overrides_laziness_per_call(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]],
+    session: Session,
+    statements: List[str],
+    lazy: List[str],
+    loaded_eagerly: Set[str],
+) -> None:
+    subscriber = sa_repo(session).get(1, lazy=lazy)
+    [many_subscriber] = sa_repo(session).get_many([1], lazy=lazy)
+
+    assert subscriber is many_subscriber
+    assert len(statements) == 1
+    assert {table for table in ("plans", "referrers") if f"JOIN {table}" in statements[0]} == loaded_eagerly
+    assert subscriber == Subscriber(id=1, plan=Plan(id=1, discount=0.5), referrer=Referrer(id=1, name="Jane"))
+
+
+def test_rejects_lazy_paths_other_than_nested_entities(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session, statements: List[str]
+) -> None:
+    with pytest.raises(ValueError):
+        sa_repo(session).get(1, lazy=["id"])
+
+
+def test_caches_reference_to_nested_entity_without_loading_it(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session, statements: List[str]
+) -> None:
+    sa_repo.cache = LruCacheBackend()
+    sa_repo(session).get(1)
+    session.close()
+    statements.clear()
+
+    subscriber = sa_repo(session).get(1)
+
+    assert subscriber.plan.id == 1
+    assert not statements
+    assert subscriber.plan.discount == 0.5
+    assert len(statements) == 1 and "FROM plans" in statements[0]
@@ -0,0 +1,245 @@
+from typing import Callable, List, Optional, Type, Union
+
+import attr
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.declarative import DeclarativeMeta
+
+from entity_framework import Entity, Identity, ValueObject, Repository
+from entity_framework.specification import fields_of
+from entity_framework.storages.sqlalchemy import SqlAlchemyRepo
+from entity_framework.storages.sqlalchemy.registry import SaRegistry
+
+
+class Money(ValueObject):
+    amount: int
+    currency: str
+
+
+class Discount(ValueObject):
+    code: str
+    value: Optional[Money] = None
+
+
+class Tag(ValueObject):
+    name: str
+
+
+class OrderLine(Entity):
+    id: Identity[int]
+    product: str
+    price: Money
+    tags: List[Tag] = attr.Factory(list)
+
+
+class Order(Entity):
+    id: Identity[int]
+    lines: List[OrderLine] = attr.Factory(list)
+    discounts: List[Discount] = attr.Factory(list)
+
+
+OrderRepo = Repository[Order, int]
+
+
+@pytest.fixture()
+def sa_repo(sa_base: DeclarativeMeta) -> Type[Union[SqlAlchemyRepo, OrderRepo]]:
+    class SaOrderRepo(SqlAlchemyRepo, OrderRepo):
+        base = sa_base
+        registry = SaRegistry()
+
+    return SaOrderRepo
+
+
+def with_settings(sa_repo: Type[Union[SqlAlchemyRepo, OrderRepo]], **settings: bool) -> Type[SqlAlchemyRepo]:
+    return type(sa_repo.__name__, (sa_repo, OrderRepo), settings)
+
+
+def count_rows(session: Session, table_name: str) -> int:
+    return session.execute(f"SELECT COUNT(*) FROM {table_name}").scalar()
+
+
+def test_generates_tables_for_lists(sa_repo: Type[Union[SqlAlchemyRepo, OrderRepo]]) -> None:
+    lines_table = sa_repo.registry.entities_models[OrderLine].__table__
+    discounts_table = sa_repo.registry.value_objects_lists_models[(Order, "discounts")].__table__
+
+    assert lines_table.name == "order_lines"
+    assert [column.name for column in lines_table.primary_key.columns] == ["id"]
+    assert discounts_table.name == "order_discounts"
+    assert [column.name for column in discounts_table.primary_key.columns] == ["order_id", "discounts_position"]
+    assert set(discounts_table.columns.keys()) == {
+        "order_id",
+        "discounts_position",
+        "code",
+        "value_amount",
+        "value_currency",
+    }
+
+
+@pytest.mark.parametrize("core_reads", [False, True])
+def test_saves_and_gets_lists_in_order(
+    sa_repo: Type[Union[SqlAlchemyRepo, OrderRepo]], session: Session, core_reads: bool
+) -> None:
+    order = Order(
+        id=1,
+        lines=[OrderLine(2, "pen", Money(3, "EUR"), [Tag("blue"), Tag("cheap")]), OrderLine(1, "ink", Money(5, "EUR"))],
+        discounts=[Discount("SPRING", Money(1, "EUR")), Discount("LOYAL")],
+    )
+    repo_cls = with_settings(sa_repo, core_reads=core_reads)
+
+    repo_cls(session).save(order)
+    session.commit()
+
+    assert repo_cls(session).get(1) == order
+    assert repo_cls(session).get_many([1]) == [order]
+    assert repo_cls(session).page() == [order]
+    assert list(repo_cls(session).iterate()) == [order]
+
+
+def test_loads_each_list_with_one_additional_statement(
+    sa_repo: Type[Union[SqlAlchemyRepo, OrderRepo]], session: Session, engine: Engine
+) -> None:
+    for identity in (1, 2, 3):
+        lines = [OrderLine(identity * 10 + position, "pen", Money(3, "EUR")) for position in range(3)]
+        sa_repo(session).save(Order(id=identity, lines=lines, discounts=[Discount("SPRING")]))
+    session.commit()
+    statements: List[str] = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    orders = sa_repo(session).get_many([1, 2, 3])
+
+    assert [len(order.lines) for order in orders] == [3, 3, 3]
+    assert len(statements) == 4
+
+
+def test_core_reads_load_each_list_with_one_additional_statement(
+    sa_repo: Type[Union[SqlAlchemyRepo, OrderRepo]], session: Session, engine: Engine
+) -> None:
+    for identity in (1, 2, 3):
+        lines = [OrderLine(identity * 10 + position, "pen", Money(3, "EUR"), [Tag("blue")]) for position in range(3)]
+        sa_repo(session).save(Order(id=identity, lines=lines, discounts=[Discount("SPRING")]))
+    session.commit()
+    statements: List[str] = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    orders = with_settings(sa_repo, core_reads=True)(session).get_many([3, 1, 2])
+
+    assert [[line.id for line in order.lines] for order in orders] == [[30, 31, 32], [10, 11, 12], [20, 21, 22]]
+    assert all(line.tags == [Tag("blue")] for order in orders for line in order.lines)
+    assert all(order.discounts == [Discount("SPRING")] for order in orders)
+    assert len(statements) == 4
+
+
+def test_saves_changes_of_lists_without_rewriting_unchanged_items(
+    sa_repo: Type[Union[SqlAlchemyRepo, OrderRepo]], session: Session, engine: Engine
+) -> None:
+    sa_repo(session).save(
+        Order(
+            id=1,
+            lines=[OrderLine(1, "pen", Money(3, "EUR")), OrderLine(2, "ink", Money(5, "EUR"))],
+            discounts=[Discount("SPRING"), Discount("LOYAL")],
+        )
+    )
+    session.commit()
+    order = sa_repo(session).get(1)
+    order.lines[1].price = Money(6, "EUR")
+    order.discounts.pop()
+    statements: List[str] = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    sa_repo(session).save(order)
+    session.commit()
+
+    writes = [statement.split()[0] for statement in statements if not statement.startswith("SELECT")]
+    assert sorted(writes) == ["DELETE", "UPDATE"]
+    assert sa_repo(session).get(1) == order
+
+
+def test_finds_aggregates_by_fields_of_list_items(
+    sa_repo: Type[Union[SqlAlchemyRepo, OrderRepo]], session: Session
+) -> None:
+    sa_repo(session).save(Order(id=1, lines=[OrderLine(1, "pen", Money(3, "EUR"))], discounts=[Discount("SPRING")]))
+    sa_repo(session).save(Order(id=2, lines=[OrderLine(2, "ink", Money(5, "USD"))]))
+    order = fields_of(Order)
+
+    assert [found.id for found in sa_repo(session).find(order.lines.price.currency == "USD")] == [2]
+    assert [found.id for found in sa_repo(session).find(order.discounts.code == "SPRING")] == [1]
+
+
+@pytest.mark.parametrize(
+    "settings, write",
+    [
+        ({}, lambda repo, orders: repo.save_many(orders)),
+        ({"native_upsert": True}, lambda repo, orders: repo.save_many(orders)),
+        ({"native_upsert": True}, lambda repo, orders: [repo.save(order) for order in orders]),
+        ({"dirty_tracking": True}, lambda repo, orders: [repo.save(order) for order in orders]),
+    ],
+    ids=["save_many", "save_many_native_upsert", "save_native_upsert", "save_dirty_tracking"],
+)
+def test_writes_lists_with_rows_deleting_items_gone_from_them(
+    sa_repo: Type[Union[SqlAlchemyRepo, OrderRepo]],
+    session: Session,
+    settings: dict,
+    write: Callable[[SqlAlchemyRepo, List[Order]], None],
+) -> None:
+    repo_cls = with_settings(sa_repo, **settings)
+    orders = [
+        Order(
+            id=identity,
+            lines=[
+                OrderLine(identity * 10, "pen", Money(3, "EUR"), [Tag("blue"), Tag("cheap")]),
+                OrderLine(identity * 10 + 1, "ink", Money(5, "EUR"), [Tag("black")]),
+            ],
+            discounts=[Discount("SPRING", Money(1, "EUR")), Discount("LOYAL")],
+        )
+        for identity in (1, 2)
+    ]
+    write(repo_cls(session), orders)
+    session.commit()
+
+    orders = repo_cls(session).get_many([1, 2])
+    first_line = orders[0].lines.pop(0)
+    orders[0].lines.append(first_line)
+    orders[0].lines[0].tags = []
+    orders[0].discounts.pop(0)
+    orders[1].lines.pop()
+    orders[1].lines.append(OrderLine(22, "paper", Money(1, "USD"), [Tag("white")]))
+    write(repo_cls(session), orders)
+    session.commit()
+    session.close()
+
+    assert repo_cls(session).get_many([1, 2]) == orders
+    assert count_rows(session, "order_lines") == 4
+    assert count_rows(session, "order_line_tags") == 5
+    assert count_rows(session, "order_discounts") == 3
+
+
+def test_dirty_tracking_deletes_items_gone_from_lists_without_rewriting_others(
+    sa_repo: Type[Union[SqlAlchemyRepo, OrderRepo]], session: Session, engine: Engine
+) -> None:
+    repo_cls = with_settings(sa_repo, dirty_tracking=True)
+    repo_cls(session).save(
+        Order(
+            id=1,
+            lines=[OrderLine(1, "pen", Money(3, "EUR"), [Tag("blue")]), OrderLine(2, "ink", Money(5, "EUR"))],
+            discounts=[Discount("SPRING"), Discount("LOYAL")],
+        )
+    )
+    session.commit()
+    order = repo_cls(session).get(1)
+    order.lines.pop(0)
+    order.lines[0].price = Money(6, "EUR")
+    order.discounts.pop()
+    statements: List[str] = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    repo_cls(session).save(order)
+    session.commit()
+    session.close()
+
+    writes = [statement.split()[0] for statement in statements if not statement.startswith("SELECT")]
+    # removed line with its tag, removed discount, then changed line at its new position
+    assert writes == ["DELETE", "DELETE", "DELETE", "UPDATE"]
+    assert repo_cls(session).get(1) == order
+    assert count_rows(session, "order_line_tags") == 0
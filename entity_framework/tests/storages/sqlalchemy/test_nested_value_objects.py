@@ -53,6 +53,7 @@ def sa_repo(sa_base: DeclarativeMeta) -> Type[Union[SqlAlchemyRepo, BoardRepo]]:
         ),
     ],
 )
+@pytest.mark.parametrize("core_reads", [False, True])
 def test_gets_exemplary_data(
     sa_repo: Type[Union[SqlAlchemyRepo, BoardRepo]],
     session: Session,
@@ -60,7 +61,9 @@ def test_gets_exemplary_data(
     entities: List[Type[Entity]],
     rows: List[Dict],
     expected_aggregate: Board,
+    core_reads: bool,
 ) -> None:
+    sa_repo.core_reads = core_reads
     repo = sa_repo(session)
 
     for table_name, entity, mappings in zip(tables, entities, rows):
@@ -105,3 +108,17 @@ def test_saves_exemplary_data(
     for entity, expected_rows in expected_db_data.items():
         model = sa_repo.registry.entities_models[entity]
         assert [dict(row) for row in session.execute(model.__table__.select()).fetchall()] == expected_rows
+
+
+def test_saving_aggregate_without_optional_value_object_clears_its_columns(
+    sa_repo: Type[Union[SqlAlchemyRepo, BoardRepo]], session: Session
+) -> None:
+    repo = sa_repo(session)
+    repo.save(Board(id=1, goal=Goal(assignee="me", deadline=Deadline(datetime=DATETIME, penalty=1500))))
+
+    repo.save(Board(id=1))
+
+    model = sa_repo.registry.entities_models[Board]
+    assert [dict(row) for row in session.execute(model.__table__.select()).fetchall()] == [
+        {"id": 1, "goal_assignee": None, "goal_deadline_penalty": None, "goal_deadline_datetime": None}
+    ]
@@ -1,10 +1,18 @@
-from typing import Optional, Union, Type, List, Dict
+import time
+from pathlib import Path
+from typing import Generator, Optional, Union, Type, List, Dict
 
 import pytest
-from sqlalchemy.orm import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.ext.declarative import DeclarativeMeta
 
 from entity_framework import Entity, Identity, ValueObject, Repository
+from entity_framework.caching import LruCacheBackend
+from entity_framework.instrumentation import MetricsCollector
+from entity_framework.specification import fields_of
 from entity_framework.storages.sqlalchemy import SqlAlchemyRepo
 from entity_framework.storages.sqlalchemy.registry import SaRegistry
 
@@ -68,6 +76,7 @@ def sa_repo(sa_base: DeclarativeMeta) -> Type[Union[SqlAlchemyRepo, SubscriberRe
         ),
     ],
 )
+@pytest.mark.parametrize("core_reads", [False, True])
 def test_gets_exemplary_data(
     sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]],
     session: Session,
@@ -75,7 +84,9 @@ def test_gets_exemplary_data(
     entities: List[Type[Entity]],
     rows: List[Dict],
     expected_aggregate: Subscriber,
+    core_reads: bool,
 ) -> None:
+    sa_repo.core_reads = core_reads
     repo = sa_repo(session)
 
     for table_name, entity, mappings in zip(tables, entities, rows):
@@ -120,3 +131,386 @@ def test_saves_exemplary_data(
     for entity, expected_rows in expected_db_data.items():
         model = sa_repo.registry.entities_models[entity]
         assert [dict(row) for row in session.execute(model.__table__.select()).fetchall()] == expected_rows
+
+
+def test_reuses_aggregate_populator_compiled_during_prepare(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session
+) -> None:
+    repo = sa_repo(session)
+    populator = sa_repo.registry.aggregates_populators[Subscriber]
+    session.bulk_insert_mappings(sa_repo.registry.entities_models[Plan], [{"id": 1, "discount": 0.5}])
+    session.bulk_insert_mappings(sa_repo.registry.entities_models[Subscriber], [{"id": 1, "plan_id": 1}])
+
+    assert repo.get(1) == repo.get(1) == Subscriber(id=1, plan=Plan(id=1, discount=0.5))
+    assert sa_repo.registry.aggregates_populators[Subscriber] is populator
+
+
+@pytest.fixture()
+def three_subscribers(sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session) -> None:
+    session.bulk_insert_mappings(sa_repo.registry.entities_models[Plan], [{"id": 1, "discount": 0.5}])
+    session.bulk_insert_mappings(
+        sa_repo.registry.entities_models[Subscriber],
+        [{"id": 1, "plan_id": 1}, {"id": 2, "plan_id": 1}, {"id": 3, "plan_id": 1}],
+    )
+
+
+@pytest.mark.usefixtures("three_subscribers")
+@pytest.mark.parametrize("chunk_size", [1, 500])
+@pytest.mark.parametrize("core_reads", [False, True])
+def test_gets_many_in_requested_order(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session, chunk_size: int, core_reads: bool
+) -> None:
+    sa_repo.get_many_chunk_size = chunk_size
+    sa_repo.core_reads = core_reads
+    repo = sa_repo(session)
+
+    result = repo.get_many([3, 1, 3])
+
+    plan = Plan(id=1, discount=0.5)
+    assert result == [Subscriber(id=3, plan=plan), Subscriber(id=1, plan=plan), Subscriber(id=3, plan=plan)]
+    assert result[0] is result[2]
+
+
+@pytest.mark.usefixtures("three_subscribers")
+def test_get_many_raises_when_any_identity_is_missing(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session
+) -> None:
+    repo = sa_repo(session)
+
+    with pytest.raises(NoResultFound):
+        repo.get_many([1, 4])
+
+
+@pytest.mark.usefixtures("three_subscribers")
+@pytest.mark.parametrize("core_reads", [False, True])
+def test_compiles_statements_once_regardless_of_number_of_identities(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session, core_reads: bool
+) -> None:
+    sa_repo.core_reads = core_reads
+    session.commit()
+    sa_repo(session).get_many([1])
+    session.close()
+    cache = sa_repo.registry.compiled_cache if core_reads else sa_repo.registry.bakery.cache
+    compiled = dict(cache)
+    assert compiled
+
+    assert len(sa_repo(session).get_many([1, 2, 3])) == 3
+    assert dict(cache) == compiled
+
+
+def test_saves_many_inserting_new_and_updating_existing_rows(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session
+) -> None:
+    repo = sa_repo(session)
+    repo.save(Subscriber(id=1, plan=Plan(id=1, discount=0.5), current_subscription=Subscription(1, 0)))
+    plan = Plan(id=2, discount=0.25)
+
+    repo.save_many(
+        [
+            Subscriber(id=1, plan=plan, lifetime_subscription=Subscription(2, 10)),
+            Subscriber(id=2, plan=plan, current_subscription=Subscription(2, 5)),
+        ]
+    )
+    session.commit()
+    session.close()
+
+    assert sa_repo(session).get_many([1, 2]) == [
+        Subscriber(id=1, plan=plan, lifetime_subscription=Subscription(2, 10)),
+        Subscriber(id=2, plan=plan, current_subscription=Subscription(2, 5)),
+    ]
+    plan_model = sa_repo.registry.entities_models[Plan]
+    assert [dict(row) for row in session.execute(plan_model.__table__.select()).fetchall()] == [
+        {"id": 1, "discount": 0.5},
+        {"id": 2, "discount": 0.25},
+    ]
+
+
+@pytest.mark.parametrize("save_many", [False, True])
+def test_saves_with_native_upsert(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session, save_many: bool
+) -> None:
+    sa_repo.native_upsert = True
+    repo = sa_repo(session)
+    save = (lambda aggregate: repo.save_many([aggregate])) if save_many else repo.save
+    save(Subscriber(id=1, plan=Plan(id=1, discount=0.5), current_subscription=Subscription(1, 0)))
+
+    save(Subscriber(id=1, plan=Plan(id=1, discount=0.75), lifetime_subscription=Subscription(1, 5)))
+    session.commit()
+    session.close()
+
+    assert sa_repo(session).get(1) == Subscriber(
+        id=1, plan=Plan(id=1, discount=0.75), lifetime_subscription=Subscription(1, 5)
+    )
+    subscriber_model = sa_repo.registry.entities_models[Subscriber]
+    assert session.query(subscriber_model).count() == 1
+
+
+@pytest.mark.usefixtures("three_subscribers")
+def test_returns_aggregates_from_identity_map_until_transaction_ends(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session, engine: Engine
+) -> None:
+    loaded = sa_repo(session).get(1)
+    saved = Subscriber(id=2, plan=Plan(id=1, discount=0.5), current_subscription=Subscription(1, 0))
+    sa_repo(session).save(saved)
+    statements: List[str] = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    another_repo = sa_repo(session)
+    assert another_repo.get(1) is loaded
+    assert another_repo.get_many([2, 1]) == [saved, loaded]
+    assert statements == []
+
+    session.commit()
+    assert sa_repo(session).get(1) is not loaded
+
+
+@pytest.mark.usefixtures("three_subscribers")
+def test_gets_aggregates_from_cache_shared_between_sessions(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session
+) -> None:
+    sa_repo.cache = LruCacheBackend()
+    loaded = sa_repo(session).get(1)
+    session.commit()
+    subscriber_model = sa_repo.registry.entities_models[Subscriber]
+    session.query(subscriber_model).filter(subscriber_model.id == 1).update({"current_subscription_start_at": 5})
+
+    cached = sa_repo(session).get(1)
+    assert cached == loaded and cached is not loaded
+    assert sa_repo(session).get_many([2, 1])[1] == loaded
+
+    sa_repo(session).save(Subscriber(id=1, plan=Plan(id=1, discount=0.5), current_subscription=Subscription(1, 7)))
+    session.commit()
+    assert sa_repo(session).get(1).current_subscription == Subscription(1, 7)
+
+
+@pytest.fixture()
+def isolated_engine(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], engine: Engine, tmp_path: Path
+) -> Generator[Engine, None, None]:
+    """Engine whose sessions see only changes other sessions committed, which in-memory SQLite's single one does not."""
+    if engine.dialect.name == "sqlite" and engine.url.database in (None, "", ":memory:"):
+        engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    sa_repo.base.metadata.drop_all(engine)
+    sa_repo.base.metadata.create_all(engine)
+    yield engine
+    sa_repo.base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def test_evicts_aggregates_cached_by_other_sessions_before_commit(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], isolated_engine: Engine
+) -> None:
+    sa_repo.cache = LruCacheBackend()
+    session_factory = sessionmaker(isolated_engine)
+    writer = session_factory()
+    sa_repo(writer).save(Subscriber(id=1, plan=Plan(id=1, discount=0.5)))
+    writer.commit()
+    changed = Subscriber(id=1, plan=Plan(id=1, discount=0.5), current_subscription=Subscription(1, 7))
+
+    sa_repo(writer).save(changed)
+    reader = session_factory()
+    assert sa_repo(reader).get(1).current_subscription is None
+    reader.close()
+    writer.commit()
+    writer.close()
+
+    assert sa_repo(session_factory()).get(1) == changed
+
+
+@pytest.mark.usefixtures("three_subscribers")
+def test_dirty_tracking_writes_only_changed_columns(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session, engine: Engine
+) -> None:
+    sa_repo.dirty_tracking = True
+    repo = sa_repo(session)
+    subscriber = repo.get(1)
+    statements: List[str] = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    repo.save(subscriber)
+    assert statements == []
+
+    subscriber.subscribe(Subscription(1, 5))
+    repo.save(subscriber)
+    assert len(statements) == 1
+    assert statements[0].startswith("UPDATE subscribers SET current_subscription_plan_id=")
+    assert "plan_id=" not in statements[0].replace("current_subscription_plan_id=", "")
+
+    session.commit()
+    session.close()
+    assert sa_repo(session).get(1).current_subscription == Subscription(1, 5)
+
+
+@pytest.mark.usefixtures("three_subscribers")
+@pytest.mark.parametrize("core_reads", [False, True])
+def test_iterates_over_aggregates_in_batches(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session, core_reads: bool
+) -> None:
+    sa_repo.core_reads = core_reads
+    repo = sa_repo(session)
+    subscriber_model = sa_repo.registry.entities_models[Subscriber]
+
+    everything = repo.iterate(batch_size=2)
+    filtered = repo.iterate(batch_size=2, where=subscriber_model.id > 1)
+
+    plan = Plan(id=1, discount=0.5)
+    assert sorted(everything, key=lambda subscriber: subscriber.id) == [
+        Subscriber(id=1, plan=plan),
+        Subscriber(id=2, plan=plan),
+        Subscriber(id=3, plan=plan),
+    ]
+    assert sorted(filtered, key=lambda subscriber: subscriber.id) == [
+        Subscriber(id=2, plan=plan),
+        Subscriber(id=3, plan=plan),
+    ]
+
+
+@pytest.mark.usefixtures("three_subscribers")
+@pytest.mark.parametrize("core_reads", [False, True])
+def test_pages_through_aggregates_by_identity(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session, core_reads: bool
+) -> None:
+    sa_repo.core_reads = core_reads
+    repo = sa_repo(session)
+
+    first_page = repo.page(limit=2)
+    second_page = repo.page(after_identity=first_page[-1].id, limit=2)
+    third_page = repo.page(after_identity=second_page[-1].id, limit=2)
+
+    assert [subscriber.id for subscriber in first_page] == [1, 2]
+    assert [subscriber.id for subscriber in second_page] == [3]
+    assert third_page == []
+    assert repo.get(1) is first_page[0]
+
+
+@pytest.mark.usefixtures("three_subscribers")
+def test_projects_only_requested_fields(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session, engine: Engine
+) -> None:
+    repo = sa_repo(session)
+    repo.save(Subscriber(id=4, plan=Plan(id=2, discount=0.25), current_subscription=Subscription(2, 10)))
+    statements: List[str] = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    fields = ["id", "plan.discount", "current_subscription.start_at"]
+
+    projection = repo.project(4, fields)
+    projections = repo.project(sa_repo.registry.entities_models[Plan].discount > 0.3, fields)
+
+    assert projection == (4, 0.25, 10)
+    assert projection.current_subscription_start_at == 10
+    assert sorted(projection.id for projection in projections) == [1, 2, 3]
+    assert "lifetime_subscription" not in statements[0]
+    with pytest.raises(ValueError):
+        repo.project(4, ["plan"])
+
+
+@pytest.mark.parametrize("core_reads", [False, True])
+def test_finds_aggregates_satisfying_specification(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session, core_reads: bool
+) -> None:
+    sa_repo.core_reads = core_reads
+    repo = sa_repo(session)
+    cheap, expensive = Plan(id=1, discount=0.5), Plan(id=2, discount=0.1)
+    repo.save_many(
+        [
+            Subscriber(id=1, plan=cheap, current_subscription=Subscription(3, 0)),
+            Subscriber(id=2, plan=expensive, current_subscription=Subscription(3, 10)),
+            Subscriber(id=3, plan=expensive),
+        ]
+    )
+    subscriber = fields_of(Subscriber)
+
+    assert [s.id for s in repo.find(subscriber.current_subscription.plan_id == 3)] == [1, 2]
+    assert [s.id for s in repo.find(subscriber.plan.discount > 0.3)] == [1]
+    assert [
+        s.id for s in repo.find((subscriber.plan.id == 2) & ~(subscriber.current_subscription.start_at == 10))
+    ] == []
+    assert [s.id for s in repo.find(subscriber.id.in_([1, 3]) | (subscriber.plan.discount < 0.3), limit=2)] == [1, 2]
+    assert [s.id for s in repo.find(subscriber.current_subscription.start_at == None)] == [3]  # noqa: E711
+    with pytest.raises(ValueError):
+        repo.find(subscriber.plan.name == "gold")
+
+
+@pytest.mark.usefixtures("three_subscribers")
+def test_checks_existence_and_counts_without_joins(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session, engine: Engine
+) -> None:
+    repo = sa_repo(session)
+    statements: List[str] = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    assert repo.exists(2)
+    assert not repo.exists(4)
+    assert repo.exists_many([3, 4, 1, 3]) == [True, False, True, True]
+    assert repo.count() == 3
+    assert repo.count(fields_of(Subscriber).id > 1) == 2
+    assert len(statements) == 5
+    assert not [statement for statement in statements if "JOIN" in statement or "plans" in statement]
+
+
+@pytest.mark.usefixtures("three_subscribers")
+@pytest.mark.parametrize("core_reads", [False, True])
+def test_reports_metrics_of_operations_to_instrumentation(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session, core_reads: bool
+) -> None:
+    sa_repo.core_reads = core_reads
+    sa_repo.instrumentation = MetricsCollector()
+    repo = sa_repo(session)
+
+    repo.get_many([1, 2, 3])
+    repo.save(Subscriber(id=4, plan=Plan(id=1, discount=0.5)))
+    repo.exists(5)
+
+    [get_many] = sa_repo.instrumentation.samples(Subscriber, "get_many")
+    assert (get_many.rows, get_many.statements, get_many.flush_time) == (3, 1, 0)
+    assert get_many.hydrate_time > 0
+    assert get_many.duration == pytest.approx(get_many.query_time + get_many.hydrate_time)
+    [save] = sa_repo.instrumentation.samples(Subscriber, "save")
+    assert save.rows == 0 and save.statements > 0 and save.flush_time > 0 and save.hydrate_time > 0
+    # exists delegates to exists_many, which is not reported on its own
+    assert [metrics.operation for metrics in sa_repo.instrumentation.samples(Subscriber, "exists")] == ["exists"]
+    assert sa_repo.instrumentation.samples(Subscriber, "exists_many") == []
+    assert sa_repo.instrumentation.summaries()[(Subscriber, "save")].count == 1
+
+
+@pytest.mark.usefixtures("three_subscribers")
+@pytest.mark.parametrize("core_reads", [False, True])
+def test_reports_metrics_of_iterating_and_projecting(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session, core_reads: bool
+) -> None:
+    sa_repo.core_reads = core_reads
+    sa_repo.instrumentation = MetricsCollector()
+    repo = sa_repo(session)
+
+    iterated = repo.iterate(batch_size=2)
+    assert sa_repo.instrumentation.samples(Subscriber, "iterate") == []
+    assert len(list(iterated)) == 3
+    repo.project(fields_of(Subscriber).id > 1, ["plan.discount"])
+
+    [iterate] = sa_repo.instrumentation.samples(Subscriber, "iterate")
+    assert (iterate.rows, iterate.statements) == (3, 1)
+    assert iterate.duration == pytest.approx(iterate.query_time + iterate.hydrate_time)
+    [project] = sa_repo.instrumentation.samples(Subscriber, "project")
+    assert (project.rows, project.statements) == (2, 1)
+
+
+@pytest.mark.usefixtures("three_subscribers")
+def test_reports_flush_of_orm_save_as_flush_time(
+    sa_repo: Type[Union[SqlAlchemyRepo, SubscriberRepo]], session: Session
+) -> None:
+    sa_repo.instrumentation = MetricsCollector()
+    flush_durations: List[float] = []
+
+    @event.listens_for(session, "after_flush_postexec")
+    def measure_flush(*_args: object) -> None:
+        flush_durations.append(time.perf_counter())
+
+    @event.listens_for(session, "before_flush")
+    def start_flush(*_args: object) -> None:
+        flush_durations.append(-time.perf_counter())
+
+    sa_repo(session).save(Subscriber(id=1, plan=Plan(id=1, discount=0.75)))
+
+    [save] = sa_repo.instrumentation.samples(Subscriber, "save")
+    assert save.flush_time >= sum(flush_durations) > 0
+    assert save.query_time > 0
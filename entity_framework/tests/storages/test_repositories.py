@@ -0,0 +1,72 @@
+from typing import Optional, Union
+
+import pytest
+
+from entity_framework import Entity, Identity, ValueObject, Repository
+from entity_framework.repository import EntityNotFound
+from entity_framework.specification import fields_of
+from entity_framework.tests.storages.conftest import RepoFactory
+
+
+class Plan(Entity):
+    id: Identity[int]
+    discount: float
+
+
+class Subscription(ValueObject):
+    plan_id: int
+    start_at: int
+
+
+class Subscriber(Entity):
+    id: Identity[int]
+    plan: Plan
+    current_subscription: Optional[Subscription] = None
+
+
+SubscriberRepo = Repository[Subscriber, int]
+
+SUBSCRIBERS = [
+    Subscriber(1, Plan(1, 0.5), Subscription(1, 0)),
+    Subscriber(2, Plan(2, 0.1), Subscription(2, 10)),
+    Subscriber(3, Plan(2, 0.1)),
+]
+
+
+@pytest.fixture()
+def repo(make_repo: RepoFactory) -> Union[Repository, SubscriberRepo]:
+    repo = make_repo(SubscriberRepo)
+    repo.save_many(SUBSCRIBERS)
+    return repo
+
+
+def test_gets_saved_aggregates(repo: SubscriberRepo) -> None:
+    assert repo.get(2) == SUBSCRIBERS[1]
+    assert repo.get_many([3, 1]) == [SUBSCRIBERS[2], SUBSCRIBERS[0]]
+    assert repo.exists_many([1, 4]) == [True, False]
+    with pytest.raises(EntityNotFound):
+        repo.get(4)
+
+
+def test_saving_replaces_aggregate(repo: SubscriberRepo) -> None:
+    repo.save(Subscriber(1, Plan(1, 0.5)))
+
+    assert repo.get(1) == Subscriber(1, Plan(1, 0.5))
+    assert repo.count() == 3
+
+
+def test_finds_and_counts_aggregates_satisfying_specification(repo: SubscriberRepo) -> None:
+    subscriber = fields_of(Subscriber)
+
+    assert [found.id for found in repo.find(subscriber.plan.id == 2)] == [2, 3]
+    assert [found.id for found in repo.find(subscriber.current_subscription.start_at > 0)] == [2]
+    assert repo.count(subscriber.plan.discount < 0.3) == 2
+
+
+def test_pages_through_aggregates_by_identity(repo: SubscriberRepo) -> None:
+    repo.save(Subscriber(0, Plan(1, 0.5)))
+
+    assert [found.id for found in repo.page(limit=3)] == [0, 1, 2]
+    assert [found.id for found in repo.page(after_identity=1, limit=1)] == [2]
+    assert repo.page(after_identity=3) == []
+    assert sorted(found.id for found in repo.iterate()) == [0, 1, 2, 3]
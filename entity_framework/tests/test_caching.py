@@ -0,0 +1,44 @@
+from entity_framework.caching import LruCacheBackend
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_evicts_least_recently_used_entry() -> None:
+    cache = LruCacheBackend(max_size=2)
+    cache.set(("A", 1), (1,))
+    cache.set(("A", 2), (2,))
+    cache.get(("A", 1))
+
+    cache.set(("A", 3), (3,))
+
+    assert cache.get(("A", 2)) is None
+    assert cache.get(("A", 1)) == (1,)
+    assert cache.get(("A", 3)) == (3,)
+
+
+def test_expires_entries_after_ttl() -> None:
+    clock = FakeClock()
+    cache = LruCacheBackend(ttl=10, clock=clock)
+    cache.set(("A", 1), (1,))
+
+    clock.now = 9.9
+    assert cache.get(("A", 1)) == (1,)
+    clock.now = 10
+    assert cache.get(("A", 1)) is None
+    assert len(cache) == 0
+
+
+def test_deletes_entry() -> None:
+    cache = LruCacheBackend()
+    cache.set(("A", 1), (1,))
+
+    cache.delete(("A", 1))
+    cache.delete(("A", 2))
+
+    assert cache.get(("A", 1)) is None
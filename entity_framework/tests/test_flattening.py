@@ -0,0 +1,79 @@
+import typing
+from datetime import datetime
+
+import attr
+import pytest
+
+from entity_framework import Entity, Identity, ValueObject
+from entity_framework.abstract_entity_tree import EntityNode, build
+from entity_framework.flattening import REFERENCE, FlatteningVisitor, Flattener
+from entity_framework.lazy import LazyEntity
+
+
+class Deadline(ValueObject):
+    datetime: datetime
+    penalty: typing.Optional[int]
+
+
+class Goal(ValueObject):
+    assignee: str
+    deadline: typing.Optional[Deadline] = None
+
+
+class Owner(Entity):
+    id: Identity[int]
+    name: str
+
+
+class Board(Entity):
+    id: Identity[int]
+    owner: typing.Optional[Owner] = None
+    goal: typing.Optional[Goal] = None
+    members: typing.List[Owner] = attr.Factory(list)
+
+
+DATETIME = datetime.now()
+
+
+@pytest.fixture()
+def flattener() -> Flattener:
+    visitor = FlatteningVisitor()
+    visitor.traverse_from(build(Board).root)
+    return visitor.result
+
+
+@pytest.mark.parametrize(
+    "aggregate, expected_flat",
+    [
+        (Board(id=1), (1, False, None, None, False, None, None, None, None, ())),
+        (
+            Board(id=1, owner=Owner(2, "John"), goal=Goal("me", Deadline(DATETIME, None)), members=[Owner(3, "Jane")]),
+            (1, True, 2, "John", True, "me", True, DATETIME, None, ((3, "Jane"),)),
+        ),
+        (
+            Board(id=1, goal=Goal("me", Deadline(DATETIME, None))),
+            (1, False, None, None, True, "me", True, DATETIME, None, ()),
+        ),
+    ],
+)
+def test_flattens_and_restores_aggregate(flattener: Flattener, aggregate: Board, expected_flat: tuple) -> None:
+    flat = flattener.flatten(aggregate)
+
+    assert flat == expected_flat
+    assert flattener.unflatten(flat) == aggregate
+
+
+def test_flattens_unloaded_entity_as_reference_without_loading_it(flattener: Flattener) -> None:
+    def fail(identity: int) -> Owner:
+        raise AssertionError(f"Owner {identity} should not be loaded")
+
+    def load_reference(entity: EntityNode, identity: typing.Any) -> Owner:
+        assert entity.type is Owner
+        return Owner(identity, "John")
+
+    flat = flattener.flatten(Board(id=1, owner=LazyEntity(Owner, "id", 2, fail)))
+
+    assert flat == (1, REFERENCE, 2, None, False, None, None, None, None, ())
+    assert flattener.unflatten(flat, load_reference) == Board(id=1, owner=Owner(2, "John"))
+    with pytest.raises(ValueError):
+        flattener.unflatten(flat)
@@ -0,0 +1,35 @@
+import pytest
+
+from entity_framework.instrumentation import MetricsCollector, OperationMetrics
+
+
+def metrics(operation: str, duration: float, rows: int = 1) -> OperationMetrics:
+    return OperationMetrics(str, operation, duration, duration / 2, duration / 4, duration / 4, rows, 1)
+
+
+def test_summarizes_durations_with_percentiles_per_operation() -> None:
+    collector = MetricsCollector()
+    for milliseconds in range(1, 101):
+        collector.record(metrics("get", milliseconds / 1000))
+    collector.record(metrics("save", 1.0, rows=0))
+
+    summaries = collector.summaries()
+
+    get = summaries[(str, "get")]
+    assert (get.count, get.p50, get.p90, get.p99, get.max) == (100, 0.05, 0.09, 0.099, 0.1)
+    assert get.mean_query_time == pytest.approx(0.02525)
+    assert get.mean_rows == 1
+    assert summaries[(str, "save")].p99 == 1.0
+
+
+def test_keeps_only_latest_samples() -> None:
+    collector = MetricsCollector(max_samples=2)
+    for duration in (3.0, 1.0, 2.0):
+        collector.record(metrics("get", duration))
+
+    assert [sample.duration for sample in collector.samples(str, "get")] == [1.0, 2.0]
+    assert collector.summaries()[(str, "get")].max == 2.0
+
+    collector.clear()
+
+    assert collector.summaries() == {}